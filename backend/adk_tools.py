@@ -1,10 +1,121 @@
 
+import threading
 import traceback
-from googleapiclient.errors import HttpError
 
+import config
+import rate_limiter
+import retry_policy
 
+# Gmail's messages.batchModify accepts at most 1000 IDs per call.
+BATCH_MODIFY_MAX_IDS = 1000
 
-def delete_email_tool(gmail_service, message_id: str) -> dict:
+
+class DeletionQueue:
+    """
+    Collects message IDs the agent has decided to delete and moves them to Trash in bulk
+    using users().messages().batchModify (add TRASH, remove INBOX).
+
+    enqueue() only records the ID. flush() makes blocking Gmail calls, so the caller runs it
+    off the event loop (e.g. source.run(queue.flush)) whenever is_full() reports that
+    config.DELETION_FLUSH_THRESHOLD IDs are waiting, and once more at the end of a run.
+    Flushes never overlap: a second caller waits for the first and then flushes whatever
+    is still pending. Every flushed ID gets its own status entry in `results`.
+
+    `execute` runs a prepared googleapiclient request; gmail_async passes its per-thread
+    connection (httplib2 is not thread-safe). Defaults to request.execute().
+    """
+
+    def __init__(self, gmail_service, flush_threshold=None, log_callback=print, execute=None):
+        self.gmail_service = gmail_service
+        self.execute = execute or (lambda request: request.execute())
+        self.flush_threshold = flush_threshold or config.DELETION_FLUSH_THRESHOLD
+        self.log_callback = log_callback
+        self.pending = []   # IDs waiting for the next flush, in queue order
+        self.in_flight = set() # IDs taken by a flush still running on another thread
+        self.results = {}   # message_id -> {"status": ..., "message": ...}
+        self.api_calls = 0
+        self._lock = threading.Lock() # flush() runs on an I/O thread while the loop keeps enqueueing
+        self._flush_lock = threading.Lock() # Held for the whole of a flush
+
+    def enqueue(self, message_id: str) -> dict:
+        """Adds a message ID to the queue. Never flushes; see is_full()."""
+        with self._lock:
+            if self.is_queued(message_id):
+                return {"status": "queued", "message": f"Email {message_id} is already queued for Trash."}
+            self.pending.append(message_id)
+        return {"status": "queued", "message": f"Email {message_id} queued for Trash."}
+
+    def is_full(self) -> bool:
+        """True once the flush threshold is reached and the caller should flush()."""
+        return len(self.pending) >= self.flush_threshold
+
+    def is_queued(self, message_id: str) -> bool:
+        """True if the ID has been queued (pending or already flushed) during this run."""
+        return message_id in self.results or message_id in self.in_flight or message_id in self.pending
+
+    def flush(self) -> dict:
+        """
+        Trashes every pending ID with batchModify in chunks of up to 1000.
+        Returns a dict of message_id -> status for the IDs flushed by this call.
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> dict:
+        from googleapiclient.errors import HttpError
+        flushed = {}
+        pending = self._take_pending()
+        if not pending:
+            return flushed
+        if not self.gmail_service:
+            for message_id in pending:
+                flushed[message_id] = {"status": "error", "message": "Internal error: Gmail service not available to deletion queue."}
+            self._finish_flush(flushed)
+            return flushed
+
+        for start in range(0, len(pending), BATCH_MODIFY_MAX_IDS):
+            chunk = pending[start:start + BATCH_MODIFY_MAX_IDS]
+            self.log_callback(f"--- DeletionQueue: moving {len(chunk)} message(s) to Trash via batchModify ---")
+            try:
+                rate_limiter.acquire_gmail_blocking('messages.batchModify')
+                self.api_calls += 1
+                retry_policy.call_blocking(
+                    self.execute,
+                    self.gmail_service.users().messages().batchModify(
+                        userId='me', body={'ids': chunk, 'addLabelIds': ['TRASH'], 'removeLabelIds': ['INBOX']}
+                    ),
+                    description=f"batchModify of {len(chunk)} message(s)", log_callback=self.log_callback,
+                )
+                for message_id in chunk:
+                    flushed[message_id] = {"status": "success", "message": f"Email {message_id} moved to Trash."}
+            except HttpError as error:
+                self.log_callback(f"  [Queue Error] batchModify failed for {len(chunk)} message(s): {error}")
+                for message_id in chunk:
+                    flushed[message_id] = {"status": "error", "message": f"API Error deleting message {message_id}: {error}"}
+            except Exception as e:
+                self.log_callback(f"  [Queue Error] Unexpected error during batchModify: {e}")
+                for message_id in chunk:
+                    flushed[message_id] = {"status": "error", "message": f"Unexpected error deleting message {message_id}: {e}"}
+
+        for message_id, result in flushed.items():
+            self.log_callback(f"  [Trash Result] {message_id}: {result['status']} - {result['message']}")
+        self._finish_flush(flushed)
+        return flushed
+
+    def _take_pending(self):
+        """Hands the pending IDs to a flush; they count as queued until _finish_flush()."""
+        with self._lock:
+            pending, self.pending = self.pending, []
+            self.in_flight.update(pending)
+        return pending
+
+    def _finish_flush(self, flushed):
+        with self._lock:
+            self.results.update(flushed)
+            self.in_flight.difference_update(flushed)
+
+
+def delete_email_tool(gmail_service, message_id: str, deletion_queue: DeletionQueue = None) -> dict:
     """
     Deletes the specified email message by moving it to the Trash in Gmail.
     Use this ONLY after confirming an email IS a job rejection.
@@ -13,22 +124,36 @@ def delete_email_tool(gmail_service, message_id: str) -> dict:
     Args:
         gmail_service: The authenticated Google API client service instance for Gmail.
         message_id (str): The unique ID of the Gmail message to be deleted.
+        deletion_queue (DeletionQueue, optional): If given, the ID is queued and trashed
+            in bulk when the queue flushes instead of with an immediate trash() call.
 
     Returns:
-        dict: A dictionary indicating the status ('success' or 'error')
+        dict: A dictionary indicating the status ('success', 'queued' or 'error')
               and an optional 'message'.
     """
+    from googleapiclient.errors import HttpError
     print(f"--- Tool: delete_email_tool executing for message_id: {message_id} ---")
+    if not message_id:
+        print("  [Tool Error] No message_id provided.")
+        return {"status": "error", "message": "Missing message_id argument."}
+
+    if deletion_queue is not None:
+        # Queued deletions don't need the service here (local archives have none)
+        result = deletion_queue.enqueue(message_id)
+        print(f"  [Tool Success] Message {message_id}: {result['message']}")
+        return result
+
     if not gmail_service:
         print("  [Tool Error] Gmail service object was not provided.")
         # This shouldn't happen if called correctly via partial
         return {"status": "error", "message": "Internal error: Gmail service not available to tool."}
-    if not message_id:
-        print("  [Tool Error] No message_id provided.")
-        return {"status": "error", "message": "Missing message_id argument."}
 
     try:
-        gmail_service.users().messages().trash(userId='me', id=message_id).execute()
+        rate_limiter.acquire_gmail_blocking('messages.trash')
+        retry_policy.call_blocking(
+            gmail_service.users().messages().trash(userId='me', id=message_id).execute,
+            description=f"messages.trash {message_id}",
+        )
         print(f"  [Tool Success] Moved message {message_id} to Trash via Gmail API.")
         return {"status": "success", "message": f"Email {message_id} moved to Trash."}
     except HttpError as error:
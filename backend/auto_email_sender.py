@@ -2,15 +2,14 @@ import os
 import os.path
 import traceback
 import base64
-import time
 from email.message import EmailMessage
 
 # --- Google API / Gmail ---
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+# Imported inside the functions that send mail, so benchmark/corpus_generator.py can reuse
+# the templates below without the Google client libraries.
+
+# Shared token-bucket limiter (paces sends against the Gmail quota instead of fixed sleeps)
+import rate_limiter
 
 # --- Configuration ---
 # Use 'gmail.send' scope, which is sufficient for sending.
@@ -43,6 +42,10 @@ The Mock Hiring Team
 # --- Gmail Authentication Function (Similar to previous) ---
 def get_gmail_service():
     """Authenticates with Gmail API for sending and returns the service object."""
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from googleapiclient.discovery import build
     creds = None
     print(f"--- Starting Gmail Authentication for Sender ---")
     if os.path.exists(TOKEN_PATH):
@@ -117,7 +120,9 @@ def create_message(sender, to, subject, message_text):
 # --- Function to Send Email ---
 def send_message(service, user_id, message):
     """Sends the prepared message using the Gmail API."""
+    from googleapiclient.errors import HttpError
     try:
+        rate_limiter.acquire_gmail_blocking('messages.send')
         sent_message = service.users().messages().send(userId=user_id, body=message).execute()
         print(f"  Message sent successfully. ID: {sent_message['id']}")
         return sent_message
@@ -184,10 +189,6 @@ def main():
         else:
             fail_count += 1
 
-        # Add a small delay to avoid hitting sending limits too quickly
-        if i < num_emails - 1: # Don't sleep after the last one
-            time.sleep(1.5) # Sleep for 1.5 seconds
-
     # 4. Print Summary
     print("\n--- Sending Complete ---")
     print(f"Successfully sent: {send_count}")
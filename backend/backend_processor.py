@@ -1,7 +1,9 @@
 # backend/backend_processor.py
+import time
 import asyncio
 import traceback
 import functools
+import concurrent.futures
 import os # Make sure os is imported
 
 # Import backend components (relative imports might work if run from root,
@@ -13,6 +15,19 @@ try:
     import gmail_utils
     import adk_tools
     import agent_config
+    import rate_limiter
+    import sync_state
+    import verdict_cache
+    import prefilter
+    import batch_classifier
+    import template_clustering
+    import session_pool
+    import structured_classifier
+    import message_parser
+    import gmail_async
+    import retry_policy
+    import mail_source
+    import metrics
 except ImportError:
     # If running flet_app.py from root, Python might not find backend modules directly.
     # Add backend directory to path if needed (less clean, but works)
@@ -24,36 +39,287 @@ except ImportError:
     import gmail_utils
     import adk_tools
     import agent_config
+    import rate_limiter
+    import sync_state
+    import verdict_cache
+    import prefilter
+    import batch_classifier
+    import template_clustering
+    import session_pool
+    import structured_classifier
+    import message_parser
+    import gmail_async
+    import retry_policy
+    import mail_source
+    import metrics
 
 
-# Import ADK components
-from google.adk.agents import Agent
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.genai import types as adk_types
-from googleapiclient.errors import HttpError
+# ADK, genai and googleapiclient are imported where they are first used, so importing this
+# module (e.g. when the Flet window opens) doesn't pay for the whole google-adk stack.
+def preload_dependencies():
+    """Imports the heavy ADK/Google API modules ahead of the first run (e.g. from a background thread)."""
+    import google.adk.agents
+    import google.adk.sessions
+    import google.adk.runners
+    import google.genai.types
+    import googleapiclient.discovery
+    import googleapiclient.errors
 
 # --- Global variable for Gmail service ---
 _gmail_service = None
 
+# --- Shared state for one processing run ---
+class _RunContext:
+    """Bundles what every pipeline stage needs during a single process_rejection_emails run."""
+
+    def __init__(self, source, log_callback, deletion_queue, runner, sessions,
+                 cache=None, email_prefilter=None, clusterer=None, tool_runner=None, model_tiers=None):
+        self.source = source # mail_source.MailSource: gmail_async.AsyncGmailClient, or a local archive
+        self.log_callback = log_callback
+        self.deletion_queue = deletion_queue
+        self.runner = runner # Runner for the agent of config.CLASSIFICATION_MODE
+        self.tool_runner = tool_runner or runner # Tool-calling agent, also the structured-mode fallback
+        self.model_tiers = model_tiers or [] # _ModelTier cascade for structured mode
+        self.sessions = sessions # session_pool.SessionPool shared by the classifier workers
+        self.cache = cache
+        self.email_prefilter = email_prefilter
+        self.clusterer = clusterer
+        # Incremental sync progress (see _sync_checkpoint)
+        self.history_sync = False # IDs came from the History API rather than a full scan
+        self.history_records = [] # (historyId, [message IDs]) of every history record queued, in order
+        self.next_page_token = None # messages.list page a capped full scan stopped before
+        self.stats = {'listed': 0, 'fetched': 0, 'fetch_errors': 0, 'analyzed': 0, 'cache_hits': 0,
+                      'prefilter_skips': 0, 'metadata_fetched': 0, 'cluster_hits': 0, 'llm_requests': 0, 'failed_ids': [],
+                      'fetch_failed_ids': [], 'retried': 0,
+                      'truncated': False, 'producer_error': False, 'fetcher_error': False}
+
+class _ModelTier:
+    """One model in the structured-mode cascade, with its per-run counters."""
+
+    def __init__(self, name, model, runner):
+        self.name = name
+        self.model = model
+        self.runner = runner
+        self.calls = 0
+        self.accepted = 0 # Verdicts confident enough to stop at this tier
+        self.escalated = 0 # Low-confidence or unparseable replies passed to the next tier
+        self.total_latency = 0.0
+
+    def summary(self):
+        avg_latency = self.total_latency / self.calls if self.calls else 0.0
+        return (f"  Tier '{self.name}' ({self.model}): {self.calls} call(s), {self.accepted} accepted, "
+                f"{self.escalated} escalated, avg latency {avg_latency:.2f}s, total {self.total_latency:.1f}s")
+
+def _make_result(message_id, verdict=None, response=None, cached=False, error=None, clustered=False, confidence=None):
+    return {'id': message_id, 'response': response, 'verdict': verdict, 'cached': cached,
+            'clustered': clustered, 'confidence': confidence, 'error': error}
+
+def _record_result(ctx, result):
+    """Folds one email's outcome into the run stats."""
+    if result['error']:
+        ctx.stats['failed_ids'].append(result['id'])
+        metrics.increment('classification_errors')
+    else:
+        ctx.stats['analyzed'] += 1
+        metrics.increment('verdicts', verdict=result['verdict'] or 'undetermined')
+        if result['cached']:
+            ctx.stats['cache_hits'] += 1
+            metrics.increment('cache_hits')
+        if result['clustered']:
+            ctx.stats['cluster_hits'] += 1
+            metrics.increment('cluster_hits')
+
+async def _flush_deletions(ctx, final=False):
+    """
+    Trashes the queued deletions on the source's I/O threads, where batchModify's rate-limit
+    waits and retry backoff can't stall the event loop. Mid-run this only happens once the
+    queue is full; the final flush drains whatever is left.
+    """
+    queue = ctx.deletion_queue
+    if not queue.pending or not (final or queue.is_full()):
+        return
+    if final:
+        ctx.log_callback(f"Flushing {len(queue.pending)} queued deletion(s)...")
+    with metrics.span('trash'):
+        await ctx.source.run(queue.flush)
+
+# --- Local short-circuits before any LLM call ---
+def _prescreen_email(ctx, email_details):
+    """
+    Resolves an email without the LLM when possible: clear negatives from the pre-filter,
+    or a matching entry in the verdict cache. Returns a result dict, or None to escalate.
+    """
+    with metrics.span('prefilter'):
+        message_id = email_details['id']
+        if ctx.email_prefilter:
+            skip, score, reasons = ctx.email_prefilter.should_skip(email_details)
+            if skip:
+                ctx.log_callback(f"  [Pre-filter] {message_id}: Not Rejection (score {score}; {'; '.join(reasons) or 'no signals'}). Skipping LLM.")
+                ctx.stats['prefilter_skips'] += 1
+                metrics.increment('prefilter_skips')
+                return _make_result(message_id, verdict=verdict_cache.VERDICT_NOT_REJECTION)
+
+        # Reuse an earlier decision if the same content was judged by the same model and prompt
+        if ctx.cache:
+            cached_verdict = ctx.cache.get(message_id, _email_digest(email_details))
+            if cached_verdict:
+                ctx.log_callback(f"<<< [{message_id}] Cached verdict: {cached_verdict} (no LLM call)")
+                if cached_verdict == verdict_cache.VERDICT_REJECTION:
+                    # A previous run decided to delete this but it is still in the inbox (e.g. the trash failed)
+                    ctx.deletion_queue.enqueue(message_id)
+                return _make_result(message_id, verdict=cached_verdict, cached=True)
+        return None
+
+def _email_digest(email_details):
+    return verdict_cache.content_hash(email_details.get('subject', 'No Subject'), email_details.get('body', ''))
+
+def _apply_cluster_verdict(ctx, email_details, verdict):
+    """Gives an email its template's verdict without an LLM call."""
+    message_id = email_details['id']
+    ctx.log_callback(f"<<< [{message_id}] Template cluster verdict: {verdict} (no LLM call)")
+    if verdict == verdict_cache.VERDICT_REJECTION:
+        ctx.deletion_queue.enqueue(message_id)
+    if ctx.cache:
+        ctx.cache.put(message_id, _email_digest(email_details), verdict)
+    return _make_result(message_id, verdict=verdict, clustered=True)
+
+async def _analyze_with_clustering(ctx, email_details, analyze_fn):
+    """
+    Runs analyze_fn(ctx, email) only for the first email of each template. Later emails of
+    the same template (in this run or from persisted signatures) reuse its verdict, waiting
+    for it if the representative is still being classified. A Rejection is only reused when
+    the email confirms it (TemplateClusterer.confirms_rejection); otherwise it is classified.
+    """
+    if not ctx.clusterer:
+        return await analyze_fn(ctx, email_details)
+    signature, domain = ctx.clusterer.signature_for(email_details)
+    entry = ctx.clusterer.find(signature, domain)
+    if entry:
+        verdict = await ctx.clusterer.verdict_for(entry, email_details)
+        if verdict:
+            return _apply_cluster_verdict(ctx, email_details, verdict)
+        # The representative failed, or this email doesn't confirm its Rejection; classify
+        # this one ourselves and let it stand in
+
+    entry = ctx.clusterer.add_representative(signature, domain, email_details)
+    result = None
+    try:
+        result = await analyze_fn(ctx, email_details)
+    finally:
+        ctx.clusterer.resolve(entry, result['verdict'] if result and not result['error'] else None)
+    return result
+
 # --- Function to run the analysis for a single email ---
-async def _analyze_single_email(runner, session_service, email_details: dict, log_callback):
-    """Analyzes a single email using ADK and calls log_callback with updates."""
+def _parse_verdict(response_text, used_delete_tool):
+    """Maps the agent's outcome to a verdict label, or None if it can't be determined."""
+    if used_delete_tool:
+        return verdict_cache.VERDICT_REJECTION
+    if not response_text:
+        return None
+    if "Not Rejection" in response_text:
+        return verdict_cache.VERDICT_NOT_REJECTION
+    if "Decision: Rejection" in response_text:
+        return verdict_cache.VERDICT_REJECTION
+    return None
+
+def _runner_model(runner):
+    """Model name of a Runner's agent, for metric labels."""
+    model = getattr(getattr(runner, 'agent', None), 'model', None)
+    return model if isinstance(model, str) else getattr(model, 'model', None) or 'unknown'
+
+async def _run_agent(ctx, runner, instruction, prompt_text, output_tokens=None):
+    """Runs one agent turn in a pooled session and returns the final response text (or None)."""
+    from google.genai import types as adk_types
+    content = adk_types.Content(role='user', parts=[adk_types.Part(text=prompt_text)])
+
+    model = _runner_model(runner)
+
+    async def run_once():
+        final_response_text = None
+        input_tokens = output_tokens_used = 0
+        # Borrow this worker's long-lived session; its history is wiped when handed back.
+        # Waiting for a session and for the rate limiter is timed as 'llm_wait', not 'llm'.
+        wait_started = time.perf_counter()
+        async with ctx.sessions.session() as session_id:
+            await rate_limiter.acquire_llm(instruction + prompt_text, output_tokens)
+            metrics.record('llm_wait', time.perf_counter() - wait_started)
+            ctx.stats['llm_requests'] += 1
+            metrics.increment('llm_requests', model=model)
+            with metrics.span('llm'):
+                async for event in runner.run_async(user_id=config.USER_ID, session_id=session_id, new_message=content):
+                    # Every model turn (a tool call and the final answer) reports its own usage
+                    usage = getattr(event, 'usage_metadata', None)
+                    if usage:
+                        input_tokens += usage.prompt_token_count or 0
+                        output_tokens_used += usage.candidates_token_count or 0
+                    if event.is_final_response() and event.content and event.content.parts:
+                        final_response_text = event.content.parts[0].text
+                        break
+        if not input_tokens: # No usage reported (e.g. a non-Gemini model); fall back to the estimate
+            input_tokens = rate_limiter.estimate_tokens(instruction + prompt_text)
+            output_tokens_used = rate_limiter.estimate_tokens(final_response_text or "")
+        metrics.increment('llm_tokens', input_tokens, model=model, direction='input')
+        metrics.increment('llm_tokens', output_tokens_used, model=model, direction='output')
+        return final_response_text
+
+    # Gemini 429/503/quota errors are retried with backoff; each attempt starts from a clean session
+    return await retry_policy.call_async(run_once, description="Gemini request", log_callback=ctx.log_callback)
+
+async def _analyze_structured(ctx, email_details, prompt_text):
+    """
+    Structured mode: one turn returning a JSON verdict; the backend queues the deletion.
+    Walks the model cascade, escalating while the verdict's confidence is below
+    config.CASCADE_CONFIDENCE_THRESHOLD (the last tier's verdict is always accepted).
+    Returns a result dict, or None if no tier produced a valid verdict.
+    """
+    message_id = email_details['id']
+    best = None # (parsed verdict, response text, tier) from the last tier that answered validly
+    for index, tier in enumerate(ctx.model_tiers):
+        is_last_tier = index == len(ctx.model_tiers) - 1
+        started = time.perf_counter()
+        try:
+            response_text = await _run_agent(ctx, tier.runner, agent_config.STRUCTURED_AGENT_INSTRUCTION, prompt_text)
+        finally:
+            tier.calls += 1
+            tier.total_latency += time.perf_counter() - started
+        parsed = structured_classifier.parse_verdict_response(response_text)
+        if parsed:
+            best = (parsed, response_text, tier)
+            if parsed.confidence >= config.CASCADE_CONFIDENCE_THRESHOLD or is_last_tier:
+                tier.accepted += 1
+                break
+            ctx.log_callback(f"  [Cascade] [{message_id}] '{tier.name}' confidence {parsed.confidence:.2f} is below "
+                             f"{config.CASCADE_CONFIDENCE_THRESHOLD}. Escalating.")
+        if not is_last_tier:
+            tier.escalated += 1
+
+    if not best:
+        ctx.log_callback(f"  [Warning] [{message_id}] Structured reply was not a valid verdict. Falling back to tool-calling agent.")
+        return None
+    parsed, response_text, tier = best
+    verdict = verdict_cache.VERDICT_REJECTION if parsed.is_rejection else verdict_cache.VERDICT_NOT_REJECTION
+    ctx.log_callback(f"<<< [{message_id}] Verdict ({tier.name}): {verdict} (confidence {parsed.confidence:.2f}) - {parsed.reason}")
+    if parsed.is_rejection:
+        ctx.deletion_queue.enqueue(message_id)
+    return _make_result(message_id, verdict=verdict, response=response_text, confidence=parsed.confidence)
+
+async def _analyze_single_email(ctx, email_details: dict):
+    """
+    Analyzes a single email with the ADK agent and logs updates via ctx.log_callback.
+    In structured mode the JSON-verdict agent is tried first; the tool-calling agent is the fallback.
+    Returns a result dict {'id', 'response', 'verdict', 'cached', 'error', ...} so concurrent runs stay attributable.
+    """
+    log_callback = ctx.log_callback
     if not email_details or 'id' not in email_details:
         log_callback(f"  [Error] Invalid email details received.")
-        return
+        return _make_result(None, error="Invalid email details.")
 
     message_id = email_details['id']
     subject = email_details.get('subject', 'No Subject')
     body = email_details.get('body', '')[:config.MAX_BODY_CHARS_FOR_PROMPT] # Truncate
 
     log_callback(f"\n>>> Analyzing Email ID: {message_id}")
-    log_callback(f"    Subject: {subject[:100]}...")
-
-    session_id = f"analyze_{message_id}"
-    session = session_service.create_session(
-        app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id
-    )
+    log_callback(f"    [{message_id}] Subject: {subject[:100]}...")
 
     prompt_text = f"""Analyze the following email content.
 Message ID: {message_id}
@@ -62,43 +328,520 @@ Subject: {subject}
 Body:
 {body}
 """
-    content = adk_types.Content(role='user', parts=[adk_types.Part(text=prompt_text)])
+
+    if config.CLASSIFICATION_MODE == 'structured':
+        try:
+            result = await _analyze_structured(ctx, email_details, prompt_text)
+            if result:
+                if ctx.cache:
+                    ctx.cache.put(message_id, _email_digest(email_details), result['verdict'])
+                return result
+        except Exception as e:
+            log_callback(f"  [Warning] [{message_id}] Structured run failed ({e}). Falling back to tool-calling agent.")
 
     final_response_text = "Agent analysis did not complete or produce a response."
+    error = None
     try:
-        async for event in runner.run_async(user_id=config.USER_ID, session_id=session_id, new_message=content):
-            if event.is_final_response() and event.content and event.content.parts:
-                final_response_text = event.content.parts[0].text
-                break
-        log_callback(f"<<< Agent Final Thought: {final_response_text}")
+        response_text = await _run_agent(ctx, ctx.tool_runner, agent_config.AGENT_INSTRUCTION, prompt_text)
+        if response_text:
+            final_response_text = response_text
+        log_callback(f"<<< [{message_id}] Agent Final Thought: {final_response_text}")
 
     except Exception as e:
+        error = str(e)
         log_callback(f"  [Error] Exception during ADK runner execution for {message_id}:")
         log_callback(traceback.format_exc()) # Log full traceback
+
+    verdict = None
+    if not error:
+        verdict = _parse_verdict(final_response_text, ctx.deletion_queue.is_queued(message_id))
+        if ctx.cache and verdict:
+            ctx.cache.put(message_id, _email_digest(email_details), verdict)
+    return _make_result(message_id, verdict=verdict, response=final_response_text, error=error)
+
+# --- Function to run the analysis for a batch of emails in one request ---
+async def _analyze_email_batch(ctx, emails):
+    """
+    Classifies several emails with one batch-agent request (config.CLASSIFICATION_MODE = 'batch').
+    Positives are queued for deletion together. A reply without exactly one verdict per
+    email in the batch is rejected, and every email in it counts as failed.
+    Returns one result dict per email.
+    """
+    log_callback = ctx.log_callback
+    message_ids = [email['id'] for email in emails]
+    log_callback(f"\n>>> Analyzing batch of {len(emails)} emails: {', '.join(message_ids)}")
+
+    prompt_text = batch_classifier.build_batch_prompt(emails)
+
+    final_response_text = None
+    try:
+        # Reply is a short JSON object per email
+        final_response_text = await _run_agent(ctx, ctx.runner, agent_config.BATCH_AGENT_INSTRUCTION, prompt_text,
+                                               output_tokens=20 * len(emails))
+    except Exception as e:
+        log_callback(f"  [Error] Exception during ADK batch run for {len(emails)} emails:")
+        log_callback(traceback.format_exc())
+        return [_make_result(message_id, error=str(e)) for message_id in message_ids]
+
+    verdicts = batch_classifier.parse_batch_response(final_response_text, message_ids)
+    if not verdicts:
+        log_callback(f"  [Error] Batch reply does not hold exactly one verdict per email; rejecting it for all {len(emails)}.")
+        return [_make_result(message_id, response=final_response_text, error="Invalid batch reply.")
+                for message_id in message_ids]
+    results = []
+    for email in emails:
+        message_id = email['id']
+        verdict = verdict_cache.VERDICT_REJECTION if verdicts[message_id] else verdict_cache.VERDICT_NOT_REJECTION
+        log_callback(f"<<< [{message_id}] Batch verdict: {verdict}")
+        if verdicts[message_id]:
+            ctx.deletion_queue.enqueue(message_id)
+        if ctx.cache:
+            ctx.cache.put(message_id, _email_digest(email), verdict)
+        results.append(_make_result(message_id, verdict=verdict, response=final_response_text))
+    return results
+
+# --- Streaming pipeline stages ---
+# list producer -> id_queue -> batch fetcher -> details_queue -> classifier workers
+# Both queues are bounded (config.PIPELINE_QUEUE_SIZE), so memory stays flat no matter
+# how many messages the query matches, and classification starts after the first page.
+_PIPELINE_DONE = None # Sentinel pushed through the queues when an upstream stage finishes
+
+class _HistoryExpired(Exception):
+    """The saved historyId is too old for users().history().list; a full scan is needed."""
+
+async def _produce_history_message_ids(ctx, start_history_id, id_queue):
+    """
+    Pages through users().history().list since start_history_id and feeds the IDs of newly
+    added messages that carry config.HISTORY_REQUIRED_LABELS into id_queue.
+    Raises _HistoryExpired if Gmail no longer has history that far back (HTTP 404).
+    """
+    from googleapiclient.errors import HttpError
+    max_emails = config.MAX_EMAILS_PER_RUN
+    required_labels = set(config.HISTORY_REQUIRED_LABELS)
+    seen_ids = set()
+    page_token = None
+    while True:
+        try:
+            with metrics.span('list'):
+                results = await ctx.source.list_history(
+                    start_history_id, page_token=page_token, history_types=['messageAdded'], label_id='INBOX'
+                )
+        except HttpError as error:
+            if error.resp.status == 404:
+                raise _HistoryExpired()
+            raise
+        for record in results.get('history', []):
+            record_ids = []
+            for added in record.get('messagesAdded', []):
+                message = added.get('message', {})
+                msg_id = message.get('id')
+                if not msg_id or msg_id in seen_ids or not required_labels.issubset(message.get('labelIds', [])):
+                    continue
+                seen_ids.add(msg_id)
+                record_ids.append(msg_id)
+            for msg_id in record_ids:
+                await id_queue.put(msg_id)
+            ctx.stats['listed'] += len(record_ids)
+            metrics.increment('messages_listed', len(record_ids))
+            ctx.history_records.append((record.get('id'), record_ids))
+            # The cap is applied between records, so every queued record is whole and can become the checkpoint
+            if max_emails and ctx.stats['listed'] >= max_emails:
+                ctx.stats['truncated'] = True
+                return
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+async def _produce_message_ids(ctx, search_query, id_queue, start_history_id=None, page_token=None):
+    """
+    Feeds message IDs into id_queue. With a start_history_id, only messages added since
+    that checkpoint are produced (History API); otherwise, or if the checkpoint has expired,
+    pages through messages().list (following nextPageToken), starting at page_token when
+    resuming an unfinished full scan.
+    """
+    from googleapiclient.errors import HttpError
+    max_emails = config.MAX_EMAILS_PER_RUN
+    resume_token = page_token
+    cancelled = False
+    try:
+        if start_history_id:
+            try:
+                ctx.log_callback(f"Incremental sync: listing messages added since historyId {start_history_id}...")
+                ctx.history_sync = True
+                await _produce_history_message_ids(ctx, start_history_id, id_queue)
+                ctx.log_callback(f"  History sync produced {ctx.stats['listed']} new message ID(s).")
+                return
+            except _HistoryExpired:
+                ctx.history_sync = False
+                ctx.log_callback(f"  History checkpoint {start_history_id} has expired. Falling back to a full scan.")
+                sync_state.clear_history_checkpoint()
+
+        while True:
+            page_size = config.LIST_PAGE_SIZE
+            if max_emails:
+                page_size = min(page_size, max_emails - ctx.stats['listed'])
+            try:
+                with metrics.span('list'):
+                    results = await ctx.source.list_messages(search_query, page_size, page_token)
+            except HttpError as error:
+                if page_token is None or page_token != resume_token or error.resp.status != 400:
+                    raise
+                ctx.log_callback("  Saved full-scan position is no longer valid. Restarting the scan from the first page.")
+                page_token = resume_token = None
+                continue
+            messages = results.get('messages', [])
+            for message_info in messages:
+                await id_queue.put(message_info['id'])
+            ctx.stats['listed'] += len(messages)
+            metrics.increment('messages_listed', len(messages))
+            if messages:
+                ctx.log_callback(f"  Listed {ctx.stats['listed']} message ID(s) so far...")
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+            if max_emails and ctx.stats['listed'] >= max_emails:
+                ctx.stats['truncated'] = True
+                ctx.next_page_token = page_token # Page sizes are capped, so the scan stops on a page boundary
+                break
+    except asyncio.CancelledError:
+        cancelled = True # The fetcher has stopped; nobody will read the sentinel (and put() could block forever)
+        raise
+    except HttpError as error:
+        ctx.stats['producer_error'] = True
+        ctx.log_callback(f"ERROR during Gmail search: {error}")
+        ctx.log_callback(traceback.format_exc())
+    except Exception as e:
+        ctx.stats['producer_error'] = True
+        ctx.log_callback(f"ERROR during Gmail search:")
+        ctx.log_callback(traceback.format_exc())
     finally:
+        if not cancelled:
+            await id_queue.put(_PIPELINE_DONE)
+
+async def _parse_messages(ctx, raw_messages, fetch_errors):
+    """
+    Decodes and parses fetched messages in the parser process pool, in chunks of
+    config.PARSE_CHUNK_SIZE, so CPU-heavy bodies don't stall the event loop.
+    Parse failures are added to fetch_errors. Returns the details in input order.
+    """
+    raw_items = [(message_data['id'], message_data) for message_data in raw_messages]
+    chunks = [raw_items[i:i + config.PARSE_CHUNK_SIZE] for i in range(0, len(raw_items), config.PARSE_CHUNK_SIZE)]
+    pool = message_parser.get_parse_pool()
+    if pool:
+        loop = asyncio.get_running_loop()
         try:
-            session_service.delete_session(
-                app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id
+            chunk_results = await asyncio.gather(
+                *(loop.run_in_executor(pool, message_parser.parse_messages, chunk) for chunk in chunks)
             )
-        except Exception as del_e:
-             log_callback(f"  [Warning] Error deleting session {session_id}: {del_e}")
+        except concurrent.futures.process.BrokenProcessPool as e:
+            ctx.log_callback(f"  [Warning] Parser process pool failed ({e}). Parsing this batch in-process.")
+            message_parser.reset_parse_pool()
+            chunk_results = [message_parser.parse_messages(chunk) for chunk in chunks]
+    else:
+        chunk_results = [message_parser.parse_messages(chunk) for chunk in chunks]
+
+    details_list = []
+    for message_id, details, parse_error in (item for chunk in chunk_results for item in chunk):
+        if parse_error:
+            fetch_errors[message_id] = parse_error
+        else:
+            details_list.append(details)
+    return details_list
+
+async def _screen_metadata(ctx, msg_ids):
+    """
+    Phase one of the two-phase fetch: downloads only headers and snippets and resolves bulk
+    mail with no rejection signals right away (Prefilter.should_skip_metadata). Returns the
+    IDs whose full message is still needed.
+    """
+    with metrics.span('fetch'):
+        metadata_list, _ = await ctx.source.get_messages_batch(msg_ids, metadata_only=True)
+    ctx.stats['metadata_fetched'] += len(metadata_list)
+    skipped_ids = set()
+    for metadata in metadata_list:
+        skip, score, reasons = ctx.email_prefilter.should_skip_metadata(metadata)
+        if skip:
+            ctx.log_callback(f"  [Pre-filter] {metadata['id']}: Not Rejection from headers/snippet "
+                             f"(score {score}; {'; '.join(reasons) or 'no signals'}). Skipping full fetch and LLM.")
+            ctx.stats['prefilter_skips'] += 1
+            metrics.increment('prefilter_skips')
+            skipped_ids.add(metadata['id'])
+            _record_result(ctx, _make_result(metadata['id'], verdict=verdict_cache.VERDICT_NOT_REJECTION))
+    # Messages whose metadata fetch failed get another chance in the full fetch
+    return [msg_id for msg_id in msg_ids if msg_id not in skipped_ids]
+
+async def _fetch_email_details(ctx, id_queue, details_queue, num_classifiers):
+    """Groups queued IDs into batches of up to config.GMAIL_BATCH_SIZE and fetches their details."""
+    upstream_done = False
+    cancelled = False
+    # Headers-first screening only pays off where a metadata fetch is cheaper than a full one
+    two_phase = config.METADATA_FIRST_FETCH and ctx.email_prefilter and ctx.source.supports_metadata_fetch
+    try:
+        while not upstream_done:
+            # Block for the first ID, then take whatever else is already waiting
+            msg_ids = []
+            msg_id = await id_queue.get()
+            while msg_id is not _PIPELINE_DONE:
+                msg_ids.append(msg_id)
+                if len(msg_ids) >= config.GMAIL_BATCH_SIZE or id_queue.empty():
+                    break
+                msg_id = id_queue.get_nowait()
+            if msg_id is _PIPELINE_DONE:
+                upstream_done = True
+            if not msg_ids:
+                continue
+
+            if two_phase:
+                msg_ids = await _screen_metadata(ctx, msg_ids)
+                if not msg_ids:
+                    continue
+
+            with metrics.span('fetch'):
+                raw_messages, fetch_errors = await ctx.source.get_messages_batch(msg_ids, raw=True)
+            with metrics.span('parse'):
+                details_list = await _parse_messages(ctx, raw_messages, fetch_errors)
+            for failed_id, fetch_error in fetch_errors.items():
+                ctx.log_callback(f"  Skipping message {failed_id} due to fetch error: {fetch_error}")
+            ctx.stats['fetch_errors'] += len(fetch_errors)
+            metrics.increment('fetch_errors', len(fetch_errors))
+            ctx.stats['fetch_failed_ids'].extend(fetch_errors)
+            ctx.stats['fetched'] += len(details_list)
+            metrics.increment('messages_fetched', len(details_list))
+            for details in details_list:
+                await details_queue.put(details)
+    except asyncio.CancelledError:
+        cancelled = True # By _run_stages: the classifiers are being cancelled too
+        raise
+    except Exception as e:
+        # Nothing reads id_queue after this; _run_stages cancels the producer once the classifiers finish
+        ctx.stats['fetcher_error'] = True
+        ctx.log_callback(f"ERROR while fetching email details:")
+        ctx.log_callback(traceback.format_exc())
+    finally:
+        if not cancelled:
+            for _ in range(num_classifiers):
+                await details_queue.put(_PIPELINE_DONE)
+
+async def _classify_emails(ctx, details_queue):
+    """Classifier worker: analyzes emails from details_queue one at a time until the fetcher finishes."""
+    while True:
+        email = await details_queue.get()
+        if email is _PIPELINE_DONE:
+            return
+        try:
+            result = _prescreen_email(ctx, email) or await _analyze_with_clustering(ctx, email, _analyze_single_email)
+        except Exception as e:
+            # Keep one bad email from taking down the worker
+            ctx.log_callback(f"  [Error] Unexpected failure analyzing {email.get('id')}: {e}")
+            result = _make_result(email.get('id'), error=str(e))
+        _record_result(ctx, result)
+        await _flush_deletions(ctx)
+
+async def _run_batch(ctx, emails):
+    """Classifies `emails` with one batch request and records the results."""
+    try:
+        results = await _analyze_email_batch(ctx, emails)
+    except Exception as e:
+        ctx.log_callback(f"  [Error] Unexpected failure analyzing batch: {e}")
+        results = [_make_result(email['id'], error=str(e)) for email in emails]
+    for result in results:
+        _record_result(ctx, result)
+    await _flush_deletions(ctx)
+    return results
+
+async def _classify_emails_batched(ctx, details_queue):
+    """
+    Classifier worker for batch mode: packs emails that pass the pre-screen into batches
+    bounded by config.BATCH_PROMPT_TOKEN_BUDGET and classifies each batch with one request.
+    With template clustering on, only one email per template goes into a batch; the others
+    wait for that representative's verdict.
+    """
+    carry = None # Email (already pre-screened) that did not fit the previous batch
+    upstream_done = False
+    while not upstream_done or carry:
+        batch, batch_tokens = [], 0
+        representatives = {} # message_id -> ClusterEntry for templates this batch will decide
+        waiting = [] # (email, ClusterEntry) pairs waiting on another representative
+        while True:
+            if carry:
+                email, carry = carry, None
+            elif upstream_done:
+                break
+            elif batch and details_queue.empty():
+                break # Don't hold a partial batch waiting for more mail
+            else:
+                email = await details_queue.get()
+                if email is _PIPELINE_DONE:
+                    upstream_done = True
+                    break
+                prescreened = _prescreen_email(ctx, email)
+                if prescreened:
+                    _record_result(ctx, prescreened)
+                    continue
+
+            signature = None
+            if ctx.clusterer:
+                signature, domain = ctx.clusterer.signature_for(email)
+                entry = ctx.clusterer.find(signature, domain)
+                if entry and entry.verdict:
+                    verdict = await ctx.clusterer.verdict_for(entry, email)
+                    if verdict:
+                        _record_result(ctx, _apply_cluster_verdict(ctx, email, verdict))
+                        continue
+                    entry = None # Unconfirmed Rejection: batch it with the LLM like a new template
+                if entry:
+                    waiting.append((email, entry))
+                    continue
+
+            email_tokens = batch_classifier.record_tokens(email)
+            if batch_classifier.batch_is_full(batch_tokens, len(batch), email_tokens):
+                carry = email
+                break
+            batch.append(email)
+            batch_tokens += email_tokens
+            if signature is not None:
+                # Register only once the email is really in this batch, so nothing waits on a carry
+                representatives[email['id']] = ctx.clusterer.add_representative(signature, domain, email)
+
+        if batch:
+            results = await _run_batch(ctx, batch)
+            for result in results:
+                if result['id'] in representatives:
+                    ctx.clusterer.resolve(representatives.pop(result['id']), None if result['error'] else result['verdict'])
+            for entry in representatives.values():
+                ctx.clusterer.resolve(entry, None)
+
+        # Members whose representative sits in this or another worker's batch
+        unresolved = []
+        for email, entry in waiting:
+            verdict = await ctx.clusterer.verdict_for(entry, email)
+            if verdict:
+                _record_result(ctx, _apply_cluster_verdict(ctx, email, verdict))
+            else:
+                unresolved.append(email)
+        if unresolved:
+            await _run_batch(ctx, unresolved)
+        await _flush_deletions(ctx) # Pre-screen and cluster verdicts queue deletions too
+
+def _save_sync_progress(ctx, start_history_id, run_start_history_id, scan_history_id):
+    """
+    Persists how far incremental sync got, so a run capped by config.MAX_EMAILS_PER_RUN (or
+    cut short by errors) still makes progress:
+      - history sync: the checkpoint moves to the last history record whose messages were
+        all handled (to run_start_history_id if the run read every record);
+      - full scan: the next messages.list page is saved, and once the last page is done the
+        checkpoint becomes the historyId the scan started at (scan_history_id).
+    Nothing advances past a message that failed, or after a fatal fetcher error.
+    """
+    stats = ctx.stats
+    log_callback = ctx.log_callback
+    if stats['fetcher_error']:
+        log_callback("Fetching stopped early; sync checkpoint not advanced.")
+        return
+    failed_ids = set(stats['fetch_failed_ids']) | set(stats['failed_ids'])
+    run_complete = not (stats['truncated'] or stats['producer_error'] or failed_ids)
+
+    if ctx.history_sync:
+        checkpoint = run_start_history_id if run_complete else None
+        if checkpoint is None:
+            for history_id, record_ids in ctx.history_records:
+                if failed_ids.intersection(record_ids):
+                    break
+                checkpoint = history_id
+        if checkpoint and (run_complete or str(checkpoint) != str(start_history_id)):
+            sync_state.save_history_checkpoint(checkpoint)
+            log_callback(f"Saved sync checkpoint at historyId {checkpoint}"
+                         f"{'' if run_complete else ' (partial run: later mail is picked up next time)'}.")
+        else:
+            log_callback("Run was partial (errors); sync checkpoint not advanced.")
+        return
+
+    if run_complete:
+        sync_state.save_history_checkpoint(scan_history_id)
+        log_callback(f"Full scan finished. Saved sync checkpoint at historyId {scan_history_id}.")
+    elif stats['truncated'] and ctx.next_page_token and not (stats['producer_error'] or failed_ids):
+        sync_state.save_scan_progress(ctx.next_page_token, scan_history_id)
+        log_callback("Run limit reached; the full scan continues from here next run.")
+    else:
+        log_callback("Run was partial (errors); sync checkpoint not advanced.")
+
+async def _run_stages(stages, producer=None):
+    """
+    Runs the fetch and classify stages to completion, with the list producer alongside.
+    The stages are linked by bounded queues, so a stage that stops early would leave its
+    neighbours blocked on get()/put() forever: when the stages finish (normally, or after
+    a fatal fetcher error stopped reading id_queue) the producer is cancelled, and if any
+    stage raises, every other one is cancelled before the error propagates.
+    """
+    producer_task = asyncio.ensure_future(producer) if producer is not None else None
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks + ([producer_task] if producer_task else []):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, *([producer_task] if producer_task else []), return_exceptions=True)
+
+async def _drain_retry_queue(ctx, classify_worker, num_classifiers):
+    """
+    Gives every message that failed to fetch or classify (after per-call retries) one more
+    pass through the fetch and classify stages, once the rest of the run has finished.
+    """
+    retry_ids = list(dict.fromkeys(ctx.stats['fetch_failed_ids'] + ctx.stats['failed_ids']))
+    if not retry_ids:
+        return
+    ctx.log_callback(f"--- Retrying {len(retry_ids)} message(s) that failed earlier in the run ---")
+    ctx.stats['retried'] += len(retry_ids)
+    ctx.stats['fetch_failed_ids'], ctx.stats['failed_ids'], ctx.stats['fetch_errors'] = [], [], 0
+    id_queue = asyncio.Queue()
+    for msg_id in retry_ids:
+        id_queue.put_nowait(msg_id)
+    id_queue.put_nowait(_PIPELINE_DONE)
+    details_queue = asyncio.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+    await _run_stages([
+        _fetch_email_details(ctx, id_queue, details_queue, num_classifiers),
+        *(classify_worker(ctx, details_queue) for _ in range(num_classifiers)),
+    ])
+    recovered = len(retry_ids) - len(set(ctx.stats['fetch_failed_ids'] + ctx.stats['failed_ids']))
+    ctx.log_callback(f"  Retry pass recovered {recovered} of {len(retry_ids)} message(s).")
 
 # --- Main Processing Function (Callable from Flet) ---
 async def process_rejection_emails(log_callback):
     """
     Authenticates, fetches emails, runs ADK analysis, and uses log_callback for UI updates.
-    Returns summary message.
+    Returns summary message. Stage timings and counters are exported per metrics.py.
     """
+    run_metrics = metrics.start_run(source=config.MAIL_SOURCE_PATH or "Gmail")
+    try:
+        return await _process_rejection_emails(log_callback)
+    finally:
+        metrics.finish_run()
+        run_metrics.export(log_callback)
+
+async def _process_rejection_emails(log_callback):
     global _gmail_service
     processed_count = 0
     deleted_count = 0 # We need the tool to report back if deletion happened
 
     log_callback("--- Starting Email Rejection Processor ---")
 
-    # 1. Authenticate with Gmail
-    if not _gmail_service: # Authenticate only if needed
+    # 1. Authenticate with Gmail (not needed to replay a local archive)
+    local_source = None
+    if config.MAIL_SOURCE_PATH:
+        try:
+            local_source = mail_source.open_local_source(config.MAIL_SOURCE_PATH)
+        except OSError as e:
+            log_callback(f"ERROR: Could not open mail archive: {e}")
+            return "Error: Mail archive could not be opened."
+        log_callback(f"Replaying local {local_source.name} '{config.MAIL_SOURCE_PATH}' instead of Gmail (archive is not modified).")
+    else:
+        # Asked on every run: gmail_utils returns its cached client at once, and drops it
+        # (re-authenticating here) once the token can no longer be refreshed
         log_callback("Attempting Gmail authentication...")
-        _gmail_service = gmail_utils.get_gmail_service() # This uses paths from config.py
+        with metrics.span('auth'):
+            _gmail_service = gmail_utils.get_gmail_service() # This uses paths from config.py
         if not _gmail_service:
             log_callback("ERROR: Failed to initialize Gmail service.")
             # Check if token path exists, maybe prompt user to delete it if auth keeps failing
@@ -106,106 +849,219 @@ async def process_rejection_emails(log_callback):
                  log_callback(f"  Hint: Try deleting '{config.GMAIL_TOKEN_PATH}' and restarting if authentication fails repeatedly.")
             return "Error: Gmail authentication failed."
         log_callback("Gmail authentication successful.")
-    else:
-        log_callback("Using existing Gmail authentication.")
 
 
     # 2. Verify API Key (Basic Check)
     if not config.GOOGLE_API_KEY or config.GOOGLE_API_KEY == "YOUR_GOOGLE_API_KEY_HERE":
          log_callback("CRITICAL ERROR: GOOGLE_API_KEY not set correctly in config.py or environment.")
+         if local_source:
+             local_source.close()
          return "Error: Gemini API Key not configured."
     log_callback("API key seems configured.")
 
-    # 3. Prepare ADK Tool with current Gmail service
-    def delete_email_wrapper(message_id: str) -> dict:
-        """Deletes the specified email message by moving it to the Trash in Gmail. Use this ONLY after confirming an email IS a job rejection.
+    # Every Gmail call from here on runs on gmail_async's I/O threads, off the event loop
+    source = local_source or gmail_async.AsyncGmailClient(_gmail_service, log_callback=log_callback)
+    cache = None
+    sessions = None
+    # Closed however the run ends (errors, cancellation): the archive or Gmail I/O threads,
+    # the SQLite connection and the ADK sessions
+    try:
+        # 3. Prepare ADK Tool with current Gmail service
+        # Deletions are queued and trashed in bulk with batchModify instead of one trash() per email
+        # (for a local archive, recorded in config.LOCAL_VERDICTS_PATH instead).
+        deletion_queue = source.create_deletion_queue(log_callback=log_callback)
 
-        Args:
-            message_id (str): The unique ID of the Gmail message to be deleted.
+        def delete_email_wrapper(message_id: str) -> dict:
+            """Deletes the specified email message by moving it to the Trash in Gmail. Use this ONLY after confirming an email IS a job rejection.
 
-        Returns:
-            dict: A dictionary indicating the status ('success' or 'error') and an optional 'message'.
-        """
-        log_callback(f"--- Wrapper: Attempting delete_email_tool for message_id: {message_id} ---")
-        result = adk_tools.delete_email_tool(_gmail_service, message_id)
-        log_callback(f"  [Tool Result] Status: {result.get('status')}, Msg: {result.get('message')}")
-        return result
+            Args:
+                message_id (str): The unique ID of the Gmail message to be deleted.
 
-    prepared_tools = [delete_email_wrapper]
+            Returns:
+                dict: A dictionary indicating the status ('success' or 'error') and an optional 'message'.
+            """
+            log_callback(f"--- Wrapper: Attempting delete_email_tool for message_id: {message_id} ---")
+            with metrics.span('tool'):
+                result = adk_tools.delete_email_tool(_gmail_service, message_id, deletion_queue)
+            log_callback(f"  [Tool Result] Status: {result.get('status')}, Msg: {result.get('message')}")
+            return result
 
-    # 4. Create ADK Agent Instance
-    log_callback("Creating ADK Agent...")
-    try:
-        # Ensure LiteLLM wrapper is used if ADK_MODEL_STRING needs it
+        prepared_tools = [delete_email_wrapper]
 
-        # Or if using a direct model name compatible with Agent's default:
-        # agent_model = config.ADK_MODEL_STRING # e.g., "gemini-1.5-flash-latest"
+        # 4. Create ADK Agent Instance
+        log_callback("Creating ADK Agent...")
+        try:
+            from google.adk.agents import Agent
+            from google.adk.sessions import InMemorySessionService
+            from google.adk.runners import Runner
+            # The tool-calling agent is always available: it is the 'tool' mode agent and the
+            # fallback when a structured verdict can't be parsed
+            tool_agent = Agent(
+                name=agent_config.AGENT_NAME,
+                model = config.ADK_MODEL_STRING,
+                description=agent_config.AGENT_DESCRIPTION,
+                instruction=agent_config.AGENT_INSTRUCTION,
+                tools=prepared_tools, # Provide the wrapper tool function
+            )
+            structured_agents = []
+            if config.CLASSIFICATION_MODE == 'batch':
+                # Batch mode returns JSON verdicts; the backend queues deletions itself
+                agent_instruction = agent_config.BATCH_AGENT_INSTRUCTION
+                agent_model = config.ADK_MODEL_STRING
+                rejection_agent = Agent(
+                    name=agent_config.BATCH_AGENT_NAME,
+                    model = agent_model,
+                    description=agent_config.BATCH_AGENT_DESCRIPTION,
+                    instruction=agent_instruction,
+                )
+            elif config.CLASSIFICATION_MODE == 'structured':
+                # One-turn constrained JSON verdict, no tool round trip; one agent per cascade tier
+                agent_instruction = agent_config.STRUCTURED_AGENT_INSTRUCTION
+                cascade_models = config.MODEL_CASCADE or [config.ADK_MODEL_STRING]
+                agent_model = " > ".join(cascade_models) # Verdicts depend on the whole cascade
+                for tier_index, tier_model in enumerate(cascade_models):
+                    structured_agents.append(Agent(
+                        name=f"{agent_config.STRUCTURED_AGENT_NAME}_tier{tier_index}",
+                        model = tier_model,
+                        description=agent_config.STRUCTURED_AGENT_DESCRIPTION,
+                        instruction=agent_instruction,
+                        output_schema=structured_classifier.EmailVerdict,
+                    ))
+                rejection_agent = structured_agents[0]
+                if len(cascade_models) > 1:
+                    log_callback(f"Model cascade: {agent_model} (escalate below confidence {config.CASCADE_CONFIDENCE_THRESHOLD}).")
+            else:
+                agent_instruction = agent_config.AGENT_INSTRUCTION
+                agent_model = config.ADK_MODEL_STRING
+                rejection_agent = tool_agent
+            log_callback(f"Agent '{rejection_agent.name}' created (classification mode: {config.CLASSIFICATION_MODE}).")
+        except Exception as agent_e:
+            log_callback(f"!!! Error Creating ADK Agent: {agent_e}")
+            log_callback(traceback.format_exc())
+            return "Error: Failed to create ADK Agent."
 
-        rejection_agent = Agent(
-            name=agent_config.AGENT_NAME,
-            model = "gemini-2.0-flash",
-            description=agent_config.AGENT_DESCRIPTION,
-            instruction=agent_config.AGENT_INSTRUCTION,
-            tools=prepared_tools, # Provide the wrapper tool function
+        # 5. Set up ADK Runner and Session Service
+        session_service = InMemorySessionService()
+        runner = Runner(
+            agent=rejection_agent,
+            app_name=config.APP_NAME,
+            session_service=session_service,
         )
-        log_callback(f"Agent '{rejection_agent.name}' created.")
-    except Exception as agent_e:
-        log_callback(f"!!! Error Creating ADK Agent: {agent_e}")
-        log_callback(traceback.format_exc())
-        return "Error: Failed to create ADK Agent."
-
-    # 5. Set up ADK Runner and Session Service
-    session_service = InMemorySessionService()
-    runner = Runner(
-        agent=rejection_agent,
-        app_name=config.APP_NAME,
-        session_service=session_service,
-    )
-    log_callback("ADK Runner and Session Service initialized.")
-
-    # 6. Fetch Emails from Gmail
-    log_callback("Fetching Emails from Gmail...")
-    # Make sure the search query in config.py or here is what you want
-    search_query = 'in:inbox label:inbox is:unread category:primary' # Example
-    log_callback(f"Using Gmail search query: '{search_query}' (Limit: {config.MAX_EMAILS_PER_RUN})")
-    emails_to_analyze = []
-    try:
-        results = _gmail_service.users().messages().list(
-            userId='me', q=search_query, maxResults=config.MAX_EMAILS_PER_RUN
-        ).execute()
-        messages = results.get('messages', [])
+        tool_runner = runner if rejection_agent is tool_agent else Runner(
+            agent=tool_agent,
+            app_name=config.APP_NAME,
+            session_service=session_service,
+        )
+        model_tiers = []
+        for tier_index, tier_agent in enumerate(structured_agents):
+            tier_runner = runner if tier_agent is rejection_agent else Runner(
+                agent=tier_agent,
+                app_name=config.APP_NAME,
+                session_service=session_service,
+            )
+            model_tiers.append(_ModelTier(f"tier{tier_index}", tier_agent.model, tier_runner))
+        log_callback("ADK Runner and Session Service initialized.")
+
+        # Verdict cache: skip the LLM for emails already judged under the same model and prompt
+        if config.VERDICT_CACHE_ENABLED:
+            try:
+                cache = verdict_cache.VerdictCache(
+                    model=agent_model,
+                    prompt_version=verdict_cache.compute_prompt_version(agent_instruction),
+                    path=config.LOCAL_VERDICT_CACHE_PATH if local_source else None,
+                )
+                log_callback(f"Verdict cache opened at '{cache.path}' ({cache.invalidated} stale entries invalidated).")
+            except Exception as e:
+                log_callback(f"  [Warning] Could not open verdict cache ({e}). Continuing without it.")
+
+        # Local pre-filter: clear negatives never reach the agent
+        email_prefilter = prefilter.Prefilter() if config.PREFILTER_ENABLED else None
+
+        # 6. Read the mailbox historyId before listing, so mail arriving mid-run is picked up next time
+        run_start_history_id = None
+        incremental_sync = config.INCREMENTAL_SYNC and source.supports_history
+        start_history_id = sync_state.load_history_checkpoint() if incremental_sync else None
+        scan_page_token, scan_history_id = sync_state.load_scan_progress() if incremental_sync else (None, None)
+        if incremental_sync:
+            try:
+                run_start_history_id = (await source.get_profile()).get('historyId')
+            except Exception as e:
+                log_callback(f"  [Warning] Could not read mailbox historyId ({e}). Incremental sync disabled for this run.")
+                start_history_id = scan_page_token = scan_history_id = None
+        if scan_page_token:
+            log_callback(f"Resuming the full scan started at historyId {scan_history_id}.")
+
+        # 7. Stream emails from Gmail through the ADK Agent
+        log_callback(f"Fetching Emails from {source.name}...")
+        search_query = config.GMAIL_SEARCH_QUERY
+        if local_source:
+            log_callback(f"Classifying every message in the archive (Limit: {config.MAX_EMAILS_PER_RUN or 'none'})")
+        else:
+            log_callback(f"Using Gmail search query: '{search_query}' (Limit: {config.MAX_EMAILS_PER_RUN or 'none'})")
+        num_classifiers = max(1, config.MAX_CONCURRENT_ANALYSES)
+        log_callback(f"--- Streaming emails to ADK Agent (concurrency: {num_classifiers}) ---")
+        # Near-duplicate template clustering: one LLM verdict per recurring email template
+        clusterer = template_clustering.TemplateClusterer(cache) if config.TEMPLATE_CLUSTERING_ENABLED else None
+
+        # One long-lived ADK session per classifier worker, reset between emails
+        sessions = session_pool.SessionPool(session_service, num_classifiers)
 
-        if not messages:
+        ctx = _RunContext(source, log_callback, deletion_queue, runner, sessions, cache, email_prefilter, clusterer,
+                          tool_runner, model_tiers)
+        stats = ctx.stats
+        classify_worker = _classify_emails_batched if config.CLASSIFICATION_MODE == 'batch' else _classify_emails
+        id_queue = asyncio.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+        details_queue = asyncio.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+        await _run_stages([
+            _fetch_email_details(ctx, id_queue, details_queue, num_classifiers),
+            *(classify_worker(ctx, details_queue) for _ in range(num_classifiers)),
+        ], producer=_produce_message_ids(ctx, search_query, id_queue, start_history_id, scan_page_token))
+        if config.RETRY_FAILED_AT_END:
+            await _drain_retry_queue(ctx, classify_worker, num_classifiers)
+        processed_count = stats['analyzed']
+        if not stats['listed']:
             log_callback("No new messages found matching the query.")
         else:
-            log_callback(f"Found {len(messages)} emails. Fetching details...")
-            for message_info in messages:
-                await asyncio.sleep(0.1) # Small delay
-                msg_id = message_info['id']
-                details = gmail_utils.get_email_details(_gmail_service, msg_id)
-                if details:
-                    emails_to_analyze.append(details)
-                else:
-                    log_callback(f"  Skipping message {msg_id} due to fetch error.")
-            log_callback(f"Fetched details for {len(emails_to_analyze)} emails.")
+            log_callback(f"Listed {stats['listed']} emails, fetched details for {stats['fetched']}.")
+            if stats['metadata_fetched']:
+                log_callback(f"  Two-phase fetch: {stats['metadata_fetched']} headers-only, {stats['fetched']} full message(s) downloaded.")
+        if stats['failed_ids']:
+            log_callback(f"  [Warning] Analysis failed for {len(stats['failed_ids'])} email(s): {', '.join(str(i) for i in stats['failed_ids'])}")
 
-    except HttpError as error:
-        log_callback(f"ERROR during Gmail search: {error}")
-        log_callback(traceback.format_exc())
-    except Exception as e:
-        log_callback(f"ERROR during Gmail search:")
-        log_callback(traceback.format_exc())
+        # 8. Flush any deletions still waiting in the queue
+        await _flush_deletions(ctx, final=True)
+        deleted_count = sum(1 for result in deletion_queue.results.values() if result['status'] == 'success')
+        metrics.increment('rejections_removed', deleted_count, action='recorded' if local_source else 'trashed')
 
-    # 7. Process Emails with ADK Agent
-    if emails_to_analyze:
-        log_callback(f"--- Analyzing {len(emails_to_analyze)} Emails with ADK Agent ---")
-        processed_count = len(emails_to_analyze)
-        for email in emails_to_analyze:
-            await _analyze_single_email(runner, session_service, email, log_callback)
-            await asyncio.sleep(1) # Delay between emails
-    else:
-        log_callback("No emails fetched to analyze.")
+        # 9. Advance the incremental sync checkpoint past everything this run finished
+        if run_start_history_id:
+            _save_sync_progress(ctx, start_history_id, run_start_history_id, scan_history_id or run_start_history_id)
 
-    summary = f"Processing complete. Analyzed: {processed_count} emails."
-    log_callback(f"\n--- Finished ---\n{summary}")
-    return summary
\ No newline at end of file
+        if email_prefilter:
+            log_callback(email_prefilter.summary())
+        if clusterer:
+            log_callback(clusterer.summary())
+        if model_tiers:
+            log_callback("Model tiers:")
+            for tier in model_tiers:
+                log_callback(tier.summary())
+        if config.METRICS_LOG_STAGES and metrics.current:
+            log_callback("Stage timings:")
+            for line in metrics.current.stage_report():
+                log_callback(line)
+        summary = (f"Processing complete. Analyzed: {processed_count} emails "
+                   f"({stats['cache_hits']} from verdict cache, {stats['cluster_hits']} from template clusters, "
+                   f"{stats['llm_requests']} LLM requests). "
+                   f"{'Rejections recorded' if local_source else 'Moved to Trash'}: {deleted_count}.")
+        if len(model_tiers) > 1:
+            summary += " Cascade: " + ", ".join(f"{tier.model} {tier.calls} call(s)/{tier.accepted} accepted" for tier in model_tiers) + "."
+        if stats['fetcher_error']:
+            summary += " Stopped early: fetching email details failed (see log)."
+        log_callback(f"\n--- Finished ---\n{summary}")
+        return summary
+    finally:
+        if sessions:
+            sessions.close()
+        source.close()
+        if cache:
+            cache.close()
\ No newline at end of file
@@ -0,0 +1,76 @@
+# backend/batch_classifier.py
+import re
+import html
+import json
+
+import config
+import rate_limiter
+
+# Helpers for config.CLASSIFICATION_MODE = 'batch': pack several emails into one prompt
+# (so AGENT_INSTRUCTION-sized overhead is paid once per batch, not once per email)
+# and read back a JSON verdict per message_id.
+#
+# Subjects and bodies are untrusted: each email sits in its own <email id="..."> block with
+# its text HTML-escaped, so no email can close its block, open a fake one for another ID or
+# pass for instructions. A reply is only accepted if it has exactly one verdict per ID.
+
+
+def format_email_record(email_details):
+    """Renders one email as an <email id="..."> block with escaped subject and body."""
+    subject = html.escape(email_details.get('subject', 'No Subject'))
+    body = html.escape(email_details.get('body', '')[:config.BATCH_BODY_CHARS])
+    return (f'<email id="{html.escape(email_details["id"])}">\n<subject>{subject}</subject>\n'
+            f'<body>\n{body}\n</body>\n</email>\n')
+
+
+def record_tokens(email_details):
+    """Estimated prompt tokens one email adds to a batch."""
+    return rate_limiter.estimate_tokens(format_email_record(email_details))
+
+
+def batch_is_full(batch_tokens, batch_size, next_tokens):
+    """True if adding an email of `next_tokens` would exceed the batch budget."""
+    if batch_size == 0:
+        return False # Always take at least one email, even an oversized one
+    return (batch_size >= config.BATCH_MAX_EMAILS
+            or batch_tokens + next_tokens > config.BATCH_PROMPT_TOKEN_BUDGET)
+
+
+def build_batch_prompt(emails):
+    records = "\n".join(format_email_record(email) for email in emails)
+    return f"""Classify each of the following {len(emails)} emails.
+
+{records}"""
+
+
+def parse_batch_response(response_text, expected_ids):
+    """
+    Extracts {message_id: is_rejection} from the agent's reply.
+    Tolerates Markdown code fences and surrounding prose. The reply must hold exactly one
+    boolean verdict for every requested ID and nothing else; otherwise it is rejected as a
+    whole and the result is empty (an email may have steered the reply, so none of it is trusted).
+    """
+    if not response_text:
+        return {}
+    text = re.sub(r"```(?:json)?", "", response_text)
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+
+    if not isinstance(items, list):
+        return {}
+    verdicts = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('is_rejection'), bool):
+            return {}
+        message_id = str(item.get('message_id', ''))
+        if message_id in verdicts:
+            return {}
+        verdicts[message_id] = item['is_rejection']
+    if set(verdicts) != set(expected_ids):
+        return {}
+    return verdicts
@@ -0,0 +1,7 @@
+# backend/benchmark/__init__.py
+# Offline benchmark for the rejection pipeline: an in-process fake Gmail service
+# (fake_gmail.py), a stub LLM with configurable latency and verdicts (fake_llm.py) and a
+# runner that drives backend_processor.process_rejection_emails against them
+# (run_benchmark.py). No network access, Gmail account or Gemini key is needed.
+#
+#   cd backend && python -m benchmark.run_benchmark --emails 2000 --llm-latency 0.3
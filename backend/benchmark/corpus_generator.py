@@ -0,0 +1,367 @@
+# backend/benchmark/corpus_generator.py
+import os
+import re
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import datetime
+import email
+import email.policy
+import concurrent.futures
+from email.utils import format_datetime
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import auto_email_sender
+import message_parser
+
+# Writes synthetic mailboxes for offline load tests, as Gmail API message resources
+# (JSON Lines, one messages.get format='full' resource per line), .eml files or one mbox.
+# Every message is a pure function of (seed, index), so corpora are reproducible, can be
+# rendered in parallel and fake_gmail.FakeMailbox can generate the same messages on demand.
+# The category each message was generated as is stored in an X-Corpus-Category header,
+# the ground truth for accuracy runs.
+#
+#   cd backend && python -m benchmark.corpus_generator --count 100000 --format mbox --output corpus.mbox
+
+CATEGORIES = ['rejection', 'interview', 'newsletter', 'other']
+STRUCTURES = ['plain', 'alternative', 'html_only', 'nested']
+CATEGORY_HEADER = 'X-Corpus-Category'
+
+_COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Vandelay", "Stark Industries", "Wayne Enterprises",
+              "Soylent", "Tyrell", "Cyberdyne", "Wonka", "Massive Dynamic", "Aperture", "Oscorp", "Gringotts"]
+_ROLES = ["Software Engineer", "Data Analyst", "Product Manager", "ML Engineer", "Designer", "Site Reliability Engineer"]
+_FIRST_NAMES = ["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Riley", "Casey", "Jamie"]
+
+# The mock rejection auto_email_sender.py sends, plus the other shapes rejections come in
+_TEMPLATES = {
+    'rejection': [
+        (auto_email_sender.EMAIL_SUBJECT_TEMPLATE.replace("{}", "{n}"), auto_email_sender.EMAIL_BODY_TEMPLATE.replace("{}", "{n}")),
+        ("Update on your application for {role}",
+         "Dear {name},\n\nThank you for your interest in the {role} position at {company}. Unfortunately, we have decided "
+         "to move forward with other candidates whose experience more closely matches our needs.\n\n"
+         "We appreciate the time you invested and wish you success in your search.\n\nBest regards,\n{company} Talent Team\n"),
+        ("Your application to {company}",
+         "Hi {name},\n\nWe appreciate your interest but regret to inform you that the {role} position has been filled. "
+         "We will keep your resume on file and reach out if a suitable role opens up.\n\nKind regards,\n{company} Recruiting\n"),
+    ],
+    'interview': [
+        ("Interview invitation: {role} at {company}",
+         "Hi {name},\n\nWe enjoyed reading your application for the {role} role and would like to schedule a 30 minute "
+         "call with the hiring manager next week. Please share a few times that work for you.\n\nThanks,\n{company} Recruiting\n"),
+        ("Next steps for your {company} application",
+         "Dear {name},\n\nCongratulations! You have been selected to move forward to the technical interview for the "
+         "{role} position. Use the link below to pick a slot.\n\nBest,\nThe {company} Hiring Team\n"),
+    ],
+    'newsletter': [
+        ("{company} weekly digest #{n}",
+         "Here are this week's top stories from {company}.\n\nNew features: faster search, dark mode and more.\n\n"
+         "Upcoming events: join our community meetup next Thursday.\n\nYou are receiving this because you subscribed.\n"),
+        ("{n} new jobs matching \"{role}\"",
+         "Hi {name},\n\nWe found new {role} jobs you might like, including roles at {company}.\n\n"
+         "View all jobs and update your alert preferences in your account settings.\n"),
+    ],
+    'other': [
+        ("Your {company} receipt #{n}",
+         "Thanks for your order, {name}. Your payment of ${n}.00 has been processed and your items will ship soon.\n"),
+        ("Re: lunch on Friday?",
+         "Hey {name},\n\nFriday works for me. How about the place near {company}'s office at noon?\n\nCheers\n"),
+    ],
+}
+_QUOTED_REPLY = "\nOn Mon, Jan 6, 2025 at 9:00 AM <you@example.com> wrote:\n> Hi, I wanted to follow up on my application.\n> Thanks!\n"
+_FOOTER = "\n--\nThis message was sent to you@example.com. Unsubscribe | Privacy Policy | Manage preferences\n"
+_BASE_TIMESTAMP = 1736150400 # 2025-01-06; message N is N seconds later
+
+
+def message_id(index):
+    """Gmail-style 16 hex digit ID for message `index`."""
+    return f"{index:016x}"
+
+
+def message_index(msg_id):
+    return int(msg_id, 16)
+
+
+def _pick(rng, ratios):
+    draw = rng.random()
+    for name, ratio in ratios.items():
+        draw -= ratio
+        if draw < 0:
+            return name
+    return list(ratios)[-1]
+
+
+def _html(text, rng):
+    paragraphs = '\n'.join(f'<p style="font-family:Arial,sans-serif;font-size:14px;margin:0 0 12px">{line}</p>'
+                           for line in text.split('\n') if line)
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><style>td {{ padding: 24px }} .footer {{ color: #999 }}</style></head>\n'
+            f'<body><table width="100%" cellpadding="0" cellspacing="0"><tr><td>\n{paragraphs}\n</td></tr></table>\n'
+            f'<img src="https://track.example.com/open/{rng.getrandbits(64):x}.gif" width="1" height="1" alt=""></body></html>\n')
+
+
+# Messages are assembled as a small part tree and serialized by hand: the stdlib email
+# package (EmailMessage + BytesGenerator) re-parses every header through its policy and
+# manages ~400 messages/s, too slow for million-message corpora.
+class _Part:
+    """One MIME part: a leaf with `data`, or a multipart container with `parts`."""
+
+    def __init__(self, mime_type, headers, data=b'', parts=None, boundary=None, filename='', attachment=False):
+        self.mime_type = mime_type
+        self.headers = headers
+        self.data = data
+        self.parts = parts
+        self.boundary = boundary
+        self.filename = filename
+        self.attachment = attachment
+
+
+def _text_part(subtype, text):
+    return _Part(f'text/{subtype}', [('Content-Type', f'text/{subtype}; charset="utf-8"'), ('Content-Transfer-Encoding', '8bit')],
+                 data=text.encode('utf-8'))
+
+
+def _binary_part(mime_type, data, filename=None, content_id=None):
+    disposition = f'attachment; filename="{filename}"' if filename else 'inline'
+    headers = [('Content-Type', mime_type + (f'; name="{filename}"' if filename else '')),
+               ('Content-Transfer-Encoding', 'base64'), ('Content-Disposition', disposition)]
+    if content_id:
+        headers.append(('Content-ID', content_id))
+    return _Part(mime_type, headers, data=data, filename=filename or '', attachment=bool(filename))
+
+
+def _multipart(subtype, parts, boundary):
+    return _Part(f'multipart/{subtype}', [('Content-Type', f'multipart/{subtype}; boundary="{boundary}"')],
+                 parts=parts, boundary=boundary.encode('ascii'))
+
+
+def _serialize(part, chunks):
+    chunks.append(''.join(f"{name}: {value}\n" for name, value in part.headers).encode('utf-8') + b'\n')
+    if part.parts is None:
+        chunks.append(part.data if part.mime_type.startswith('text/') else base64.encodebytes(part.data))
+        return
+    for sub in part.parts:
+        chunks.append(b'\n--' + part.boundary + b'\n')
+        _serialize(sub, chunks)
+    chunks.append(b'\n--' + part.boundary + b'--\n')
+
+
+def _gmail_part(part, part_id, msg_id):
+    resource = {'partId': part_id, 'mimeType': part.mime_type, 'filename': part.filename,
+                'headers': [{'name': name, 'value': value} for name, value in part.headers]}
+    if part.parts is not None:
+        resource['body'] = {'size': 0}
+        resource['parts'] = [_gmail_part(sub, f"{part_id}.{i}" if part_id else str(i), msg_id)
+                             for i, sub in enumerate(part.parts)]
+    elif part.attachment:
+        # Gmail leaves attachment bytes out of messages.get; they are fetched separately by ID
+        resource['body'] = {'size': len(part.data), 'attachmentId': f"att-{msg_id}-{part_id}"}
+    else:
+        resource['body'] = {'size': len(part.data), 'data': base64.urlsafe_b64encode(part.data).decode('ascii')}
+    return resource
+
+
+def _first_text(part, subtype):
+    if part.parts is None:
+        return part.data.decode('utf-8') if part.mime_type == f'text/{subtype}' else None
+    for sub in part.parts:
+        text = _first_text(sub, subtype)
+        if text is not None:
+            return text
+    return None
+
+
+_FROM_LINE_RE = re.compile(rb'^(>*From )', re.MULTILINE)
+
+
+class CorpusGenerator:
+    """
+    Deterministic synthetic messages. category_ratios and structure_ratios map names from
+    CATEGORIES / STRUCTURES to shares (the last entry takes any remainder); nested messages
+    get 2..max_nesting multipart layers with attachments; body_repeat lengthens bodies.
+    """
+
+    def __init__(self, category_ratios=None, structure_ratios=None, max_nesting=4, body_repeat=1, seed=0):
+        self.category_ratios = category_ratios or {'rejection': 0.2, 'interview': 0.1, 'newsletter': 0.5, 'other': 0.2}
+        self.structure_ratios = structure_ratios or {'html_only': 0.2, 'nested': 0.1, 'plain': 0.3, 'alternative': 0.4}
+        self.max_nesting = max(2, max_nesting)
+        self.body_repeat = max(1, body_repeat)
+        self.seed = seed
+
+    def category(self, index):
+        return _pick(random.Random(f"{self.seed}:{index}:category"), self.category_ratios)
+
+    def _build(self, index):
+        """The root _Part of message `index`, top-level headers included."""
+        rng = random.Random(f"{self.seed}:{index}")
+        category = self.category(index)
+        structure = _pick(rng, self.structure_ratios)
+        company = rng.choice(_COMPANIES)
+        domain = company.split()[0].lower()
+        fields = {'company': company, 'role': rng.choice(_ROLES), 'name': rng.choice(_FIRST_NAMES), 'n': index}
+        subject_template, body_template = rng.choice(_TEMPLATES[category])
+        text = "\n".join([body_template.format(**fields)] * self.body_repeat)
+        if category in ('rejection', 'interview') and rng.random() < 0.3:
+            text += _QUOTED_REPLY
+        if category != 'other':
+            text += _FOOTER
+
+        boundary = f"=={index:x}_{{}}=="
+        if structure == 'plain':
+            root = _text_part('plain', text)
+        elif structure == 'html_only':
+            root = _text_part('html', _html(text, rng))
+        else:
+            root = _multipart('alternative', [_text_part('plain', text), _text_part('html', _html(text, rng))], boundary.format(0))
+        if structure == 'nested':
+            # Alternate multipart/mixed (with a PDF attachment) and multipart/related (with an inline image)
+            for depth in range(1, rng.randint(2, self.max_nesting)):
+                if depth % 2:
+                    extra = _binary_part('application/pdf', rng.randbytes(512), filename=f"attachment{depth}.pdf")
+                    root = _multipart('mixed', [root, extra], boundary.format(depth))
+                else:
+                    extra = _binary_part('image/png', rng.randbytes(128), content_id=f"<logo{depth}@{domain}.example.com>")
+                    root = _multipart('related', [root, extra], boundary.format(depth))
+
+        headers = [
+            ('From', f"{company} <{'news' if category == 'newsletter' else 'careers'}@{domain}.example.com>"),
+            ('To', 'you@example.com'),
+            ('Subject', subject_template.format(**fields)),
+            ('Date', format_datetime(datetime.datetime.fromtimestamp(_BASE_TIMESTAMP + index, datetime.timezone.utc))),
+            ('Message-ID', f"<{message_id(index)}@corpus.example.com>"),
+            (CATEGORY_HEADER, category),
+        ]
+        if category == 'newsletter':
+            headers.append(('List-Unsubscribe', f"<mailto:unsubscribe@{domain}.example.com>"))
+        headers.append(('MIME-Version', '1.0'))
+        root.headers = headers + root.headers
+        return root
+
+    def raw(self, index):
+        """RFC 5322 bytes of message `index`, with body lines starting 'From ' escaped for mbox."""
+        chunks = []
+        _serialize(self._build(index), chunks)
+        return _FROM_LINE_RE.sub(rb'>\1', b''.join(chunks))
+
+    def email(self, index):
+        """Message `index` parsed into an email.message.EmailMessage (convenient, but slow)."""
+        return email.message_from_bytes(self.raw(index), policy=email.policy.default)
+
+    def gmail_message(self, index):
+        """Message `index` as a Gmail API users.messages resource (format='full')."""
+        root = self._build(index)
+        msg_id = message_id(index)
+        category = self.category(index)
+        text = _first_text(root, 'plain')
+        if text is None:
+            text = message_parser.html_to_text(_first_text(root, 'html') or '')
+        chunks = []
+        _serialize(root, chunks)
+        labels = ['INBOX', 'UNREAD', 'CATEGORY_PROMOTIONS' if category == 'newsletter' else 'CATEGORY_PERSONAL']
+        return {'id': msg_id, 'threadId': msg_id, 'labelIds': labels, 'snippet': ' '.join(text.split())[:200],
+                'historyId': str(index + 1), 'internalDate': str((_BASE_TIMESTAMP + index) * 1000),
+                'sizeEstimate': sum(len(chunk) for chunk in chunks), 'payload': _gmail_part(root, '', msg_id)}
+
+
+def _render_chunk(generator, output_format, start, stop):
+    """Messages [start, stop) as the bytes the writer appends (a JSON line or an mbox entry each)."""
+    rendered = []
+    for index in range(start, stop):
+        if output_format == 'json':
+            rendered.append(json.dumps(generator.gmail_message(index), separators=(',', ':')).encode('utf-8') + b'\n')
+            continue
+        raw = generator.raw(index)
+        if output_format == 'mbox':
+            from_line = f"From corpus@example.com {time.asctime(time.gmtime(_BASE_TIMESTAMP + index))}\n".encode('ascii')
+            raw = from_line + raw + (b'\n' if raw.endswith(b'\n') else b'\n\n')
+        rendered.append(raw)
+    return rendered
+
+
+def write_corpus(generator, count, output_format, output, workers=1, chunk_size=1000, log_callback=print):
+    """
+    Writes `count` messages to `output`: a .jsonl file ('json'), an mbox file ('mbox') or a
+    directory of .eml files sharded 1000 per subdirectory ('eml'). With workers > 1 chunks are
+    rendered in a process pool; at most a few chunks per worker are held in memory.
+    """
+    chunks = [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.perf_counter()
+    out = None
+    if output_format == 'eml':
+        os.makedirs(output, exist_ok=True)
+    else:
+        out = open(output, 'wb')
+    try:
+        window = max(1, workers) * 4
+        for window_start in range(0, len(chunks), window):
+            batch = chunks[window_start:window_start + window]
+            if executor:
+                results = executor.map(_render_chunk, [generator] * len(batch), [output_format] * len(batch),
+                                       [start for start, _ in batch], [stop for _, stop in batch])
+            else:
+                results = (_render_chunk(generator, output_format, start, stop) for start, stop in batch)
+            for (start, stop), rendered in zip(batch, results):
+                if out:
+                    out.writelines(rendered)
+                    continue
+                for index, raw in zip(range(start, stop), rendered):
+                    shard_dir = os.path.join(output, f"{index // 1000:04d}")
+                    os.makedirs(shard_dir, exist_ok=True)
+                    with open(os.path.join(shard_dir, f"{message_id(index)}.eml"), 'wb') as f: f.write(raw)
+            written = batch[-1][1]
+            elapsed = time.perf_counter() - started
+            log_callback(f"  Wrote {written}/{count} messages ({written / elapsed:.0f} msg/s)")
+    finally:
+        if out:
+            out.close()
+        if executor:
+            executor.shutdown()
+
+
+def add_corpus_arguments(parser):
+    """Mailbox-shape options shared by this script and run_benchmark.py."""
+    parser.add_argument('--rejection-ratio', type=float, default=0.2, help="Share of job rejections.")
+    parser.add_argument('--interview-ratio', type=float, default=0.1, help="Share of interview invitations.")
+    parser.add_argument('--newsletter-ratio', type=float, default=0.5, help="Share of newsletters (the rest is other mail).")
+    parser.add_argument('--html-only-ratio', type=float, default=0.2, help="Share of HTML-only messages.")
+    parser.add_argument('--nested-ratio', type=float, default=0.1, help="Share of deeply nested multipart messages.")
+    parser.add_argument('--plain-ratio', type=float, default=0.3, help="Share of text/plain-only messages (the rest is multipart/alternative).")
+    parser.add_argument('--max-nesting', type=int, default=4, help="Most multipart layers in a nested message.")
+    parser.add_argument('--body-repeat', type=int, default=1, help="Repeat the body text to make messages longer.")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def generator_from_args(parser, args):
+    categories = {'rejection': args.rejection_ratio, 'interview': args.interview_ratio, 'newsletter': args.newsletter_ratio}
+    structures = {'html_only': args.html_only_ratio, 'nested': args.nested_ratio, 'plain': args.plain_ratio}
+    for ratios in (categories, structures):
+        if any(ratio < 0 for ratio in ratios.values()) or sum(ratios.values()) > 1:
+            parser.error(f"Ratios {', '.join(ratios)} must be non-negative and add up to at most 1.")
+    categories['other'] = 1 - sum(categories.values())
+    structures['alternative'] = 1 - sum(structures.values())
+    return CorpusGenerator(categories, structures, max_nesting=args.max_nesting, body_repeat=args.body_repeat, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic mailbox corpus for offline load tests.")
+    parser.add_argument('--count', type=int, default=10000, help="Messages to generate.")
+    parser.add_argument('--format', choices=['json', 'eml', 'mbox'], default='json',
+                        help="json: Gmail API resources, one per line; eml: a directory of .eml files; mbox: one mbox file.")
+    parser.add_argument('--output', required=True, help="Output file (json, mbox) or directory (eml).")
+    parser.add_argument('--workers', type=int, default=1, help="Processes rendering messages.")
+    add_corpus_arguments(parser)
+    args = parser.parse_args(argv)
+
+    generator = generator_from_args(parser, args)
+    print(f"Generating {args.count} messages as {args.format} into '{args.output}'...")
+    write_corpus(generator, args.count, args.format, args.output, workers=args.workers)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# backend/benchmark/fake_gmail.py
+import re
+import json
+import time
+import threading
+import collections
+
+from benchmark import corpus_generator
+
+# In-process stand-in for the googleapiclient Gmail service, covering exactly the calls the
+# backend makes: users().messages().list/get/trash/batchModify, users().history().list,
+# users().getProfile and new_batch_http_request. A FakeMailbox renders messages on demand
+# with corpus_generator, so a mailbox of any size costs no memory until it is fetched;
+# a CorpusMailbox serves a JSON Lines corpus written by corpus_generator instead.
+# `api_latency` is slept once per HTTP round trip (a batch request counts once), on the
+# calling thread, like a real request blocking a gmail_async I/O thread.
+
+INBOX_LABELS = ['INBOX', 'UNREAD', 'CATEGORY_PERSONAL']
+
+
+class FakeMailbox:
+    """Mailbox of `size` messages produced by a corpus_generator.CorpusGenerator. Message N was added at historyId N + 1."""
+
+    def __init__(self, size, generator=None):
+        self.size = size
+        self.generator = generator or corpus_generator.CorpusGenerator()
+        self.ids = [corpus_generator.message_id(index) for index in range(size)]
+        self.trashed = set()
+
+    def index_of(self, message_id):
+        try:
+            index = corpus_generator.message_index(message_id)
+        except ValueError:
+            raise KeyError(message_id)
+        if index >= self.size:
+            raise KeyError(message_id)
+        return index
+
+    def is_rejection(self, message_id):
+        """Ground truth used to score verdicts."""
+        return self.generator.category(self.index_of(message_id)) == 'rejection'
+
+    @property
+    def current_history_id(self):
+        return self.size
+
+    def message(self, message_id):
+        """The full-format messages.get resource for message_id."""
+        return self.generator.gmail_message(self.index_of(message_id))
+
+
+class CorpusMailbox(FakeMailbox):
+    """
+    Mailbox backed by a corpus_generator JSON Lines file (--format json). Only line offsets,
+    IDs and the rejection IDs are kept in memory; messages are read from disk when fetched.
+    """
+
+    _ID_RE = re.compile(rb'"id":"([^"]+)"')
+    _CATEGORY_RE = re.compile(rb'"name":"' + corpus_generator.CATEGORY_HEADER.encode('ascii') + rb'","value":"rejection"')
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = []
+        self.offsets = []
+        self.rejection_ids = set()
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                msg_id = self._ID_RE.search(line).group(1).decode('ascii')
+                self.ids.append(msg_id)
+                self.offsets.append(offset)
+                if self._CATEGORY_RE.search(line):
+                    self.rejection_ids.add(msg_id)
+                offset += len(line)
+        self.size = len(self.ids)
+        self.index_by_id = {msg_id: index for index, msg_id in enumerate(self.ids)}
+        self.trashed = set()
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock() # Batch callbacks run on several gmail_async I/O threads
+
+    def index_of(self, message_id):
+        return self.index_by_id[message_id]
+
+    def is_rejection(self, message_id):
+        return message_id in self.rejection_ids
+
+    def message(self, message_id):
+        index = self.index_of(message_id)
+        with self._lock:
+            self._file.seek(self.offsets[index])
+            line = self._file.readline()
+        return json.loads(line)
+
+
+class FakeHttpError(Exception):
+    """Raised like googleapiclient's HttpError (only .resp.status is read by the backend)."""
+
+    def __init__(self, status, reason):
+        super().__init__(f"<HttpError {status}: {reason}>")
+        self.resp = type('Response', (dict,), {'status': status, 'reason': reason})()
+
+
+class _Request:
+    def __init__(self, service, method, fn):
+        self.service = service
+        self.method = method
+        self.fn = fn
+
+    def execute(self, http=None, num_retries=0):
+        self.service._round_trip(self.method)
+        return self.fn()
+
+
+class _BatchRequest:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self.requests) >= 100:
+            raise ValueError("Gmail batch requests are limited to 100 calls.")
+        self.requests.append((request, callback or self.callback, request_id or str(len(self.requests))))
+
+    def execute(self, http=None):
+        self.service._round_trip('batch')
+        for request, callback, request_id in self.requests:
+            self.service._count(request.method)
+            try:
+                response, exception = request.fn(), None
+            except Exception as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class _Messages:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None, **kwargs):
+        # The search query is ignored: every message that hasn't been trashed matches
+        def run():
+            mailbox = self.service.mailbox
+            start = int(pageToken or 0)
+            page_size = min(maxResults or 100, 500)
+            ids = mailbox.ids[start:start + page_size]
+            result = {'messages': [{'id': msg_id, 'threadId': msg_id} for msg_id in ids if msg_id not in mailbox.trashed],
+                      'resultSizeEstimate': mailbox.size}
+            if start + page_size < mailbox.size:
+                result['nextPageToken'] = str(start + page_size)
+            return result
+        return _Request(self.service, 'messages.list', run)
+
+    def get(self, userId, id, format='full', metadataHeaders=None, **kwargs):
+        def run():
+            try:
+                message = self.service.mailbox.message(id)
+            except KeyError:
+                raise FakeHttpError(404, "Requested entity was not found.")
+            if format == 'metadata':
+                wanted = {name.lower() for name in (metadataHeaders or [])}
+                headers = [h for h in message['payload']['headers'] if not wanted or h['name'].lower() in wanted]
+                message['payload'] = {'mimeType': message['payload']['mimeType'], 'headers': headers}
+            elif format == 'minimal':
+                message.pop('payload')
+            return message
+        return _Request(self.service, 'messages.get', run)
+
+    def trash(self, userId, id):
+        def run():
+            self.service.mailbox.trashed.add(id)
+            return {'id': id, 'labelIds': ['TRASH']}
+        return _Request(self.service, 'messages.trash', run)
+
+    def batchModify(self, userId, body):
+        def run():
+            if len(body.get('ids', [])) > 1000:
+                raise FakeHttpError(400, "Too many ids (max 1000).")
+            if 'TRASH' in body.get('addLabelIds', []):
+                self.service.mailbox.trashed.update(body['ids'])
+            return ''
+        return _Request(self.service, 'messages.batchModify', run)
+
+
+class _History:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, startHistoryId, historyTypes=None, labelId=None, pageToken=None, maxResults=100, **kwargs):
+        # Message N was added at historyId N + 1; each page covers maxResults history records
+        def run():
+            mailbox = self.service.mailbox
+            start = int(pageToken or startHistoryId)
+            end = min(start + maxResults, mailbox.size)
+            result = {'historyId': str(mailbox.current_history_id),
+                      'history': [{'id': str(index + 1), 'messagesAdded': [{'message': {
+                          'id': mailbox.ids[index], 'threadId': mailbox.ids[index], 'labelIds': list(INBOX_LABELS)}}]}
+                          for index in range(start, end)]}
+            if end < mailbox.size:
+                result['nextPageToken'] = str(end)
+            return result
+        return _Request(self.service, 'history.list', run)
+
+
+class _Users:
+    def __init__(self, service):
+        self.service = service
+
+    def messages(self):
+        return _Messages(self.service)
+
+    def history(self):
+        return _History(self.service)
+
+    def getProfile(self, userId):
+        mailbox = self.service.mailbox
+        return _Request(self.service, 'getProfile', lambda: {
+            'emailAddress': 'you@example.com', 'messagesTotal': mailbox.size, 'historyId': str(mailbox.current_history_id)})
+
+
+class FakeGmailService:
+    """Drop-in for the object gmail_utils.get_gmail_service() returns, backed by a FakeMailbox."""
+
+    def __init__(self, mailbox, api_latency=0.0):
+        self.mailbox = mailbox
+        self.api_latency = api_latency
+        self.calls = collections.Counter() # Per API method, counting each call inside a batch
+        self.round_trips = 0 # HTTP requests: one per plain call, one per batch
+        self._lock = threading.Lock()
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def _round_trip(self, method):
+        with self._lock:
+            self.round_trips += 1
+            if method != 'batch':
+                self.calls[method] += 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _BatchRequest(self, callback)
@@ -0,0 +1,135 @@
+# backend/benchmark/fake_llm.py
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types as adk_types
+
+import rate_limiter
+
+# Stub model for the ADK agents. register() adds it to ADK's model registry, so setting
+# config.ADK_MODEL_STRING / config.MODEL_CASCADE to STUB_MODEL (or STUB_LITE_MODEL) routes
+# every agent through the real Runner, sessions and tool calls with no Gemini request.
+# It answers in whatever shape the calling agent expects:
+#   - tool mode: calls delete_email_wrapper for rejections, then replies "Decision: ...";
+#   - structured mode (output_schema set): a JSON verdict with a confidence;
+#   - batch mode: a JSON array with one verdict per <email id="..."> block in the prompt.
+# Verdicts are a stable function of the message ID (the mailbox's ground truth when the
+# profile has one, otherwise a hash), so reruns and cache hits agree.
+
+STUB_MODEL = "benchmark-stub"
+STUB_LITE_MODEL = "benchmark-stub-lite" # First cascade tier; answers with lower confidence
+
+_MESSAGE_ID_RE = re.compile(r'^(?:Message ID:\s*|<email id=")([^\s"]+)', re.MULTILINE)
+
+
+class StubProfile:
+    """Behaviour of the stub model and what it observed during a run."""
+
+    def __init__(self, latency=0.2, jitter=0.05, rejection_rate=0.3, error_rate=0.0, low_confidence_rate=0.2,
+                 truth=None, seed=0):
+        self.latency = latency # Mean seconds per model call
+        self.jitter = jitter # Standard deviation of the latency
+        self.truth = truth # Optional callable message_id -> bool, e.g. FakeMailbox.is_rejection
+        self.rejection_rate = rejection_rate # Share of message IDs answered as rejections when there is no truth
+        self.error_rate = error_rate # Share of verdicts flipped relative to the truth
+        self.low_confidence_rate = low_confidence_rate # Share of STUB_LITE_MODEL verdicts below the cascade threshold
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.calls_by_model = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies = []
+
+    def is_rejection(self, message_id):
+        draw = random.Random(f"{self.seed}:{message_id}:verdict").random()
+        if self.truth is None:
+            return draw < self.rejection_rate
+        return self.truth(message_id) != (draw < self.error_rate)
+
+    def is_low_confidence(self, message_id):
+        return random.Random(f"{self.seed}:{message_id}:confidence").random() < self.low_confidence_rate
+
+    def sample_latency(self):
+        with self._lock:
+            return max(0.0, self._rng.gauss(self.latency, self.jitter))
+
+    def record(self, model, prompt_text, reply_text, latency):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+            self.input_tokens += rate_limiter.estimate_tokens(prompt_text)
+            self.output_tokens += rate_limiter.estimate_tokens(reply_text)
+            self.latencies.append(latency)
+
+
+profile = StubProfile()
+
+
+def _last_user_text(llm_request):
+    for content in reversed(llm_request.contents or []):
+        texts = [part.text for part in (content.parts or []) if part.text]
+        if texts:
+            return "\n".join(texts)
+    return ""
+
+
+def _has_function_response(llm_request):
+    if not llm_request.contents:
+        return False
+    return any(part.function_response for part in (llm_request.contents[-1].parts or []))
+
+
+class StubLlm(BaseLlm):
+    """ADK model that sleeps for profile.latency and returns a synthetic verdict."""
+
+    model: str = STUB_MODEL
+
+    @classmethod
+    def supported_models(cls):
+        return [r'benchmark-stub.*']
+
+    def _reply(self, llm_request, prompt_text):
+        message_ids = _MESSAGE_ID_RE.findall(prompt_text)
+        message_id = message_ids[0] if message_ids else ""
+        config = llm_request.config
+        if 'delete_email_wrapper' in (llm_request.tools_dict or {}):
+            if _has_function_response(llm_request):
+                return adk_types.Part(text=f"Analysis: stub verdict. Decision: Rejection. Action: Used delete_email_tool with message_id {message_id}.")
+            if message_id and profile.is_rejection(message_id):
+                return adk_types.Part(function_call=adk_types.FunctionCall(name='delete_email_wrapper', args={'message_id': message_id}))
+            return adk_types.Part(text="Analysis: stub verdict. Decision: Not Rejection. Action: None.")
+        if config is not None and config.response_schema is not None:
+            low = self.model == STUB_LITE_MODEL and profile.is_low_confidence(message_id)
+            return adk_types.Part(text=json.dumps({
+                'is_rejection': profile.is_rejection(message_id),
+                'confidence': 0.5 if low else 0.95,
+                'reason': "Stub verdict.",
+            }))
+        return adk_types.Part(text=json.dumps(
+            [{'message_id': msg_id, 'is_rejection': profile.is_rejection(msg_id)} for msg_id in message_ids]
+        ))
+
+    async def generate_content_async(self, llm_request, stream=False):
+        started = time.perf_counter()
+        prompt_text = _last_user_text(llm_request)
+        await asyncio.sleep(profile.sample_latency())
+        part = self._reply(llm_request, prompt_text)
+        profile.record(self.model, prompt_text, part.text or json.dumps(part.function_call.args), time.perf_counter() - started)
+        yield LlmResponse(content=adk_types.Content(role='model', parts=[part]))
+
+
+def register():
+    """Makes STUB_MODEL and STUB_LITE_MODEL resolvable as ADK model names."""
+    LLMRegistry.register(StubLlm)
@@ -0,0 +1,176 @@
+# backend/benchmark/run_benchmark.py
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+import tempfile
+from unittest import mock
+
+# Runs backend_processor.process_rejection_emails end to end against fake_gmail and
+# fake_llm and reports throughput, per-stage latency percentiles, Gmail API call counts,
+# LLM usage, verdict quality against the mailbox's ground truth and peak RSS. Stage timings
+# come from the pipeline's own metrics spans (metrics.py), as in production.
+# Rate limits are switched off unless --rate-limits is given, so the numbers show what the
+# pipeline itself can do; the verdict cache and sync state live in a temporary directory.
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+import config
+import metrics
+import gmail_utils
+import rate_limiter
+import message_parser
+import backend_processor
+
+from benchmark import fake_gmail
+from benchmark import fake_llm
+from benchmark import corpus_generator
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its reaped children, in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None, None # Windows
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024 # ru_maxrss is bytes on macOS, KiB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return own, children
+
+
+def configure(args, work_dir):
+    """Points config at the fakes and the temporary directory."""
+    config.GOOGLE_API_KEY = config.GOOGLE_API_KEY or "benchmark"
+    config.ADK_MODEL_STRING = fake_llm.STUB_MODEL
+    config.MODEL_CASCADE = [fake_llm.STUB_LITE_MODEL, fake_llm.STUB_MODEL] if args.cascade else []
+    config.CLASSIFICATION_MODE = args.mode
+    config.MAX_CONCURRENT_ANALYSES = args.concurrency
+    config.MAX_EMAILS_PER_RUN = None
+    config.INCREMENTAL_SYNC = False
+    config.SYNC_STATE_PATH = os.path.join(work_dir, 'sync_state.json')
+    config.VERDICT_CACHE_ENABLED = not args.no_cache
+    config.VERDICT_CACHE_PATH = os.path.join(work_dir, 'verdict_cache.sqlite3')
+    config.PREFILTER_ENABLED = not args.no_prefilter
+    config.METRICS_JSON_PATH = os.path.join(work_dir, 'run_metrics.jsonl')
+    config.METRICS_OPENMETRICS_PATH = None
+    config.TEMPLATE_CLUSTERING_ENABLED = not args.no_clustering
+    config.METADATA_FIRST_FETCH = args.metadata_first
+    if args.parse_workers is not None:
+        config.PARSE_WORKERS = args.parse_workers
+    if not args.rate_limits:
+        for bucket in (rate_limiter.gmail_quota, rate_limiter.llm_requests, rate_limiter.llm_tokens):
+            bucket.rate = 0
+
+
+async def run(args, mailbox):
+    service = fake_gmail.FakeGmailService(mailbox, api_latency=args.api_latency)
+    fake_llm.register()
+    fake_llm.profile = fake_llm.StubProfile(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate,
+                                            low_confidence_rate=args.low_confidence_rate, truth=mailbox.is_rejection,
+                                            seed=args.seed)
+
+    log_lines = []
+    log_callback = print if args.verbose else log_lines.append
+    started = time.perf_counter()
+    try:
+        # Tools and helpers also print() directly; keep that out of the report unless --verbose
+        # The pipeline asks gmail_utils for the client on every run; hand it the fake one
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull), \
+                mock.patch.object(gmail_utils, 'get_gmail_service', return_value=service):
+            summary = await backend_processor.process_rejection_emails(log_callback)
+    finally:
+        elapsed = time.perf_counter() - started
+        message_parser.reset_parse_pool()
+
+    expected = {msg_id for msg_id in mailbox.ids if mailbox.is_rejection(msg_id)}
+    trashed = mailbox.trashed
+    own_rss, children_rss = peak_rss_mb()
+    run_metrics = metrics.current.summary()
+    return {
+        'summary': summary,
+        'emails': mailbox.size,
+        'mode': args.mode,
+        'concurrency': args.concurrency,
+        'elapsed_seconds': round(elapsed, 3),
+        'emails_per_second': round(mailbox.size / elapsed, 2) if elapsed else None,
+        'stages': {
+            stage: {'calls': row['count'], 'p50_ms': round(row['p50_seconds'] * 1000, 2),
+                    'p95_ms': round(row['p95_seconds'] * 1000, 2), 'total_seconds': round(row['total_seconds'], 3)}
+            for stage, row in run_metrics['stages'].items()
+        },
+        'retries': metrics.current.counter('retries'),
+        'gmail_api_calls': dict(service.calls),
+        'gmail_round_trips': service.round_trips,
+        'llm': {'calls': fake_llm.profile.calls, 'calls_by_model': fake_llm.profile.calls_by_model,
+                'input_tokens': fake_llm.profile.input_tokens, 'output_tokens': fake_llm.profile.output_tokens},
+        'verdicts': {'expected_rejections': len(expected), 'trashed': len(trashed),
+                     'true_positives': len(expected & trashed), 'false_positives': len(trashed - expected),
+                     'missed': len(expected - trashed)},
+        'peak_rss_mb': round(own_rss, 1) if own_rss is not None else None,
+        'peak_rss_children_mb': round(children_rss, 1) if children_rss is not None else None,
+        'log_lines': len(log_lines),
+    }
+
+
+def print_report(report):
+    print(f"\n=== Benchmark: {report['emails']} emails, mode '{report['mode']}', concurrency {report['concurrency']} ===")
+    print(report['summary'])
+    print(f"Wall time: {report['elapsed_seconds']:.2f}s   Throughput: {report['emails_per_second']} emails/s")
+    print(f"\n{'Stage':<10} {'Calls':>8} {'p50 ms':>10} {'p95 ms':>10} {'Total s':>10}")
+    for stage, row in report['stages'].items():
+        print(f"{stage:<10} {row['calls']:>8} {row['p50_ms']:>10.2f} {row['p95_ms']:>10.2f} {row['total_seconds']:>10.2f}")
+    calls = ", ".join(f"{method} {count}" for method, count in sorted(report['gmail_api_calls'].items()))
+    print(f"\nGmail API calls: {calls} ({report['gmail_round_trips']} HTTP round trips, {report['retries']} retries)")
+    llm = report['llm']
+    print(f"LLM calls: {llm['calls']} {llm['calls_by_model']}, ~{llm['input_tokens']} tokens in / ~{llm['output_tokens']} out")
+    verdicts = report['verdicts']
+    print(f"Verdicts: {verdicts['trashed']} trashed, {verdicts['true_positives']} of {verdicts['expected_rejections']} "
+          f"rejections caught, {verdicts['false_positives']} false positive(s), {verdicts['missed']} missed")
+    if report['peak_rss_mb'] is not None:
+        print(f"Peak RSS: {report['peak_rss_mb']} MB (parser processes: {report['peak_rss_children_mb']} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the rejection pipeline (fake Gmail, stub LLM).")
+    parser.add_argument('--emails', type=int, default=1000, help="Messages in the synthetic mailbox.")
+    parser.add_argument('--corpus', metavar='PATH', help="Serve a corpus_generator JSON Lines file instead of a generated mailbox.")
+    parser.add_argument('--mode', choices=['tool', 'structured', 'batch'], default=config.CLASSIFICATION_MODE)
+    parser.add_argument('--concurrency', type=int, default=config.MAX_CONCURRENT_ANALYSES, help="Classifier workers.")
+    parser.add_argument('--cascade', action='store_true', help="Structured mode: two-tier stub cascade.")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Seconds per Gmail HTTP round trip.")
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Mean seconds per stub LLM call.")
+    parser.add_argument('--llm-jitter', type=float, default=0.05, help="Standard deviation of the LLM latency.")
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help="Share of stub verdicts that are wrong.")
+    parser.add_argument('--low-confidence-rate', type=float, default=0.2, help="Share of first-tier cascade verdicts that escalate.")
+    parser.add_argument('--parse-workers', type=int, default=None, help="Override config.PARSE_WORKERS (0 = parse in-process).")
+    parser.add_argument('--no-prefilter', action='store_true')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--no-clustering', action='store_true')
+    parser.add_argument('--metadata-first', action='store_true', help="Two-phase fetch (config.METADATA_FIRST_FETCH).")
+    parser.add_argument('--rate-limits', action='store_true', help="Keep the configured Gmail/Gemini rate limits.")
+    corpus_generator.add_corpus_arguments(parser)
+    parser.add_argument('--json', metavar='PATH', help="Also write the report as JSON.")
+    parser.add_argument('--verbose', action='store_true', help="Print the pipeline log.")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        mailbox = fake_gmail.CorpusMailbox(args.corpus)
+    else:
+        mailbox = fake_gmail.FakeMailbox(args.emails, corpus_generator.generator_from_args(parser, args))
+    with tempfile.TemporaryDirectory(prefix='rejection_benchmark_') as work_dir:
+        configure(args, work_dir)
+        report = asyncio.run(run(args, mailbox))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# backend/gmail_async.py
+import asyncio
+import threading
+import concurrent.futures
+
+import config
+import adk_tools
+import gmail_utils
+import mail_source
+import rate_limiter
+import retry_policy
+
+# googleapiclient requests are blocking (.execute() does the HTTP round trip), so calling
+# them from a coroutine stalls the whole event loop. AsyncGmailClient runs every call on a
+# small thread pool instead. httplib2.Http objects are not thread-safe, so each worker
+# thread gets its own authorized connection and passes it to execute(http=...).
+# Transient failures are retried per retry_policy, sleeping on the event loop, not the I/O threads.
+
+
+class AsyncGmailClient(mail_source.MailSource):
+    """Awaitable wrappers for the Gmail operations the backend uses. Quota is reserved per call."""
+
+    name = "Gmail"
+    supports_history = True
+    supports_metadata_fetch = True
+
+    def __init__(self, gmail_service, max_workers=None, log_callback=print):
+        self.service = gmail_service
+        self.log_callback = log_callback
+        # build() wraps the credentials in an AuthorizedHttp; reuse them for the per-thread connections
+        self._credentials = getattr(getattr(gmail_service, '_http', None), 'credentials', None)
+        self._local = threading.local()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or config.GMAIL_IO_THREADS, thread_name_prefix='gmail-io'
+        )
+
+    def _thread_http(self):
+        """This worker thread's own authorized httplib2 connection (None if the service has no credentials)."""
+        if self._credentials is None:
+            return None
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            http = google_auth_httplib2.AuthorizedHttp(self._credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _execute_blocking(self, request):
+        http = self._thread_http()
+        return request.execute(http=http) if http is not None else request.execute()
+
+    async def run(self, fn, *args):
+        """Runs a blocking callable on the Gmail I/O threads."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def execute(self, request, description="Gmail request"):
+        """Executes a prepared googleapiclient request off the event loop, retrying transient errors."""
+        return await retry_policy.call_async(
+            self.run, self._execute_blocking, request, description=description, log_callback=self.log_callback
+        )
+
+    async def list_messages(self, query, max_results, page_token=None):
+        await rate_limiter.acquire_gmail('messages.list')
+        return await self.execute(self.service.users().messages().list(
+            userId='me', q=query, maxResults=max_results, pageToken=page_token
+        ), "messages.list")
+
+    async def get_messages_batch(self, message_ids, metadata_only=False, raw=False):
+        """gmail_utils.get_email_details_batch on an I/O thread; returns (details_list, errors)."""
+        def fetch():
+            return gmail_utils.get_email_details_batch(
+                self.service, message_ids, metadata_only=metadata_only, raw=raw, http=self._thread_http()
+            )
+        return await self.run(fetch)
+
+    async def list_history(self, start_history_id, page_token=None, history_types=None, label_id=None):
+        await rate_limiter.acquire_gmail('history.list')
+        kwargs = {'labelId': label_id} if label_id else {}
+        return await self.execute(self.service.users().history().list(
+            userId='me', startHistoryId=start_history_id, historyTypes=history_types or ['messageAdded'],
+            pageToken=page_token, **kwargs
+        ), "history.list")
+
+    async def get_profile(self):
+        await rate_limiter.acquire_gmail('getProfile')
+        return await self.execute(self.service.users().getProfile(userId='me'), "getProfile")
+
+    def create_deletion_queue(self, log_callback=print):
+        # flush() runs on these I/O threads (source.run), so it must use the thread's own connection
+        return adk_tools.DeletionQueue(self.service, log_callback=log_callback, execute=self._execute_blocking)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -1,77 +1,174 @@
 # gmail_utils.py
 import os
-import base64
+import json
+import datetime
+import threading
 import traceback
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 
 # Import configuration constants
 import config
+import rate_limiter
+import retry_policy
+import message_parser
+
+# google-auth / googleapiclient are imported inside the functions that need them,
+# so importing this module (and starting the UI or CLI) stays fast.
+
+_credentials = None # Credentials kept in memory for the life of the process (expiry tracked on the object)
+_service = None # Gmail client built from _credentials
+_refresh_lock = threading.Lock()
+_refresh_timer = None
+
+
+def _save_credentials(creds):
+    try:
+        with open(config.GMAIL_TOKEN_PATH, 'w') as token: token.write(creds.to_json())
+        print(f"Gmail credentials saved to {config.GMAIL_TOKEN_PATH}")
+    except Exception as e: print(f"Error saving Gmail token: {e}")
+
+
+def _seconds_until_expiry(creds):
+    if not creds.expiry:
+        return None
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (creds.expiry - now).total_seconds()
+
+
+def _remove_token_file():
+    if os.path.exists(config.GMAIL_TOKEN_PATH):
+        try: os.remove(config.GMAIL_TOKEN_PATH); print(f"Removed invalid Gmail token file: {config.GMAIL_TOKEN_PATH}")
+        except OSError as oe: print(f"Error removing token file {config.GMAIL_TOKEN_PATH}: {oe}")
+
+
+def _refresh_credentials(creds):
+    """
+    Refreshes the access token and persists it. Returns True on success. On failure the
+    cached client is dropped, so the next get_gmail_service() call starts over; if the
+    refresh token itself was rejected (revoked, or expired as Testing-mode tokens do after
+    7 days) the token file is removed too, so that call goes through the OAuth flow.
+    """
+    global _credentials, _service
+    from google.auth.transport.requests import Request
+    from google.auth.exceptions import RefreshError
+    with _refresh_lock:
+        remaining = _seconds_until_expiry(creds)
+        if creds.valid and remaining is not None and remaining > config.CREDENTIAL_REFRESH_MARGIN_SECONDS:
+            return True # Already refreshed (e.g. by the HTTP layer before a request)
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            print(f"  [Warning] Gmail token refresh failed: {e}. Will re-authenticate on the next run.")
+            if _credentials is creds:
+                _credentials, _service = None, None
+            if isinstance(e, RefreshError):
+                _remove_token_file()
+            return False
+    _save_credentials(creds)
+    return True
+
+
+def _schedule_refresh(creds):
+    """
+    Refreshes the token on a daemon timer config.CREDENTIAL_REFRESH_MARGIN_SECONDS before it
+    expires (immediately if it already has), so neither startup nor API calls wait on it.
+    """
+    global _refresh_timer
+    if not creds.refresh_token:
+        return
+    if _refresh_timer:
+        _refresh_timer.cancel()
+    remaining = _seconds_until_expiry(creds)
+    delay = 0 if remaining is None else max(0, remaining - config.CREDENTIAL_REFRESH_MARGIN_SECONDS)
+
+    def refresh_and_reschedule():
+        if _refresh_credentials(creds):
+            _schedule_refresh(creds)
+
+    _refresh_timer = threading.Timer(delay, refresh_and_reschedule)
+    _refresh_timer.daemon = True
+    _refresh_timer.start()
+
+
+def _build_gmail_service(creds):
+    """
+    Builds the Gmail client from the discovery document cached at
+    config.GMAIL_DISCOVERY_CACHE_PATH, creating the cache on first use.
+    """
+    from googleapiclient.discovery import build, build_from_document
+    if os.path.exists(config.GMAIL_DISCOVERY_CACHE_PATH):
+        try:
+            with open(config.GMAIL_DISCOVERY_CACHE_PATH) as f:
+                return build_from_document(f.read(), credentials=creds)
+        except Exception as e:
+            print(f"  [Warning] Cached discovery document unusable ({e}). Rebuilding it.")
+    service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
+    try:
+        with open(config.GMAIL_DISCOVERY_CACHE_PATH, 'w') as f: json.dump(service._rootDesc, f)
+        print(f"Cached Gmail discovery document at {config.GMAIL_DISCOVERY_CACHE_PATH}")
+    except Exception as e: print(f"  [Warning] Could not cache discovery document: {e}")
+    return service
+
 
 def get_gmail_service():
     """
     Authenticates with Gmail API using configured settings.
     Returns the authenticated Gmail service object or None on failure.
+    Credentials and the client are kept in memory, so later calls return immediately; the
+    token is then refreshed in the background before it expires. A token that has already
+    expired is refreshed here, and one that can't be refreshed leads to the OAuth flow.
     """
+    global _credentials, _service
+    if _service is not None and _credentials is not None:
+        return _service
+
     creds = None
     print(f"--- Starting Gmail Authentication ---")
     if os.path.exists(config.GMAIL_TOKEN_PATH):
         print(f"Loading Gmail credentials from: {config.GMAIL_TOKEN_PATH}")
         try:
+            from google.oauth2.credentials import Credentials
             creds = Credentials.from_authorized_user_file(config.GMAIL_TOKEN_PATH, config.GMAIL_SCOPES)
         except Exception as e:
             print(f"Error loading {config.GMAIL_TOKEN_PATH}: {e}. Will re-authenticate.")
             creds = None
 
-    if not creds or not creds.valid:
-        print("Gmail credentials not found, invalid, or expired.")
-        if creds and creds.expired and creds.refresh_token:
+    if creds and not creds.valid:
+        if creds.refresh_token:
             print("Attempting to refresh Gmail token...")
-            try:
-                creds.refresh(Request())
+            if _refresh_credentials(creds):
                 print("Gmail token refreshed successfully.")
-                try:
-                    with open(config.GMAIL_TOKEN_PATH, 'w') as token: token.write(creds.to_json())
-                    print(f"Refreshed Gmail token saved to {config.GMAIL_TOKEN_PATH}")
-                except Exception as e: print(f"Error saving refreshed Gmail token: {e}")
-            except Exception as e:
-                print(f"Error refreshing Gmail token: {e}. Need to re-authenticate.")
-                creds = None
-                if os.path.exists(config.GMAIL_TOKEN_PATH):
-                     try: os.remove(config.GMAIL_TOKEN_PATH); print(f"Removed invalid Gmail token file: {config.GMAIL_TOKEN_PATH}")
-                     except OSError as oe: print(f"Error removing token file {config.GMAIL_TOKEN_PATH}: {oe}")
-
-
-        if not creds:
-            print("Starting new Gmail authentication flow...")
-            if not os.path.exists(config.GMAIL_CREDENTIALS_PATH):
-                print(f"CRITICAL ERROR: Gmail credentials '{config.GMAIL_CREDENTIALS_PATH}' not found."); return None
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file(config.GMAIL_CREDENTIALS_PATH, config.GMAIL_SCOPES)
-                print("-" * 60 + "\nStarting local server for Gmail Auth. Follow browser instructions.\n" + "-" * 60)
-                creds = flow.run_local_server(port=config.GMAIL_AUTH_PORT, open_browser=False)
-                print("--- Gmail run_local_server process completed ---")
-            except Exception as e: print(f"!!! Error during Gmail authentication flow !!!"); traceback.print_exc(); return None
-
-            if creds:
-                print("Gmail authentication successful, saving credentials...")
-                try:
-                    with open(config.GMAIL_TOKEN_PATH, 'w') as token: token.write(creds.to_json())
-                    print(f"Credentials saved to {config.GMAIL_TOKEN_PATH}")
-                except Exception as e: print(f"Error saving token: {e}")
-            else: print("Gmail authentication flow did not result in valid credentials."); return None
+            else:
+                creds = None # Need to re-authenticate
+        else:
+            print("Gmail credentials invalid and not refreshable.")
+            creds = None
+
+    if not creds:
+        print("Starting new Gmail authentication flow...")
+        if not os.path.exists(config.GMAIL_CREDENTIALS_PATH):
+            print(f"CRITICAL ERROR: Gmail credentials '{config.GMAIL_CREDENTIALS_PATH}' not found."); return None
+        try:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(config.GMAIL_CREDENTIALS_PATH, config.GMAIL_SCOPES)
+            print("-" * 60 + "\nStarting local server for Gmail Auth. Follow browser instructions.\n" + "-" * 60)
+            creds = flow.run_local_server(port=config.GMAIL_AUTH_PORT, open_browser=False)
+            print("--- Gmail run_local_server process completed ---")
+        except Exception as e: print(f"!!! Error during Gmail authentication flow !!!"); traceback.print_exc(); return None
+
+        if creds:
+            print("Gmail authentication successful, saving credentials...")
+            _save_credentials(creds)
+        else: print("Gmail authentication flow did not result in valid credentials."); return None
 
     print("Attempting to build Gmail service...")
     try:
-        if creds and creds.valid:
-            service = build('gmail', 'v1', credentials=creds)
-            print("Gmail service created successfully.")
-            return service # Return the service object
-        else: print("Authentication failed or credentials invalid, cannot create Gmail service."); return None
+        service = _build_gmail_service(creds)
+        print("Gmail service created successfully.")
     except Exception as e: print(f'An unexpected error occurred building the Gmail service:'); traceback.print_exc(); return None
+    _credentials, _service = creds, service
+    _schedule_refresh(creds)
+    return service # Return the service object
 
 
 def get_email_details(gmail_service, message_id):
@@ -82,31 +179,76 @@ def get_email_details(gmail_service, message_id):
     if not gmail_service:
         print("  [Error] Gmail service object not provided to get_email_details.")
         return None
+    from googleapiclient.errors import HttpError
     try:
-        message_data = gmail_service.users().messages().get(userId='me', id=message_id, format='full').execute()
-        payload = message_data.get('payload', {})
-        headers = payload.get('headers', [])
-        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
-        body = ""
-        def decode_part(data): return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
-        if 'parts' in payload:
-            parts_queue = list(payload['parts'])
-            while parts_queue:
-                part = parts_queue.pop(0)
-                mime_type = part.get('mimeType', '')
-                if mime_type == 'text/plain' and 'data' in part.get('body', {}):
-                    body = decode_part(part['body']['data']); break
-                # Look inside multipart containers
-                elif 'parts' in part and mime_type.startswith('multipart/'):
-                     # Prepend nested parts to process them next (DFS-like)
-                    parts_queue = part['parts'] + parts_queue
-
-        elif 'body' in payload and 'data' in payload['body']:
-             if 'text/plain' in payload.get('mimeType', ''): body = decode_part(payload['body']['data'])
-        if not body: body = message_data.get('snippet', ''); print(f"  [Warning] Using snippet for msg {message_id}.")
-
-        return {'id': message_id, 'subject': subject, 'sender': sender, 'body': body}
+        rate_limiter.acquire_gmail_blocking('messages.get')
+        message_data = retry_policy.call_blocking(
+            gmail_service.users().messages().get(userId='me', id=message_id, format='full').execute,
+            description=f"messages.get {message_id}",
+        )
+        return message_parser.extract_email_details(message_data, message_id)
 
     except HttpError as error: print(f"  [Error] Gmail API error fetching message {message_id}: {error}"); return None
-    except Exception as e: print(f"  [Error] Unexpected error fetching message {message_id}:"); traceback.print_exc(); return None
\ No newline at end of file
+    except Exception as e: print(f"  [Error] Unexpected error fetching message {message_id}:"); traceback.print_exc(); return None
+
+
+def get_email_details_batch(gmail_service, message_ids, metadata_only=False, raw=False, http=None):
+    """
+    Fetches details for many messages using Gmail batch HTTP requests
+    (up to config.GMAIL_BATCH_SIZE messages per round trip).
+    With metadata_only=True only METADATA_HEADERS and the snippet are downloaded
+    (format='metadata'); the dicts then carry 'metadata_only': True.
+    With raw=True full messages are returned unparsed (message_parser.slim_message) so the
+    caller can parse them elsewhere, e.g. with message_parser.parse_messages in a process pool.
+    `http` overrides the service's connection (gmail_async gives each I/O thread its own).
+
+    Returns a tuple (details_list, errors):
+      - details_list: list of dicts in the same shape as get_email_details, in input order.
+      - errors: dict mapping message_id -> error string for messages that could not be fetched.
+    A failure for one message never fails the rest of the batch.
+    """
+    details_by_id = {}
+    errors = {}
+    if not gmail_service:
+        print("  [Error] Gmail service object not provided to get_email_details_batch.")
+        return [], {msg_id: "Gmail service not available." for msg_id in message_ids}
+
+    def handle_response(request_id, response, exception):
+        # Called once per message by the batch; request_id is the message ID.
+        if exception is not None:
+            errors[request_id] = str(exception)
+            print(f"  [Error] Gmail API error fetching message {request_id}: {exception}")
+            return
+        try:
+            details_by_id[request_id] = extract(response, request_id)
+        except Exception as e:
+            errors[request_id] = f"Parse error: {e}"
+            print(f"  [Error] Unexpected error parsing message {request_id}: {e}")
+
+    if metadata_only:
+        extract = message_parser.extract_metadata_details
+        get_kwargs = {'format': 'metadata', 'metadataHeaders': message_parser.METADATA_HEADERS}
+    else:
+        extract = (lambda message_data, _: message_parser.slim_message(message_data)) if raw else message_parser.extract_email_details
+        get_kwargs = {'format': 'full'}
+
+    message_ids = list(message_ids)
+    batch_size = config.GMAIL_BATCH_SIZE
+    for start in range(0, len(message_ids), batch_size):
+        chunk = message_ids[start:start + batch_size]
+        try:
+            # Quota is charged per message inside the batch, not per batch request
+            rate_limiter.acquire_gmail_blocking('messages.get', len(chunk))
+            batch = gmail_service.new_batch_http_request(callback=handle_response)
+            for msg_id in chunk:
+                batch.add(gmail_service.users().messages().get(userId='me', id=msg_id, **get_kwargs), request_id=msg_id)
+            batch.execute(http=http) if http is not None else batch.execute()
+        except Exception as e:
+            # The whole round trip failed (network, auth...). Mark only this chunk as failed.
+            print(f"  [Error] Batch fetch failed for {len(chunk)} messages: {e}")
+            for msg_id in chunk:
+                if msg_id not in details_by_id and msg_id not in errors:
+                    errors[msg_id] = f"Batch request failed: {e}"
+
+    details_list = [details_by_id[msg_id] for msg_id in message_ids if msg_id in details_by_id]
+    return details_list, errors
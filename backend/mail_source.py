@@ -0,0 +1,224 @@
+# backend/mail_source.py
+import os
+import json
+import mmap
+import time
+import asyncio
+
+import config
+import adk_tools
+import message_parser
+
+# Where the pipeline reads mail from. backend_processor only talks to a MailSource, so the
+# same fetch -> parse -> classify stages run over the live Gmail API
+# (gmail_async.AsyncGmailClient) or over a local archive: an mbox file (e.g. the
+# "All mail Including Spam and Trash.mbox" in a Google Takeout export), a Maildir or a
+# directory of .eml files. Local sources cost no Gmail quota and are never modified:
+# rejections are appended to config.LOCAL_VERDICTS_PATH instead of being trashed.
+#
+# Local sources list messages lazily as the pipeline pages through them, and fetching
+# returns only descriptors (path, offset, length); the parser processes read the bytes
+# themselves (message_parser.read_local_message), from a memory map for mbox archives,
+# so message contents never pass through the event loop or get pickled between processes.
+
+
+class MailSource:
+    """The operations the pipeline needs from a mailbox. Subclasses implement the async methods."""
+
+    name = "mail source"
+    supports_history = False # list_history()/get_profile() work, so incremental sync is possible
+    supports_metadata_fetch = False # A headers-only fetch is cheaper than a full one (two-phase fetch)
+
+    async def list_messages(self, query, max_results, page_token=None):
+        """A messages.list-shaped page: {'messages': [{'id': ...}], 'nextPageToken': ...}."""
+        raise NotImplementedError
+
+    async def get_messages_batch(self, message_ids, metadata_only=False, raw=False):
+        """Returns (details_list, errors) like gmail_utils.get_email_details_batch."""
+        raise NotImplementedError
+
+    async def run(self, fn, *args):
+        """Runs a blocking callable off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def create_deletion_queue(self, log_callback=print):
+        """The DeletionQueue rejections from this source are handed to."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LocalDeletionQueue(adk_tools.DeletionQueue):
+    """
+    DeletionQueue for local archives: flushed IDs are appended to config.LOCAL_VERDICTS_PATH
+    as JSON lines (with where the message lives in the archive); nothing is deleted.
+    """
+
+    def __init__(self, source, log_callback=print):
+        super().__init__(None, log_callback=log_callback)
+        self.source = source
+
+    def _flush(self) -> dict:
+        flushed = {}
+        pending = self._take_pending()
+        if not pending:
+            return flushed
+        try:
+            with open(config.LOCAL_VERDICTS_PATH, 'a') as f:
+                for message_id in pending:
+                    f.write(json.dumps({'id': message_id, 'source': self.source.path, 'location': self.source.location(message_id),
+                                        'verdict': 'rejection', 'recorded_at': time.time()}) + '\n')
+                    flushed[message_id] = {"status": "success", "message": f"Email {message_id} recorded as a rejection (archive not modified)."}
+        except OSError as e:
+            self.log_callback(f"  [Queue Error] Could not write {config.LOCAL_VERDICTS_PATH}: {e}")
+            for message_id in pending:
+                flushed.setdefault(message_id, {"status": "error", "message": f"Could not record rejection {message_id}: {e}"})
+        self.log_callback(f"--- DeletionQueue: recorded {len(flushed)} rejection(s) in {config.LOCAL_VERDICTS_PATH} ---")
+        self._finish_flush(flushed)
+        return flushed
+
+
+class _LocalSource(MailSource):
+    """Shared paging and fetching for archives on disk. Subclasses yield message IDs from _iter_ids()."""
+
+    def __init__(self, path):
+        self.path = path
+        self._ids = None # Iterator over the archive's message IDs, advanced page by page
+        self._listed = 0
+
+    def _iter_ids(self):
+        raise NotImplementedError
+
+    def descriptor(self, message_id):
+        """What message_parser.read_local_message needs to load the message."""
+        raise NotImplementedError
+
+    def location(self, message_id):
+        return message_id
+
+    async def list_messages(self, query, max_results, page_token=None):
+        # The Gmail search query can't be applied offline: every message in the archive is listed
+        if page_token is None:
+            self._ids, self._listed = self._iter_ids(), 0
+        page = []
+        for message_id in self._ids:
+            page.append({'id': message_id})
+            if len(page) >= max_results:
+                break
+        self._listed += len(page)
+        result = {'messages': page}
+        if len(page) >= max_results:
+            result['nextPageToken'] = str(self._listed)
+        return result
+
+    async def get_messages_batch(self, message_ids, metadata_only=False, raw=False):
+        details_list, errors = [], {}
+        for message_id in message_ids:
+            try:
+                descriptor = dict(self.descriptor(message_id), id=message_id)
+            except (KeyError, ValueError, OSError) as e:
+                errors[message_id] = f"Not found in {self.path}: {e}"
+                continue
+            details_list.append(descriptor)
+        if raw:
+            return details_list, errors # Parsed (and read) in message_parser.parse_messages
+        parsed = await self.run(message_parser.parse_messages, [(d['id'], d) for d in details_list])
+        for message_id, details, parse_error in parsed:
+            if parse_error:
+                errors[message_id] = parse_error
+        return [details for _, details, parse_error in parsed if not parse_error], errors
+
+    def create_deletion_queue(self, log_callback=print):
+        return LocalDeletionQueue(self, log_callback=log_callback)
+
+
+class MboxSource(_LocalSource):
+    """
+    An mbox file, memory-mapped and split on 'From ' lines as the pipeline pages through it.
+    Message IDs are the hex byte offsets of their 'From ' lines.
+    """
+
+    name = "mbox"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._stamp = (stat.st_size, stat.st_mtime_ns) # The version of the file the offsets refer to
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        self._ends = {} # 'From ' line offset -> end offset, for every message listed so far
+
+    def _iter_ids(self):
+        # Each message runs from its 'From ' line to the next one; the archive is scanned
+        # only as far as the pages requested so far
+        archive = self._map
+        if archive[:5] == b'From ':
+            start = 0
+        else:
+            separator = archive.find(b'\nFrom ')
+            if separator == -1:
+                return
+            start = separator + 1
+        while True:
+            separator = archive.find(b'\nFrom ', start)
+            end = separator + 1 if separator != -1 else len(archive)
+            self._ends[start] = end
+            yield f"{start:x}"
+            if separator == -1:
+                return
+            start = end
+
+    def descriptor(self, message_id):
+        start = int(message_id, 16)
+        end = self._ends[start]
+        body_start = self._map.find(b'\n', start, end) + 1 # Skip the 'From ' envelope line
+        return {'path': self.path, 'offset': body_start, 'length': end - body_start, 'stamp': self._stamp}
+
+    def location(self, message_id):
+        return f"offset {int(message_id, 16)}"
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+        message_parser.close_archive(self.path) # Parsed in-process (config.PARSE_WORKERS = 0)
+
+
+class DirectorySource(_LocalSource):
+    """
+    One message per file: a Maildir (messages in cur/ and new/) or any directory tree of
+    .eml files. Message IDs are paths relative to the root directory.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.is_maildir = all(os.path.isdir(os.path.join(path, sub)) for sub in ('cur', 'new', 'tmp'))
+        self.name = "Maildir" if self.is_maildir else ".eml directory"
+
+    def _iter_ids(self):
+        roots = [os.path.join(self.path, 'cur'), os.path.join(self.path, 'new')] if self.is_maildir else [self.path]
+        for root in roots:
+            for dir_path, dir_names, file_names in os.walk(root):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    if self.is_maildir and file_name.startswith('.'):
+                        continue
+                    if not self.is_maildir and not file_name.lower().endswith('.eml'):
+                        continue
+                    yield os.path.relpath(os.path.join(dir_path, file_name), self.path)
+
+    def descriptor(self, message_id):
+        path = os.path.join(self.path, message_id)
+        if not os.path.isfile(path):
+            raise KeyError(message_id)
+        return {'path': path, 'offset': None}
+
+
+def open_local_source(path):
+    """Opens `path` as an MboxSource (a file) or a DirectorySource (a directory)."""
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if os.path.isfile(path):
+        return MboxSource(path)
+    raise FileNotFoundError(f"Mail archive '{path}' not found.")
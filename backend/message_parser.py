@@ -0,0 +1,370 @@
+# backend/message_parser.py
+import os
+import re
+import html
+import mmap
+import email
+import base64
+import codecs
+import multiprocessing
+import email.header
+import email.policy
+import concurrent.futures
+
+import config
+import prefilter
+import rate_limiter
+
+# Pure, CPU-bound parsing of Gmail message resources and of raw RFC 822 messages from
+# local archives (mail_source.py): MIME walking, base64 decoding, HTML-to-text and body
+# compaction. Kept free of Google API imports so process-pool workers (see
+# parse_messages / get_parse_pool) start quickly.
+
+# --- Body compaction ---
+# Everything after one of these lines is quoted history or a signature, never the new message
+_QUOTE_START_RE = re.compile(
+    r'^(?:On\s.{0,200}\bwrote:$'
+    r'|-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}'
+    r'|_{10,}'
+    r'|--\s?$'
+    r'|Sent from my\s.+)',
+    re.IGNORECASE,
+)
+# Outlook-style reply header: "From: ..." directly followed by "Sent:"/"Date:"
+_REPLY_HEADER_FROM_RE = re.compile(r'^From:\s', re.IGNORECASE)
+_REPLY_HEADER_NEXT_RE = re.compile(r'^(?:Sent|Date):\s', re.IGNORECASE)
+# Boilerplate footer sentences, dropped wherever they appear (unless they carry a rejection signal)
+_FOOTER_LINE_RE = re.compile(
+    r'unsubscribe|manage (?:your )?(?:email )?preferences|privacy policy|all rights reserved|\u00a9|\(c\) \d{4}'
+    r'|view (?:this email )?in (?:your )?browser|(?:please )?do not reply|no-?reply'
+    r'|this (?:e-?mail|message) (?:was sent|is intended|may contain)|confidential',
+    re.IGNORECASE,
+)
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def _strip_footer_sentences(line):
+    """
+    Drops the footer sentences of a line. After html_to_text a "line" can be a whole
+    paragraph, so only the sentences that match _FOOTER_LINE_RE go, and never one with a
+    nonzero prefilter.phrase_score ("...other candidates. Please do not reply." keeps the first).
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT_RE.split(line) if sentence.strip()]
+    return ' '.join(sentence for sentence in sentences
+                    if not _FOOTER_LINE_RE.search(sentence) or prefilter.phrase_score(sentence))
+
+
+def _strip_quotes_and_footers(text):
+    lines = [re.sub(r'[ \t\u00a0]+', ' ', line).strip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    kept = []
+    for index, line in enumerate(lines):
+        next_line = lines[index + 1] if index + 1 < len(lines) else ''
+        if _QUOTE_START_RE.match(line) or (_REPLY_HEADER_FROM_RE.match(line) and _REPLY_HEADER_NEXT_RE.match(next_line)):
+            break
+        if line.startswith('>'):
+            continue
+        if _FOOTER_LINE_RE.search(line):
+            line = _strip_footer_sentences(line)
+            if not line:
+                continue # Nothing but footer
+        if not line and (not kept or not kept[-1]):
+            continue # Collapse runs of blank lines
+        kept.append(line)
+    return '\n'.join(kept).strip()
+
+
+def compact_body(text, token_budget=None):
+    """
+    Shrinks an email body to what matters for the rejection decision: drops quoted reply
+    chains, signatures and footer boilerplate, collapses whitespace, and if the result is
+    still over `token_budget` (config.BODY_TOKEN_BUDGET) keeps the highest-scoring sentences
+    (prefilter.phrase_score) in their original order.
+    """
+    if token_budget is None:
+        token_budget = config.BODY_TOKEN_BUDGET
+    compacted = _strip_quotes_and_footers(text) or text.strip() # Never compact a body down to nothing
+    budget_chars = token_budget * rate_limiter.CHARS_PER_TOKEN
+    if len(compacted) <= budget_chars:
+        return compacted
+
+    sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT_RE.split(compacted) if sentence.strip()]
+    # Most relevant first; ties keep the earlier sentence (greeting and opening context)
+    ranked = sorted(range(len(sentences)), key=lambda i: (-prefilter.phrase_score(sentences[i]), i))
+    chosen, used = [], 0
+    for i in ranked:
+        cost = len(sentences[i]) + 1
+        if used + cost > budget_chars:
+            continue
+        chosen.append(i)
+        used += cost
+    if not chosen:
+        return sentences[ranked[0]][:budget_chars] # A single sentence longer than the whole budget
+    return ' '.join(sentences[i] for i in sorted(chosen))
+
+
+# Headers requested by the metadata-only fetch (everything the pre-screen looks at)
+METADATA_HEADERS = ['Subject', 'From', 'List-Unsubscribe', 'Precedence']
+
+
+def _header_fields(headers):
+    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
+    sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown Sender')
+    # Bulk-mail headers feed the local pre-filter's newsletter heuristics
+    list_unsubscribe = next((h['value'] for h in headers if h['name'].lower() == 'list-unsubscribe'), '')
+    precedence = next((h['value'] for h in headers if h['name'].lower() == 'precedence'), '')
+    return subject, sender, list_unsubscribe, precedence
+
+
+def extract_metadata_details(message_data, message_id):
+    """
+    Builds an email dict from a 'metadata' format message resource. The body is the Gmail
+    snippet (HTML entities decoded) and 'metadata_only' is set so callers know to fetch
+    the full message before sending it to the LLM.
+    """
+    subject, sender, list_unsubscribe, precedence = _header_fields(message_data.get('payload', {}).get('headers', []))
+    return {'id': message_id, 'subject': subject, 'sender': sender, 'body': html.unescape(message_data.get('snippet', '')),
+            'list_unsubscribe': list_unsubscribe, 'precedence': precedence, 'metadata_only': True}
+
+
+# --- MIME body extraction ---
+_HTML_DROP_RE = re.compile(r'<(script|style|head|title)\b.*?</\1\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+_HTML_BREAK_RE = re.compile(r'<(?:br|/p|/div|/tr|/li|/h[1-6]|/table|hr)\b[^>]*>', re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def html_to_text(markup):
+    """Fast, dependency-free HTML to plain text: drops scripts/styles, keeps block breaks, strips tags."""
+    text = _HTML_DROP_RE.sub(' ', markup)
+    text = _HTML_BREAK_RE.sub('\n', text)
+    text = _HTML_TAG_RE.sub(' ', text)
+    return html.unescape(text)
+
+
+def _decode_part_data(data, max_bytes=None):
+    """
+    Decodes base64url part data, stopping after max_bytes (config.MAX_BODY_BYTES_TO_DECODE)
+    of output so huge bodies aren't decoded past what the prompt can use.
+    """
+    if max_bytes is None:
+        max_bytes = config.MAX_BODY_BYTES_TO_DECODE
+    encoded_chars = (max_bytes + 2) // 3 * 4 # Every 4 base64 characters decode to 3 bytes
+    truncated = len(data) > encoded_chars
+    data = data[:encoded_chars]
+    data += '=' * (-len(data) % 4)
+    raw = base64.urlsafe_b64decode(data)[:max_bytes]
+    return _decode_text(raw, 'utf-8', truncated)
+
+
+def _decode_text(raw, charset, truncated):
+    try:
+        decoder = codecs.getincrementaldecoder(charset or 'utf-8')(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace') # Unknown charset label
+    # final=False drops a multi-byte character cut in half by the truncation
+    return decoder.decode(raw, final=not truncated)
+
+
+def find_body_text(payload):
+    """
+    Returns the message text from a 'full' format payload. Walks the MIME tree depth-first
+    with an explicit stack, stops at the first text/plain part, and otherwise converts the
+    first text/html part. Attachments are never decoded. Returns "" if there is no text part.
+    """
+    html_data = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        mime_type = part.get('mimeType', '').lower()
+        if mime_type.startswith('multipart/'):
+            # Reversed so the parts come off the stack in document order
+            stack.extend(reversed(part.get('parts', [])))
+            continue
+        part_body = part.get('body', {})
+        if part.get('filename') or 'data' not in part_body:
+            continue # Attachment, or content stored separately (attachmentId)
+        if mime_type == 'text/plain':
+            text = _decode_part_data(part_body['data'])
+            if text.strip():
+                return text
+        elif mime_type == 'text/html' and html_data is None:
+            html_data = part_body['data'] # Only converted if no text/plain part turns up
+    if html_data is not None:
+        return html_to_text(_decode_part_data(html_data))
+    return ""
+
+
+def extract_email_details(message_data, message_id):
+    """
+    Pulls subject, sender, and plain text body out of a 'full' format message resource.
+    Shared by the single-message and batched fetch paths.
+    """
+    payload = message_data.get('payload', {})
+    subject, sender, list_unsubscribe, precedence = _header_fields(payload.get('headers', []))
+    body = find_body_text(payload)
+    if not body: body = message_data.get('snippet', ''); print(f"  [Warning] Using snippet for msg {message_id}.")
+    elif config.BODY_COMPACTION_ENABLED: body = compact_body(body)
+
+    return {'id': message_id, 'subject': subject, 'sender': sender, 'body': body,
+            'list_unsubscribe': list_unsubscribe, 'precedence': precedence}
+
+
+# --- RFC 822 messages from local archives (mail_source.py) ---
+_MBOXRD_FROM_RE = re.compile(rb'^>(>*From )', re.MULTILINE)
+_archive_maps = {} # path -> ((size, mtime_ns), read-only mmap) of an mbox archive, per process
+
+
+def _archive_map(path, stamp):
+    """
+    The process's memory map of an mbox archive, as of `stamp` ((size, mtime_ns) when the
+    source opened it). A map of an older version of the file (e.g. a re-export to the same
+    path) is closed and replaced; offsets into a file that changed after the source opened
+    it would point at the wrong bytes, so that is an error.
+    """
+    cached = _archive_maps.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    close_archive(path)
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        if stamp is not None and (stat.st_size, stat.st_mtime_ns) != tuple(stamp):
+            raise OSError(f"Archive {path} changed after it was opened; run the replay again.")
+        archive = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _archive_maps[path] = (stamp, archive)
+    return archive
+
+
+def close_archive(path):
+    """Drops this process's memory map of an mbox archive (mail_source.MboxSource.close)."""
+    cached = _archive_maps.pop(path, None)
+    if cached:
+        cached[1].close()
+
+
+def read_local_message(message_data):
+    """
+    Returns the raw bytes of a local message descriptor from mail_source: a whole file
+    ('path'), or a slice of a memory-mapped mbox ('path', 'offset', 'length', 'stamp')
+    with the mboxrd '>From ' escaping undone.
+    """
+    path = message_data['path']
+    if message_data.get('offset') is None:
+        with open(path, 'rb') as f: return f.read()
+    archive = _archive_map(path, message_data.get('stamp'))
+    raw = archive[message_data['offset']:message_data['offset'] + message_data['length']]
+    return _MBOXRD_FROM_RE.sub(rb'\1', raw) if b'\n>' in raw else raw
+
+
+def _decode_header_value(value):
+    """Decodes RFC 2047 encoded words (=?utf-8?...?=) in a raw header value."""
+    if not value:
+        return ''
+    try:
+        return str(email.header.make_header(email.header.decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+def extract_rfc822_details(raw, message_id):
+    """
+    Same dict as extract_email_details, from raw RFC 822 bytes. Parsed with the compat32
+    policy (the default policy's header objects are several times slower) and walked in
+    document order: first non-empty text/plain part, otherwise the first text/html part.
+    """
+    message = email.message_from_bytes(raw, policy=email.policy.compat32)
+    subject = _decode_header_value(message.get('Subject')) or 'No Subject'
+    sender = _decode_header_value(message.get('From')) or 'Unknown Sender'
+    body, html_text = '', None
+    max_bytes = config.MAX_BODY_BYTES_TO_DECODE
+    for part in message.walk():
+        mime_type = part.get_content_type()
+        if mime_type not in ('text/plain', 'text/html') or part.get_filename() or part.get_content_disposition() == 'attachment':
+            continue
+        data = part.get_payload(decode=True) or b''
+        text = _decode_text(data[:max_bytes], part.get_content_charset(), len(data) > max_bytes)
+        if mime_type == 'text/plain' and text.strip():
+            body = text
+            break
+        if mime_type == 'text/html' and html_text is None:
+            html_text = text
+    if not body and html_text is not None:
+        body = html_to_text(html_text)
+    if not body: print(f"  [Warning] No text body in local message {message_id}.")
+    elif config.BODY_COMPACTION_ENABLED: body = compact_body(body)
+
+    return {'id': message_id, 'subject': subject, 'sender': sender, 'body': body,
+            'list_unsubscribe': message.get('List-Unsubscribe', ''), 'precedence': message.get('Precedence', '')}
+
+
+def extract_local_details(message_data, message_id):
+    return extract_rfc822_details(read_local_message(message_data), message_id)
+
+
+# --- Process pool parsing ---
+def slim_message(message_data):
+    """
+    Reduces a 'full' message resource to what extract_email_details reads, so handing it
+    to a worker process pickles as little as possible (top-level headers are filtered).
+    """
+    payload = message_data.get('payload', {})
+    wanted = {name.lower() for name in METADATA_HEADERS}
+    slim_payload = dict(payload)
+    slim_payload['headers'] = [h for h in payload.get('headers', []) if h['name'].lower() in wanted]
+    return {'id': message_data.get('id'), 'snippet': message_data.get('snippet', ''), 'payload': slim_payload}
+
+
+def parse_messages(raw_messages):
+    """
+    Worker entry point: parses [(message_id, message_data)] into
+    [(message_id, details or None, error or None)]. message_data is a slim Gmail resource
+    or a mail_source local message descriptor (read here, so only offsets cross processes).
+    One bad message never fails the chunk.
+    """
+    parsed = []
+    for message_id, message_data in raw_messages:
+        extract = extract_local_details if 'path' in message_data else extract_email_details
+        try:
+            parsed.append((message_id, extract(message_data, message_id), None))
+        except Exception as e:
+            parsed.append((message_id, None, f"Parse error: {e}"))
+    return parsed
+
+
+_parse_pool = None
+
+
+def _init_worker(settings):
+    """Gives a spawned worker the parent's config, including values changed at runtime."""
+    vars(config).update(settings)
+
+
+def get_parse_pool():
+    """
+    Lazily starts the shared process pool (config.PARSE_WORKERS processes; None = one per core)
+    and reuses it across runs. Returns None when process parsing is disabled (the default) or
+    unavailable, in which case callers parse inline.
+
+    Workers are spawned rather than forked: forking copies the parent's Gmail I/O threads,
+    locks and SQLite connection mid-use, which can deadlock or corrupt the child.
+    """
+    global _parse_pool
+    if config.PARSE_WORKERS == 0:
+        return None
+    if _parse_pool is None:
+        settings = {name: value for name, value in vars(config).items() if name.isupper()}
+        try:
+            _parse_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=config.PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(settings,))
+        except (OSError, NotImplementedError) as e:
+            print(f"  [Warning] Could not start parser process pool ({e}). Parsing in-process.")
+            config.PARSE_WORKERS = 0
+            return None
+    return _parse_pool
+
+
+def reset_parse_pool():
+    """Discards a broken pool (e.g. a worker was killed) so the next call starts a fresh one."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
@@ -0,0 +1,197 @@
+# backend/metrics.py
+import os
+import json
+import time
+import threading
+import contextlib
+
+import config
+
+# Per-run timing spans and counters for the processing pipeline. process_rejection_emails
+# starts a RunMetrics with start_run(); pipeline code records into it through the
+# module-level span() / increment() helpers, which do nothing when no run is active (e.g.
+# run_rejection_agent.py, or the tools used on their own). At the end of the run the
+# summary is appended to config.METRICS_JSON_PATH and, if configured, written as an
+# OpenMetrics text file (config.METRICS_OPENMETRICS_PATH) for Prometheus' node_exporter
+# textfile collector or any OpenMetrics scraper.
+#
+# Spans nest where the pipeline does: 'tool' runs inside 'llm' (the agent calls the tool
+# mid-turn), so stage totals can add up to more than the run's wall time. Workers run
+# concurrently, so they usually do anyway. 'llm' covers one Gemini request (each retry
+# attempt separately); the time spent before it waiting for a free session and for the
+# rate limiter is recorded as 'llm_wait'.
+
+STAGES = ('auth', 'list', 'fetch', 'parse', 'prefilter', 'llm_wait', 'llm', 'tool', 'trash')
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = 'rejection_pipeline'
+
+
+def _quantile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RunMetrics:
+    """Span durations per stage and labelled counters for one processing run. Thread-safe."""
+
+    def __init__(self, source="Gmail", mode=None):
+        self.source = source
+        self.mode = mode or config.CLASSIFICATION_MODE
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.wall_seconds = None
+        self.samples = {stage: [] for stage in STAGES} # stage -> span durations in seconds
+        self.counters = {} # (name, sorted label items) -> value
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """Times the enclosed block (sync or async code) as one sample of `stage`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def counter(self, name, **labels):
+        """Sum of `name` over every label set that includes `labels`."""
+        with self._lock:
+            return sum(value for (counter_name, items), value in self.counters.items()
+                       if counter_name == name and set(labels.items()) <= set(items))
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._started
+
+    def summary(self):
+        """The run as a JSON-serializable dict."""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+            counters = dict(self.counters)
+        wall_seconds = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._started
+        stages = {}
+        for stage, ordered in samples.items():
+            if not ordered:
+                continue
+            total = sum(ordered)
+            stages[stage] = {'count': len(ordered), 'total_seconds': round(total, 4),
+                             'share_of_wall_time': round(total / wall_seconds, 3) if wall_seconds else None,
+                             'max_seconds': round(ordered[-1], 4),
+                             **{f'p{int(q * 100)}_seconds': round(_quantile(ordered, q), 4) for q in QUANTILES}}
+        counter_rows = {}
+        for (name, items), value in sorted(counters.items()):
+            counter_rows.setdefault(name, []).append({'labels': dict(items), 'value': value})
+        return {'started_at': self.started_at, 'source': self.source, 'mode': self.mode,
+                'wall_seconds': round(wall_seconds, 3), 'stages': stages, 'counters': counter_rows}
+
+    def to_openmetrics(self):
+        """The run in the OpenMetrics text format: stage latency summaries, counters and run gauges."""
+        summary = self.summary()
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self.samples.items()}
+        lines = [f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+                 f"# UNIT {METRIC_PREFIX}_stage_seconds seconds",
+                 f"# HELP {METRIC_PREFIX}_stage_seconds Duration of pipeline stage spans in the last run."]
+        for stage, ordered in samples.items():
+            if not ordered:
+                continue
+            for q in QUANTILES:
+                lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{stage}",quantile="{q}"}} {_quantile(ordered, q):.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {sum(ordered):.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {len(ordered)}')
+        for name, rows in summary['counters'].items():
+            family = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {family} counter")
+            for row in rows:
+                labels = ",".join(f'{key}="{_escape_label(value)}"' for key, value in row['labels'].items())
+                lines.append(f"{family}_total{{{labels}}} {row['value']}" if labels else f"{family}_total {row['value']}")
+        for name, value, unit in (('last_run_wall', summary['wall_seconds'], 'seconds'),
+                                  ('last_run_timestamp', round(self.started_at, 3), 'seconds')):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_{unit} gauge")
+            lines.append(f"# UNIT {METRIC_PREFIX}_{name}_{unit} {unit}")
+            lines.append(f"{METRIC_PREFIX}_{name}_{unit} {value}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self, log_callback=print):
+        """Appends the JSON summary and rewrites the OpenMetrics file, as configured."""
+        if config.METRICS_JSON_PATH:
+            try:
+                with open(config.METRICS_JSON_PATH, 'a') as f:
+                    f.write(json.dumps(self.summary()) + "\n")
+                log_callback(f"Run metrics appended to '{config.METRICS_JSON_PATH}'.")
+            except OSError as e:
+                log_callback(f"  [Warning] Could not write run metrics to {config.METRICS_JSON_PATH}: {e}")
+        if config.METRICS_OPENMETRICS_PATH:
+            # Written atomically; scrapers may read the file at any moment
+            tmp_path = config.METRICS_OPENMETRICS_PATH + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(self.to_openmetrics())
+                os.replace(tmp_path, config.METRICS_OPENMETRICS_PATH)
+                log_callback(f"OpenMetrics written to '{config.METRICS_OPENMETRICS_PATH}'.")
+            except OSError as e:
+                log_callback(f"  [Warning] Could not write OpenMetrics file {config.METRICS_OPENMETRICS_PATH}: {e}")
+
+    def stage_report(self):
+        """One line per stage for the run log: calls, total and p95 time, share of wall time."""
+        lines = []
+        for stage, row in self.summary()['stages'].items():
+            share = f", {row['share_of_wall_time']:.0%} of wall time" if row['share_of_wall_time'] is not None else ""
+            lines.append(f"  {stage:<10} {row['count']:>6} span(s), total {row['total_seconds']:.2f}s, "
+                         f"p95 {row['p95_seconds'] * 1000:.1f}ms{share}")
+        return lines
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- The active run ---
+current = None # RunMetrics of the run in progress (kept after it finishes, for callers like the benchmark)
+_active = False
+
+
+def start_run(source="Gmail", mode=None):
+    global current, _active
+    current = RunMetrics(source, mode)
+    _active = True
+    return current
+
+
+def finish_run():
+    global _active
+    _active = False
+    if current is not None:
+        current.finish()
+    return current
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Times the enclosed block into the active run's `stage` samples (no-op outside a run)."""
+    if not _active:
+        yield
+        return
+    with current.span(stage):
+        yield
+
+
+def record(stage, seconds):
+    """Adds one `stage` sample timed by the caller (no-op outside a run)."""
+    if _active:
+        current.record(stage, seconds)
+
+
+def increment(name, amount=1, **labels):
+    if _active:
+        current.increment(name, amount, **labels)
@@ -0,0 +1,175 @@
+# backend/prefilter.py
+import re
+from email.utils import parseaddr
+
+import config
+import agent_config
+
+# Cheap local scoring that runs before the ADK agent. Emails scoring at or below
+# config.PREFILTER_SKIP_THRESHOLD are clear negatives and never reach the LLM;
+# everything else (ambiguous or likely rejections) is escalated to the agent.
+# With the two-phase fetch, headers and snippet alone only rule out bulk mail
+# (config.PREFILTER_METADATA_SKIP_THRESHOLD); other emails are scored again in full.
+
+# Strong signals: phrases that almost only appear in rejections.
+# Seeded from agent_config.REJECTION_PHRASES (the examples in AGENT_INSTRUCTION).
+STRONG_PHRASES = [phrase for phrase in agent_config.REJECTION_PHRASES if phrase != "unfortunately"] + [
+    "not been selected",
+    "not selected",
+    "decided not to proceed",
+    "decided to proceed with other",
+    "move forward with other",
+    "moving forward with other",
+    "pursue other candidates",
+    "no longer under consideration",
+    "unable to offer you",
+    "will not be moving forward",
+    "not to move forward",
+]
+# Weak signals: common in rejections but also in plenty of other mail.
+WEAK_PHRASES = [
+    "unfortunately",
+    "after careful consideration",
+    "thank you for applying",
+    "thank you for your interest",
+    "best in your job search",
+    "future openings",
+    "keep your resume on file",
+]
+# Words that tie the email to a job application at all.
+APPLICATION_CONTEXT = ["application", "applied", "applying", "candidacy", "candidate", "position", "role", "recruit"]
+
+# Applicant tracking systems and recruiting mailboxes that send rejections.
+ATS_SENDER_DOMAINS = [
+    "greenhouse.io", "lever.co", "myworkday.com", "workday.com", "smartrecruiters.com", "icims.com",
+    "ashbyhq.com", "jobvite.com", "taleo.net", "successfactors.com", "bamboohr.com", "workable.com",
+]
+RECRUITING_SENDER_WORDS = ["career", "recruit", "talent", "hiring", "jobs", "hr"]
+
+STRONG_WEIGHT = 3
+WEAK_WEIGHT = 1
+CONTEXT_WEIGHT = 1
+SENDER_WEIGHT = 2
+BULK_MAIL_PENALTY = -2
+
+
+def _compile_phrases(phrases):
+    # Allow any run of whitespace between words so line-wrapped bodies still match
+    alternatives = sorted((r'\s+'.join(re.escape(word) for word in phrase.split()) for phrase in phrases), key=len, reverse=True)
+    return re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b', re.IGNORECASE)
+
+
+_STRONG_RE = _compile_phrases(STRONG_PHRASES)
+_WEAK_RE = _compile_phrases(WEAK_PHRASES)
+_CONTEXT_RE = re.compile(r'\b(?:' + '|'.join(APPLICATION_CONTEXT) + r')', re.IGNORECASE)
+
+
+def _sender_looks_like_recruiting(sender):
+    address = parseaddr(sender or '')[1].lower()
+    local_part, _, domain = address.partition('@')
+    if any(domain == ats or domain.endswith('.' + ats) for ats in ATS_SENDER_DOMAINS):
+        return True
+    local_tokens = re.split(r'[._+-]', local_part)
+    return any(token.startswith(word) for token in local_tokens for word in RECRUITING_SENDER_WORDS)
+
+
+def phrase_score(text):
+    """
+    Phrase-only relevance of a piece of text (e.g. one sentence) to the rejection decision.
+    Used by message_parser.compact_body to pick which sentences to keep.
+    """
+    return (STRONG_WEIGHT * len(_STRONG_RE.findall(text))
+            + WEAK_WEIGHT * len(_WEAK_RE.findall(text))
+            + (CONTEXT_WEIGHT if _CONTEXT_RE.search(text) else 0))
+
+
+def strong_phrase_hits(text):
+    """The distinct strong phrases in `text`, lowercased with single spaces."""
+    return frozenset(re.sub(r'\s+', ' ', match.lower()) for match in _STRONG_RE.findall(text))
+
+
+def is_bulk_mail(email_details):
+    """True if the headers mark the email as list or bulk mail."""
+    return bool(email_details.get('list_unsubscribe')) or email_details.get('precedence', '').lower() in ('bulk', 'list')
+
+
+def score_email(email_details):
+    """
+    Returns (score, reasons) for an email dict from gmail_utils.
+    Higher scores mean "more likely a rejection".
+    """
+    subject = email_details.get('subject', '')
+    body = email_details.get('body', '')
+    text = f"{subject}\n{body}"
+    score = 0
+    reasons = []
+
+    strong_hits = strong_phrase_hits(text)
+    weak_hits = {re.sub(r'\s+', ' ', match.lower()) for match in _WEAK_RE.findall(text)}
+    if strong_hits:
+        score += STRONG_WEIGHT * len(strong_hits)
+        reasons.append(f"phrases: {', '.join(sorted(strong_hits))}")
+    if weak_hits:
+        score += WEAK_WEIGHT * len(weak_hits)
+        reasons.append(f"weak phrases: {', '.join(sorted(weak_hits))}")
+    if _CONTEXT_RE.search(text):
+        score += CONTEXT_WEIGHT
+        reasons.append("application context")
+    if _sender_looks_like_recruiting(email_details.get('sender')):
+        score += SENDER_WEIGHT
+        reasons.append("recruiting sender")
+    if is_bulk_mail(email_details):
+        score += BULK_MAIL_PENALTY
+        reasons.append("bulk mail headers")
+    return score, reasons
+
+
+class Prefilter:
+    """Applies score_email with a skip threshold and keeps counters for the run summary."""
+
+    def __init__(self, skip_threshold=None, metadata_skip_threshold=None):
+        self.skip_threshold = config.PREFILTER_SKIP_THRESHOLD if skip_threshold is None else skip_threshold
+        self.metadata_skip_threshold = (config.PREFILTER_METADATA_SKIP_THRESHOLD if metadata_skip_threshold is None
+                                        else metadata_skip_threshold)
+        self.evaluated = 0
+        self.skipped = 0
+        self.metadata_skipped = 0 # Of skipped: ruled out from headers and snippet alone
+        self.escalated = 0
+
+    @property
+    def llm_calls_saved(self):
+        return self.skipped
+
+    def should_skip(self, email_details):
+        """
+        Returns (skip, score, reasons). skip is True for clear negatives that can be
+        treated as "Not Rejection" without asking the LLM.
+        """
+        score, reasons = score_email(email_details)
+        self.evaluated += 1
+        skip = score <= self.skip_threshold
+        if skip:
+            self.skipped += 1
+        else:
+            self.escalated += 1
+        return skip, score, reasons
+
+    def should_skip_metadata(self, metadata):
+        """
+        Like should_skip for a headers-and-snippet-only email (two-phase fetch). Only bulk
+        mail scoring at or below the metadata threshold is skipped; everything else is
+        left for should_skip once the full message is fetched, and not counted yet.
+        """
+        score, reasons = score_email(metadata)
+        skip = is_bulk_mail(metadata) and score <= self.metadata_skip_threshold
+        if skip:
+            self.evaluated += 1
+            self.skipped += 1
+            self.metadata_skipped += 1
+        return skip, score, reasons
+
+    def summary(self):
+        return (f"Pre-filter: evaluated {self.evaluated}, skipped {self.skipped} clear negatives "
+                f"({self.metadata_skipped} from headers alone; LLM calls saved: {self.llm_calls_saved}), "
+                f"escalated {self.escalated} [skip threshold: score <= {self.skip_threshold}, "
+                f"bulk mail from headers: score <= {self.metadata_skip_threshold}]")
@@ -0,0 +1,120 @@
+# backend/rate_limiter.py
+import time
+import asyncio
+import threading
+
+import config
+import metrics
+
+# Gmail API quota cost per method (units per call; batched calls are charged per inner request).
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.trash': 5,
+    'messages.batchModify': 50,
+    'messages.send': 100,
+    'history.list': 2,
+    'getProfile': 1,
+}
+
+# Rough characters-per-token ratio used to estimate prompt size before sending it.
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """
+    Token-bucket limiter usable from both async code and plain blocking code.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. acquire(n) reserves
+    n tokens immediately (the balance may go negative) and waits until the reservation is
+    covered, so callers are served in arrival order and never exceed the configured rate.
+    State is guarded by a threading.Lock because the Flet app runs the backend in its own
+    thread while sync helpers (e.g. the ADK tool wrapper) share the same buckets.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_acquired = 0
+        self.total_wait_seconds = 0.0
+
+    def _reserve(self, amount):
+        """Deducts `amount` tokens and returns how many seconds the caller must wait."""
+        if self.rate <= 0:
+            return 0.0 # Limiting disabled
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self.tokens -= amount
+            self.total_acquired += amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.total_wait_seconds += wait
+            return wait
+
+    async def acquire(self, amount=1):
+        """Waits (without blocking the event loop) until `amount` tokens are available."""
+        wait = self._reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self, amount=1):
+        """Blocking variant of acquire() for synchronous call sites."""
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for budgeting LLM requests."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# --- Shared buckets ---
+# Rates are scaled by RATE_LIMIT_SAFETY_FACTOR so we run just under quota instead of into 429s.
+gmail_quota = TokenBucket(
+    'gmail_quota_units',
+    rate=config.GMAIL_QUOTA_UNITS_PER_SECOND * config.RATE_LIMIT_SAFETY_FACTOR,
+    capacity=config.GMAIL_QUOTA_UNITS_PER_SECOND * config.RATE_LIMIT_SAFETY_FACTOR,
+)
+llm_requests = TokenBucket(
+    'llm_requests',
+    rate=config.LLM_REQUESTS_PER_MINUTE * config.RATE_LIMIT_SAFETY_FACTOR / 60.0,
+    capacity=max(1, config.MAX_CONCURRENT_ANALYSES),
+)
+llm_tokens = TokenBucket(
+    'llm_tokens',
+    rate=config.LLM_TOKENS_PER_MINUTE * config.RATE_LIMIT_SAFETY_FACTOR / 60.0,
+    capacity=config.LLM_TOKENS_PER_MINUTE * config.RATE_LIMIT_SAFETY_FACTOR / 6.0, # ~10s burst
+)
+
+
+def _count_gmail_call(method, count):
+    # Every Gmail call reserves quota first, so this is where API calls are counted (retries are counted by retry_policy)
+    metrics.increment('gmail_api_calls', count, method=method)
+    metrics.increment('gmail_quota_units', GMAIL_QUOTA_UNITS[method] * count)
+
+
+def acquire_gmail_blocking(method, count=1):
+    """Reserves Gmail quota for `count` calls of `method` (blocking)."""
+    _count_gmail_call(method, count)
+    gmail_quota.acquire_blocking(GMAIL_QUOTA_UNITS[method] * count)
+
+
+async def acquire_gmail(method, count=1):
+    """Reserves Gmail quota for `count` calls of `method`."""
+    _count_gmail_call(method, count)
+    await gmail_quota.acquire(GMAIL_QUOTA_UNITS[method] * count)
+
+
+async def acquire_llm(prompt_text, output_tokens=None):
+    """Reserves one LLM request plus the estimated tokens for the prompt and reply."""
+    if output_tokens is None:
+        output_tokens = config.LLM_OUTPUT_TOKENS_ESTIMATE
+    await llm_requests.acquire(1)
+    await llm_tokens.acquire(estimate_tokens(prompt_text) + output_tokens)
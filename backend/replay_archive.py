@@ -0,0 +1,31 @@
+# backend/replay_archive.py
+import sys
+import asyncio
+import argparse
+
+import config
+import backend_processor
+
+# Classifies a local mail archive (mbox, Maildir or .eml directory, e.g. a Google Takeout
+# export) with the same pipeline the app runs against Gmail. Uses no Gmail quota and never
+# modifies the archive; rejections are written to config.LOCAL_VERDICTS_PATH. Verdicts and
+# template signatures are cached in config.LOCAL_VERDICT_CACHE_PATH, never the live Gmail cache.
+#   cd backend && python replay_archive.py ~/Takeout/Mail/All\ mail\ Including\ Spam\ and\ Trash.mbox
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find job rejections in a local mail archive.")
+    parser.add_argument('archive', help="mbox file, Maildir, or directory of .eml files.")
+    parser.add_argument('--output', default=config.LOCAL_VERDICTS_PATH, help="JSON Lines file rejections are appended to.")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this many messages (default: the whole archive).")
+    args = parser.parse_args(argv)
+
+    config.MAIL_SOURCE_PATH = args.archive
+    config.LOCAL_VERDICTS_PATH = args.output
+    config.MAX_EMAILS_PER_RUN = args.limit
+    summary = asyncio.run(backend_processor.process_rejection_emails(print))
+    return 1 if summary.startswith("Error") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
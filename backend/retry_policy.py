@@ -0,0 +1,94 @@
+# backend/retry_policy.py
+import re
+import time
+import random
+import asyncio
+
+import config
+import metrics
+
+# Shared retry policy for Gmail API and Gemini calls. Throttling (429), server errors
+# (500/503), Gemini quota errors and dropped connections are retried with exponential
+# backoff and full jitter; a Retry-After / retryDelay hint from the server is honoured
+# up to config.RETRY_MAX_DELAY_SECONDS. Anything else is raised immediately.
+
+RETRYABLE_STATUS_CODES = {429, 500, 503}
+_QUOTA_ERROR_RE = re.compile(r'RESOURCE_EXHAUSTED|rate limit|quota exceeded', re.IGNORECASE)
+_RETRY_DELAY_RE = re.compile(r'retryDelay[\'"]?\s*:\s*[\'"]?(\d+(?:\.\d+)?)s')
+
+
+def status_code(error):
+    """HTTP status of a googleapiclient HttpError or a google-genai APIError, if any."""
+    resp = getattr(error, 'resp', None)
+    if resp is not None and getattr(resp, 'status', None) is not None:
+        return int(resp.status)
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    if status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return bool(_QUOTA_ERROR_RE.search(str(error)))
+
+
+def retry_after_seconds(error):
+    """Server-suggested wait: the Retry-After header (Gmail) or retryDelay in the error body (Gemini)."""
+    resp = getattr(error, 'resp', None)
+    header = resp.get('retry-after') if hasattr(resp, 'get') else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass # HTTP-date form; fall back to our own backoff
+    match = _RETRY_DELAY_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay(attempt, error=None):
+    """Seconds to wait before retry number `attempt` (1-based)."""
+    ceiling = min(config.RETRY_MAX_DELAY_SECONDS, config.RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling) # Full jitter keeps concurrent workers from retrying in lockstep
+    hint = retry_after_seconds(error) if error is not None else None
+    if hint is not None:
+        delay = max(delay, min(hint, config.RETRY_MAX_DELAY_SECONDS))
+    return delay
+
+
+def _count_retry(description, error):
+    target = 'gemini' if description.startswith('Gemini') else 'gmail'
+    metrics.increment('retries', target=target, status=str(status_code(error) or type(error).__name__))
+
+
+def call_blocking(fn, *args, description="request", log_callback=print, **kwargs):
+    """Calls fn(*args, **kwargs), retrying transient errors with backoff (blocking sleeps)."""
+    attempt = 1
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= config.RETRY_MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            _count_retry(description, e)
+            log_callback(f"  [Retry] {description} failed ({e}). Attempt {attempt + 1}/{config.RETRY_MAX_ATTEMPTS} in {delay:.1f}s.")
+            time.sleep(delay)
+            attempt += 1
+
+
+async def call_async(fn, *args, description="request", log_callback=print, **kwargs):
+    """Awaits fn(*args, **kwargs), retrying transient errors with backoff without blocking the loop."""
+    attempt = 1
+    while True:
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= config.RETRY_MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            _count_retry(description, e)
+            log_callback(f"  [Retry] {description} failed ({e}). Attempt {attempt + 1}/{config.RETRY_MAX_ATTEMPTS} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -6,19 +6,17 @@ import functools
 # Import configurations and utilities
 import config
 import gmail_utils
+import gmail_async
 import adk_tools
 import agent_config
+import rate_limiter
+import session_pool
 
-# Import ADK components
-from google.adk.agents import Agent
-from google.adk.models.lite_llm import LiteLlm
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.genai import types as adk_types
-from googleapiclient.errors import HttpError
+# ADK components are imported inside the functions that use them, so the script starts
+# (and begins Gmail authentication) without waiting on the google-adk import.
 
 # --- analyze_email_with_adk function remains the same ---
-async def analyze_email_with_adk(runner, session_service, email_details: dict):
+async def analyze_email_with_adk(runner, sessions, email_details: dict):
     # ... (keep existing code for this function) ...
     if not email_details or 'id' not in email_details or 'subject' not in email_details or 'body' not in email_details:
         print("  [Error] Invalid email details passed to analyze_email_with_adk.")
@@ -31,11 +29,6 @@ async def analyze_email_with_adk(runner, session_service, email_details: dict):
     print(f"\n>>> Analyzing Email ID: {message_id} with ADK Agent")
     print(f"    Subject: {subject[:100]}...")
 
-    session_id = f"analyze_{message_id}"
-    session = session_service.create_session(
-        app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id
-    )
-
     prompt_text = f"""Analyze the following email content.
 Message ID: {message_id}
 Subject: {subject}
@@ -43,30 +36,31 @@ Subject: {subject}
 Body:
 {body}
 """
+    from google.genai import types as adk_types
     content = adk_types.Content(role='user', parts=[adk_types.Part(text=prompt_text)])
 
     final_response_text = "Agent analysis did not complete or produce a response."
     try:
-        async for event in runner.run_async(user_id=config.USER_ID, session_id=session_id, new_message=content):
-            if event.is_final_response() and event.content and event.content.parts:
-                final_response_text = event.content.parts[0].text
-                break
+        # Reuse the pooled session; its history is cleared before the next email
+        async with sessions.session() as session_id:
+            await rate_limiter.acquire_llm(agent_config.AGENT_INSTRUCTION + prompt_text)
+            async for event in runner.run_async(user_id=config.USER_ID, session_id=session_id, new_message=content):
+                if event.is_final_response() and event.content and event.content.parts:
+                    final_response_text = event.content.parts[0].text
+                    break
         print(f"<<< Agent Final Thought: {final_response_text}")
     except Exception as e:
         print(f"  [Error] Exception during ADK runner execution for {message_id}:")
         traceback.print_exc()
-    finally:
-        try:
-            session_service.delete_session(
-                app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id
-            )
-        except Exception as del_e:
-             print(f"  [Warning] Error deleting session {session_id}: {del_e}")
 
 
 # --- Main Execution Logic ---
 async def main():
     """Main async function to set up and run the agent process."""
+    from google.adk.agents import Agent
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.runners import Runner
+    from googleapiclient.errors import HttpError
     print("--- Starting Email Rejection Processor (Modular ADK Version) ---")
 
     # 1. Authenticate with Gmail (gets service object)
@@ -86,6 +80,10 @@ async def main():
     # *** CHANGE HERE: Define wrapper with signature ADK can parse ***
     # ***********************************************************************
 
+    # Deletions are queued and trashed in bulk with batchModify at the end of the run
+    # (or whenever the queue reaches config.DELETION_FLUSH_THRESHOLD).
+    deletion_queue = adk_tools.DeletionQueue(gmail_service)
+
     # Define a wrapper function that ONLY takes arguments the LLM needs to provide.
     # The gmail_service is accessed via the closure.
     # Copy the DOCSTRING manually for ADK.
@@ -101,7 +99,7 @@ async def main():
         """
         # The 'gmail_service' used here is the one from the outer scope of main()
         print(f"--- Wrapper: delete_email_wrapper called for message_id: {message_id} ---") # Add print here
-        return adk_tools.delete_email_tool(gmail_service, message_id)
+        return adk_tools.delete_email_tool(gmail_service, message_id, deletion_queue)
 
     # We don't need @functools.wraps anymore because we define the signature
     # directly as ADK needs it (only message_id).
@@ -116,7 +114,7 @@ async def main():
     try:
         rejection_agent = Agent(
             name=agent_config.AGENT_NAME,
-            model = "gemini-2.0-flash",
+            model = config.ADK_MODEL_STRING,
             description=agent_config.AGENT_DESCRIPTION,
             instruction=agent_config.AGENT_INSTRUCTION,
             tools=prepared_tools, # Provide the wrapper tool function
@@ -134,30 +132,27 @@ async def main():
         app_name=config.APP_NAME,
         session_service=session_service,
     )
+    sessions = session_pool.SessionPool(session_service, 1) # Emails are analyzed one at a time here
     print("ADK Runner and Session Service initialized.")
 
-    # 6. Fetch Emails from Gmail (remains the same)
+    # 6. Fetch Emails from Gmail (calls run on gmail_async's I/O threads)
+    gmail = gmail_async.AsyncGmailClient(gmail_service)
     print("\n--- Fetching Emails from Gmail ---")
-    search_query = 'in:inbox label:inbox is:unread category:primary'
+    search_query = config.GMAIL_SEARCH_QUERY
     print(f"Using Gmail search query: '{search_query}' (Limit: {config.MAX_EMAILS_PER_RUN})")
     emails_to_analyze = []
     try:
-        results = gmail_service.users().messages().list(
-            userId='me', q=search_query, maxResults=config.MAX_EMAILS_PER_RUN
-        ).execute()
+        results = await gmail.list_messages(search_query, config.MAX_EMAILS_PER_RUN or config.LIST_PAGE_SIZE)
         messages = results.get('messages', [])
 
         if not messages:
             print("No messages found matching the query.")
         else:
-            print(f"Found {len(messages)} emails. Fetching details...")
-            for message_info in messages:
-                msg_id = message_info['id']
-                details = gmail_utils.get_email_details(gmail_service, msg_id)
-                if details:
-                    emails_to_analyze.append(details)
-                else:
-                    print(f"  Skipping message {msg_id} due to fetch error.")
+            print(f"Found {len(messages)} emails. Fetching details in batches of up to {config.GMAIL_BATCH_SIZE}...")
+            msg_ids = [message_info['id'] for message_info in messages]
+            emails_to_analyze, fetch_errors = await gmail.get_messages_batch(msg_ids)
+            for msg_id, fetch_error in fetch_errors.items():
+                print(f"  Skipping message {msg_id} due to fetch error: {fetch_error}")
     except HttpError as error:
         print(f"\nAn error occurred during Gmail search: {error}")
     except Exception as e:
@@ -168,11 +163,19 @@ async def main():
     if emails_to_analyze:
         print(f"\n--- Analyzing {len(emails_to_analyze)} Emails with ADK Agent ---")
         for email in emails_to_analyze:
-            await analyze_email_with_adk(runner, session_service, email)
-            await asyncio.sleep(1) # Keep delay for safety
+            await analyze_email_with_adk(runner, sessions, email) # Paced by rate_limiter
+            if deletion_queue.is_full():
+                await gmail.run(deletion_queue.flush)
     else:
         print("\nNo emails fetched to analyze.")
 
+    # 8. Flush any deletions still waiting in the queue
+    if deletion_queue.pending:
+        print(f"\n--- Flushing {len(deletion_queue.pending)} queued deletion(s) ---")
+        await gmail.run(deletion_queue.flush)
+
+    sessions.close()
+    gmail.close()
     print("\n--- Script Finished ---")
 
 # --- Run the main async function (remains the same) ---
@@ -0,0 +1,68 @@
+# backend/session_pool.py
+import asyncio
+import contextlib
+
+import config
+
+# Long-lived ADK sessions, one per concurrent worker, instead of create/delete per email.
+# A session's conversation history is wiped every time it is handed back, so no email
+# can ever see a previous email in its prompt, and InMemorySessionService stays flat.
+
+
+class SessionPool:
+    """Fixed set of reusable ADK sessions handed out to concurrent analysis workers."""
+
+    def __init__(self, session_service, size, prefix="worker"):
+        self.session_service = session_service
+        self.session_ids = [f"{prefix}_{i}" for i in range(max(1, size))]
+        self._available = asyncio.Queue()
+        self.resets = 0
+        self.recreated = 0
+        for session_id in self.session_ids:
+            self._create(session_id)
+            self._available.put_nowait(session_id)
+
+    def _create(self, session_id):
+        self.session_service.create_session(app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id)
+
+    def _stored_session(self, session_id):
+        # InMemorySessionService keeps sessions in sessions[app_name][user_id][session_id];
+        # get_session() may hand back a copy, so reset the stored object itself.
+        sessions = getattr(self.session_service, 'sessions', None)
+        if isinstance(sessions, dict):
+            return sessions.get(config.APP_NAME, {}).get(config.USER_ID, {}).get(session_id)
+        return None
+
+    def reset(self, session_id):
+        """Drops all events and state from a session, recreating it if it can't be cleared in place."""
+        session = self._stored_session(session_id)
+        if session is not None and hasattr(session, 'events'):
+            session.events.clear()
+            if isinstance(getattr(session, 'state', None), dict):
+                session.state.clear()
+            self.resets += 1
+            return
+        # Unknown session service: fall back to a fresh session under the same ID
+        try:
+            self.session_service.delete_session(app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id)
+        except Exception:
+            pass
+        self._create(session_id)
+        self.recreated += 1
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        """Borrows a clean session ID for one agent run and resets it on return."""
+        session_id = await self._available.get()
+        try:
+            yield session_id
+        finally:
+            self.reset(session_id)
+            self._available.put_nowait(session_id)
+
+    def close(self):
+        for session_id in self.session_ids:
+            try:
+                self.session_service.delete_session(app_name=config.APP_NAME, user_id=config.USER_ID, session_id=session_id)
+            except Exception as e:
+                print(f"  [Warning] Error deleting pooled session {session_id}: {e}")
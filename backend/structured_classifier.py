@@ -0,0 +1,36 @@
+# backend/structured_classifier.py
+import re
+import json
+
+from pydantic import BaseModel, Field
+
+# Helpers for config.CLASSIFICATION_MODE = 'structured': the agent answers in one turn with
+# a constrained JSON verdict instead of calling delete_email_tool, and the backend applies
+# the deletion itself. That removes the tool-call -> tool-result -> final-text round trip.
+
+
+class EmailVerdict(BaseModel):
+    """Output schema given to the structured agent (ADK `output_schema`)."""
+    is_rejection: bool = Field(description="True only if the email is a rejection for a job application.")
+    confidence: float = Field(description="Confidence in the decision, from 0.0 to 1.0.")
+    reason: str = Field(description="One short sentence explaining the decision.")
+
+
+def parse_verdict_response(response_text):
+    """
+    Returns an EmailVerdict parsed from the agent's reply, or None if the reply isn't a
+    valid verdict (the caller then falls back to the tool-calling agent).
+    """
+    if not response_text:
+        return None
+    text = re.sub(r"```(?:json)?", "", response_text)
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+        verdict = EmailVerdict(**data)
+    except Exception:
+        return None
+    verdict.confidence = min(1.0, max(0.0, verdict.confidence))
+    return verdict
@@ -0,0 +1,70 @@
+# backend/sync_state.py
+import os
+import json
+import time
+
+import config
+
+# Persists the Gmail mailbox historyId reached by the last successful run so the next run
+# can ask users().history().list for only the messages added since then.
+# Until the first full scan has finished (it can take several runs when
+# config.MAX_EMAILS_PER_RUN caps each one), the state instead records how far the scan got:
+# the messages.list page token to resume from and the historyId the scan started at,
+# which becomes the checkpoint once the last page is done.
+
+
+def _load_state():
+    if not os.path.exists(config.SYNC_STATE_PATH):
+        return {}
+    try:
+        with open(config.SYNC_STATE_PATH, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"  [Warning] Could not read sync state {config.SYNC_STATE_PATH}: {e}. Doing a full scan.")
+        return {}
+
+
+def _save_state(state):
+    """Atomically writes the sync state."""
+    state['updated_at'] = time.time()
+    tmp_path = config.SYNC_STATE_PATH + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, config.SYNC_STATE_PATH)
+        return True
+    except Exception as e:
+        print(f"  [Warning] Could not save sync state {config.SYNC_STATE_PATH}: {e}")
+        return False
+
+
+def load_history_checkpoint():
+    """Returns the saved historyId string, or None if there is no usable checkpoint."""
+    return _load_state().get('history_id')
+
+
+def save_history_checkpoint(history_id):
+    """Atomically writes the historyId checkpoint (ending any full scan in progress)."""
+    return _save_state({'history_id': str(history_id)})
+
+
+def load_scan_progress():
+    """Returns (page_token, scan_history_id) of an unfinished full scan, or (None, None)."""
+    state = _load_state()
+    if state.get('history_id'):
+        return None, None
+    return state.get('scan_page_token'), state.get('scan_history_id')
+
+
+def save_scan_progress(page_token, scan_history_id):
+    """Records that a full scan has processed every page before `page_token`."""
+    return _save_state({'scan_page_token': page_token, 'scan_history_id': str(scan_history_id)})
+
+
+def clear_history_checkpoint():
+    """Removes the checkpoint, forcing the next run to do a full scan."""
+    try:
+        if os.path.exists(config.SYNC_STATE_PATH):
+            os.remove(config.SYNC_STATE_PATH)
+    except OSError as e:
+        print(f"  [Warning] Could not remove sync state {config.SYNC_STATE_PATH}: {e}")
@@ -0,0 +1,176 @@
+# backend/template_clustering.py
+import re
+import asyncio
+import hashlib
+from email.utils import parseaddr
+
+import config
+import prefilter
+import verdict_cache
+
+# Near-duplicate detection for templated mail (ATS rejections differ only in names, numbers
+# and role titles). Each email gets a 64-bit SimHash of its word shingles; emails from the
+# same sender domain whose signatures are within config.CLUSTER_MAX_HAMMING_DISTANCE bits
+# share one verdict, so only the first email of a template needs the LLM.
+# A near-identical body is not enough to trash an email, though: a Rejection verdict is only
+# reused when the member has exactly the representative's strong rejection phrases
+# (prefilter) and the same normalized subject. ATS send one subject ("Update on your
+# application") for both outcomes, so a subject match alone proves nothing. Other members
+# go to the LLM.
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+
+def _normalize(text):
+    text = text.lower()
+    text = re.sub(r'\d+', '0', text) # "Mock #12" and "Mock #13" are the same template
+    return re.findall(r'[a-z0]+', text)
+
+
+def simhash(text):
+    """64-bit SimHash over word shingles of the normalized text."""
+    words = _normalize(text)
+    if len(words) < SHINGLE_SIZE:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def sender_domain(sender):
+    return parseaddr(sender or '')[1].rpartition('@')[2].lower()
+
+
+def subject_key(subject):
+    """The subject with case, digits and punctuation normalized away."""
+    return ' '.join(_normalize(subject or ''))
+
+
+def _template_text(email_details):
+    return f"{email_details.get('subject', '')}\n{email_details.get('body', '')[:config.MAX_BODY_CHARS_FOR_PROMPT]}"
+
+
+class ClusterEntry:
+    """
+    One known template: its signature, sender domain, and verdict (or a pending future),
+    plus the representative's strong phrases and subject key, both of which a member must
+    share to inherit a Rejection verdict.
+    """
+
+    def __init__(self, signature, domain, verdict=None, future=None, persisted=False, strong_hits=frozenset(), subject=''):
+        self.signature = signature
+        self.domain = domain
+        self.strong_hits = frozenset(strong_hits)
+        self.subject = subject
+        self.verdict = verdict
+        self.future = future # Set while the representative is still being classified
+        self.persisted = persisted # Loaded from an earlier run
+        self.members = 0
+
+
+class TemplateClusterer:
+    """
+    In-memory index of template signatures for one run, seeded from signatures persisted in
+    the verdict cache. Lookups use banded LSH: with max_distance + 1 bands, any signature
+    within max_distance bits of a stored one must match it exactly in at least one band.
+    """
+
+    def __init__(self, cache=None, max_distance=None):
+        self.cache = cache
+        self.max_distance = config.CLUSTER_MAX_HAMMING_DISTANCE if max_distance is None else max_distance
+        self.num_bands = self.max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.num_bands
+        self._index = {} # (band number, band value) -> [ClusterEntry]
+        self.representatives = 0
+        self.member_hits = 0
+        self.persisted_hits = 0
+        self.unconfirmed = 0 # Rejection-cluster members sent to the LLM for lack of matching evidence
+        if cache:
+            for signature, domain, verdict, strong_hits, subject in cache.load_signatures():
+                self._add(ClusterEntry(signature, domain, verdict=verdict, persisted=True, strong_hits=strong_hits, subject=subject))
+
+    def _bands(self, signature):
+        mask = (1 << self.band_bits) - 1
+        return [(band, (signature >> (band * self.band_bits)) & mask) for band in range(self.num_bands)]
+
+    def _add(self, entry):
+        for key in self._bands(entry.signature):
+            self._index.setdefault(key, []).append(entry)
+        return entry
+
+    def signature_for(self, email_details):
+        return simhash(_template_text(email_details)), sender_domain(email_details.get('sender'))
+
+    def confirms_rejection(self, entry, email_details):
+        """True if the email has the entry's (non-empty) strong phrases and its normalized subject."""
+        if not entry.strong_hits or subject_key(email_details.get('subject')) != entry.subject:
+            return False
+        return prefilter.strong_phrase_hits(_template_text(email_details)) == entry.strong_hits
+
+    def find(self, signature, domain):
+        """Returns the closest known entry for this template, or None."""
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for key in self._bands(signature):
+            for entry in self._index.get(key, []):
+                if id(entry) in seen or entry.domain != domain:
+                    continue
+                if entry.verdict is None and entry.future is None:
+                    continue # Representative failed; not a usable cluster
+                seen.add(id(entry))
+                distance = hamming_distance(signature, entry.signature)
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+        return best
+
+    def add_representative(self, signature, domain, email_details):
+        """Registers a new template whose verdict is about to be computed by the LLM."""
+        self.representatives += 1
+        return self._add(ClusterEntry(signature, domain, future=asyncio.get_running_loop().create_future(),
+                                      strong_hits=prefilter.strong_phrase_hits(_template_text(email_details)),
+                                      subject=subject_key(email_details.get('subject'))))
+
+    def resolve(self, entry, verdict):
+        """Records the representative's verdict, wakes waiting members, and persists the signature."""
+        entry.verdict = verdict
+        if entry.future and not entry.future.done():
+            entry.future.set_result(verdict)
+        entry.future = None
+        if verdict and self.cache:
+            self.cache.put_signature(entry.signature, entry.domain, verdict, entry.strong_hits, entry.subject)
+
+    async def verdict_for(self, entry, email_details):
+        """
+        The cluster's verdict for this member, waiting for the representative if needed.
+        None if the representative failed, or if the verdict is Rejection but the member
+        doesn't confirm it (see confirms_rejection): the caller then asks the LLM.
+        """
+        if entry.verdict is None and entry.future is not None:
+            await asyncio.shield(entry.future)
+        if entry.verdict == verdict_cache.VERDICT_REJECTION and not self.confirms_rejection(entry, email_details):
+            self.unconfirmed += 1
+            return None
+        if entry.verdict:
+            entry.members += 1
+            if entry.persisted:
+                self.persisted_hits += 1
+            else:
+                self.member_hits += 1
+        return entry.verdict
+
+    def summary(self):
+        return (f"Template clustering: {self.representatives} new template(s) sent to the LLM, "
+                f"{self.member_hits} email(s) resolved from in-run clusters, "
+                f"{self.persisted_hits} from persisted templates, "
+                f"{self.unconfirmed} rejection look-alike(s) without matching phrases and subject sent to the LLM "
+                f"[max distance: {self.max_distance} of {SIMHASH_BITS} bits]")
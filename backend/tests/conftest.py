@@ -0,0 +1,9 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+# The backend modules import each other as top-level modules (import config), so the
+# tests run with backend/ on sys.path:  cd backend && python -m pytest tests
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
@@ -0,0 +1,105 @@
+# backend/tests/test_deletion_queue.py
+import time
+import threading
+
+import adk_tools
+import rate_limiter
+
+
+class FakeGmail:
+    """Just enough of users().messages().batchModify(...).execute() to record the calls."""
+
+    def __init__(self):
+        self.batches = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def batchModify(self, userId, body):
+        self.batches.append(list(body['ids']))
+        return self
+
+    def execute(self):
+        return {}
+
+
+def make_queue(threshold, monkeypatch):
+    monkeypatch.setattr(rate_limiter.gmail_quota, 'rate', 0)
+    service = FakeGmail()
+    return adk_tools.DeletionQueue(service, flush_threshold=threshold, log_callback=lambda line: None), service
+
+
+def test_enqueue_never_flushes(monkeypatch):
+    queue, service = make_queue(2, monkeypatch)
+    for message_id in ('a', 'b', 'c'):
+        assert queue.enqueue(message_id)['status'] == 'queued'
+    assert service.batches == []
+    assert queue.is_full()
+
+
+def test_flush_trashes_pending_ids_in_one_call(monkeypatch):
+    queue, service = make_queue(2, monkeypatch)
+    queue.enqueue('a')
+    queue.enqueue('b')
+    flushed = queue.flush()
+    assert service.batches == [['a', 'b']]
+    assert {result['status'] for result in flushed.values()} == {'success'}
+    assert not queue.pending and not queue.is_full()
+
+
+def test_ids_stay_queued_while_a_flush_is_running(monkeypatch):
+    queue, _ = make_queue(10, monkeypatch)
+    queue.enqueue('a')
+    pending = queue._take_pending()
+    queue.enqueue('b') # The event loop keeps queueing while another thread flushes
+    assert pending == ['a']
+    assert queue.is_queued('a')
+    assert queue.enqueue('a')['message'].endswith("already queued for Trash.")
+    assert queue.pending == ['b']
+
+
+def test_flush_splits_batch_modify_calls_at_the_api_limit(monkeypatch):
+    monkeypatch.setattr(adk_tools, 'BATCH_MODIFY_MAX_IDS', 3)
+    queue, service = make_queue(100, monkeypatch)
+    for index in range(7):
+        queue.enqueue(str(index))
+    queue.flush()
+    assert [len(batch) for batch in service.batches] == [3, 3, 1]
+    assert len(queue.results) == 7
+
+
+def test_flush_runs_requests_through_the_given_executor(monkeypatch):
+    monkeypatch.setattr(rate_limiter.gmail_quota, 'rate', 0)
+    executed = []
+    queue = adk_tools.DeletionQueue(FakeGmail(), log_callback=lambda line: None,
+                                    execute=lambda request: executed.append(request) or {})
+    queue.enqueue('a')
+    queue.flush()
+    assert len(executed) == 1
+
+
+def test_flushes_never_overlap(monkeypatch):
+    monkeypatch.setattr(rate_limiter.gmail_quota, 'rate', 0)
+    running, overlaps = [], []
+
+    def slow_execute(request):
+        if running:
+            overlaps.append(1)
+        running.append(1)
+        time.sleep(0.01)
+        running.pop()
+        return {}
+
+    queue = adk_tools.DeletionQueue(FakeGmail(), log_callback=lambda line: None, execute=slow_execute)
+    threads = []
+    for index in range(8):
+        queue.enqueue(str(index))
+        threads.append(threading.Thread(target=queue.flush))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+    assert len(queue.results) == 8
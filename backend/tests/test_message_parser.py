@@ -0,0 +1,148 @@
+# backend/tests/test_message_parser.py
+import pytest
+
+import mail_source
+import message_parser
+
+
+def test_footer_sentence_in_rejection_paragraph_keeps_the_verdict():
+    body = ("Dear Jane,\n\nUnfortunately, we have decided to move forward with other candidates. "
+            "Please do not reply to this email.")
+    compacted = message_parser.compact_body(body)
+    assert "move forward with other candidates" in compacted
+    assert "do not reply" not in compacted
+
+
+def test_html_rejection_is_not_compacted_to_the_greeting():
+    markup = ("<html><body><p>Dear Jane,</p><p>Thank you for applying to the Data Analyst position. "
+              "After careful consideration, we will not be moving forward with your application. "
+              "This email was sent from an unmonitored mailbox; please do not reply. "
+              "This message may contain confidential information.</p>"
+              "<p><a href='#'>Unsubscribe</a> | Privacy Policy</p></body></html>")
+    compacted = message_parser.compact_body(message_parser.html_to_text(markup))
+    assert compacted.startswith("Dear Jane,")
+    assert "will not be moving forward with your application" in compacted
+    assert "confidential" not in compacted
+    assert "Unsubscribe" not in compacted
+
+
+def test_lines_that_are_only_footer_are_dropped():
+    body = "Hi Sam,\nYour order has shipped.\nUnsubscribe | Manage preferences\n© 2024 Acme Inc. All rights reserved."
+    assert message_parser.compact_body(body) == "Hi Sam,\nYour order has shipped."
+
+
+def test_quoted_reply_chain_is_cut():
+    body = "Thanks, see you then.\n\nOn Mon, Jan 1, 2024 at 9:00 AM Bob <bob@example.com> wrote:\n> Can we meet?"
+    assert message_parser.compact_body(body) == "Thanks, see you then."
+
+
+def test_over_budget_body_keeps_the_rejection_sentence():
+    filler = " ".join(f"Our team shipped feature number {i} this quarter." for i in range(200))
+    body = f"Hello. {filler} We regret to inform you that you were not selected. {filler}"
+    compacted = message_parser.compact_body(body, token_budget=50)
+    assert "not selected" in compacted
+    assert len(compacted) <= 50 * message_parser.rate_limiter.CHARS_PER_TOKEN
+
+
+def write_mbox(path, subject):
+    with open(path, 'w') as f:
+        f.write(f"From a@example.com Mon Jan  1 00:00:00 2024\nSubject: {subject}\n\nHello.\n")
+
+
+def read_first_subject(path):
+    source = mail_source.MboxSource(path)
+    try:
+        message_id = next(source._iter_ids())
+        return message_parser.extract_rfc822_details(message_parser.read_local_message(source.descriptor(message_id)),
+                                                     message_id)['subject']
+    finally:
+        source.close()
+
+
+def test_re_exported_mbox_is_read_again(tmp_path):
+    path = str(tmp_path / 'archive.mbox')
+    write_mbox(path, 'First export')
+    assert read_first_subject(path) == 'First export'
+    write_mbox(path, 'Second export, a longer one')
+    assert read_first_subject(path) == 'Second export, a longer one'
+    assert path not in message_parser._archive_maps # Closing the source drops the map
+
+
+def test_mbox_changed_after_opening_is_an_error(tmp_path):
+    path = str(tmp_path / 'archive.mbox')
+    write_mbox(path, 'First export')
+    source = mail_source.MboxSource(path)
+    try:
+        descriptor = source.descriptor(next(source._iter_ids()))
+        write_mbox(path, 'Second export, a longer one')
+        with pytest.raises(OSError):
+            message_parser.read_local_message(descriptor)
+    finally:
+        source.close()
+
+
+MULTIPART = b"""Subject: =?utf-8?q?Your_application_=E2=80=93_Acme?=
+From: Acme Careers <jobs@acme.com>
+List-Unsubscribe: <mailto:u@acme.com>
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="outer"
+
+--outer
+Content-Type: multipart/alternative; boundary="inner"
+
+--inner
+Content-Type: text/html; charset=utf-8
+
+<p>HTML version</p>
+--inner
+Content-Type: text/plain; charset=utf-8
+
+Plain version.
+--inner--
+--outer
+Content-Type: text/plain; name="resume.txt"
+Content-Disposition: attachment; filename="resume.txt"
+
+Attached resume text.
+--outer--
+"""
+
+
+def test_rfc822_prefers_plain_text_and_skips_attachments():
+    details = message_parser.extract_rfc822_details(MULTIPART, 'm1')
+    assert details['subject'] == "Your application – Acme"
+    assert details['body'] == "Plain version."
+    assert details['list_unsubscribe'] == "<mailto:u@acme.com>"
+
+
+def test_rfc822_falls_back_to_html():
+    raw = MULTIPART.replace(b"Plain version.", b"   ")
+    assert message_parser.extract_rfc822_details(raw, 'm1')['body'] == "HTML version"
+
+
+def test_mboxrd_from_escaping_is_undone(tmp_path):
+    path = tmp_path / 'archive.mbox'
+    path.write_bytes(b"From a@example.com Mon Jan  1 00:00:00 2024\nSubject: Hi\n\n>From here on.\n>>From quoted.\n")
+    source = mail_source.MboxSource(str(path))
+    try:
+        raw = message_parser.read_local_message(source.descriptor(next(source._iter_ids())))
+    finally:
+        source.close()
+    assert raw.endswith(b"\nFrom here on.\n>From quoted.\n")
+
+
+def test_spawned_parser_workers_see_runtime_config(tmp_path, monkeypatch):
+    assert message_parser.get_parse_pool() is None # In-process unless PARSE_WORKERS is set
+    path = tmp_path / 'archive.mbox'
+    path.write_bytes(b"From a@example.com Mon Jan  1 00:00:00 2024\nSubject: Hi\n\nRejected, sadly.\n")
+    monkeypatch.setattr(message_parser.config, 'PARSE_WORKERS', 1)
+    monkeypatch.setattr(message_parser.config, 'MAX_BODY_BYTES_TO_DECODE', 8)
+    source = mail_source.MboxSource(str(path))
+    try:
+        descriptor = source.descriptor(next(source._iter_ids()))
+        pool = message_parser.get_parse_pool()
+        [(_, details, error)] = pool.submit(message_parser.parse_messages, [('m1', descriptor)]).result(timeout=60)
+    finally:
+        message_parser.reset_parse_pool()
+        source.close()
+    assert error is None and details['body'] == "Rejected"
@@ -0,0 +1,60 @@
+# backend/tests/test_metrics.py
+import json
+
+import config
+import metrics
+
+
+def test_helpers_do_nothing_outside_a_run():
+    run = metrics.start_run()
+    metrics.finish_run()
+    with metrics.span('llm'):
+        pass
+    metrics.record('llm_wait', 1.0)
+    metrics.increment('retries')
+    assert metrics.current is run # Kept for callers like the benchmark, but no longer recording
+    assert run.summary()['stages'] == {} and run.summary()['counters'] == {}
+
+
+def test_spans_and_labelled_counters():
+    run = metrics.start_run(source="Test", mode='batch')
+    try:
+        for _ in range(3):
+            with metrics.span('fetch'):
+                pass
+        metrics.record('llm_wait', 0.5)
+        metrics.increment('retries', target='gmail', status='429')
+        metrics.increment('retries', 2, target='gemini', status='429')
+    finally:
+        metrics.finish_run()
+    summary = run.summary()
+    assert summary['stages']['fetch']['count'] == 3
+    assert summary['stages']['llm_wait']['total_seconds'] == 0.5
+    assert run.counter('retries') == 3
+    assert run.counter('retries', target='gemini') == 2
+    assert run.counter('retries', status='503') == 0
+
+
+def test_quantiles():
+    assert metrics._quantile([], 0.5) == 0.0
+    assert metrics._quantile([1, 2, 3, 4, 5], 0.5) == 3
+    assert metrics._quantile([1, 2, 3, 4, 5], 0.99) == 5
+
+
+def test_export_writes_json_lines_and_openmetrics(tmp_path, monkeypatch):
+    json_path, prom_path = tmp_path / 'runs.jsonl', tmp_path / 'run.prom'
+    monkeypatch.setattr(config, 'METRICS_JSON_PATH', str(json_path))
+    monkeypatch.setattr(config, 'METRICS_OPENMETRICS_PATH', str(prom_path))
+    run = metrics.RunMetrics(mode='tool')
+    run.record('llm', 0.25)
+    run.increment('verdicts', verdict='Rejection')
+    run.finish()
+    run.export(log_callback=lambda line: None)
+    run.export(log_callback=lambda line: None)
+
+    rows = [json.loads(line) for line in json_path.read_text().splitlines()]
+    assert len(rows) == 2 and rows[0]['stages']['llm']['count'] == 1
+    text = prom_path.read_text()
+    assert 'rejection_pipeline_stage_seconds_count{stage="llm"} 1' in text
+    assert 'rejection_pipeline_verdicts_total{verdict="Rejection"} 1' in text
+    assert text.endswith("# EOF\n")
@@ -0,0 +1,48 @@
+# backend/tests/test_prefilter.py
+import prefilter
+
+
+def email(subject='', body='', sender='someone@example.com', **headers):
+    return {'id': 'm1', 'subject': subject, 'body': body, 'sender': sender, **headers}
+
+
+REJECTION = email("Your application", "Thank you for applying. Unfortunately, we will not be moving forward with "
+                  "your application.", sender="no-reply@greenhouse.io")
+NEWSLETTER = email("This week in gardening", "Ten tips for tomatoes.", sender="news@garden.example",
+                   list_unsubscribe="<mailto:unsubscribe@garden.example>")
+
+
+def test_rejection_scores_strong_phrase_context_and_sender():
+    score, reasons = prefilter.score_email(REJECTION)
+    assert score == (prefilter.STRONG_WEIGHT + 2 * prefilter.WEAK_WEIGHT + prefilter.CONTEXT_WEIGHT
+                     + prefilter.SENDER_WEIGHT)
+    assert "phrases: will not be moving forward" in reasons
+    assert "recruiting sender" in reasons
+
+
+def test_line_wrapped_phrase_still_matches():
+    assert prefilter.strong_phrase_hits("we have decided\nnot to   proceed") == {"decided not to proceed"}
+
+
+def test_bulk_headers_lower_the_score():
+    score, reasons = prefilter.score_email(NEWSLETTER)
+    assert score == prefilter.BULK_MAIL_PENALTY
+    assert reasons == ["bulk mail headers"]
+    assert prefilter.is_bulk_mail(email(precedence='Bulk'))
+
+
+def test_threshold_is_inclusive():
+    plain = email("Lunch?", "Are you free on Friday?")
+    assert prefilter.Prefilter(skip_threshold=0).should_skip(plain)[0]
+    assert not prefilter.Prefilter(skip_threshold=-1).should_skip(plain)[0]
+    assert not prefilter.Prefilter(skip_threshold=0).should_skip(REJECTION)[0]
+
+
+def test_metadata_screen_only_skips_bulk_mail():
+    screen = prefilter.Prefilter(skip_threshold=0, metadata_skip_threshold=-2)
+    # No signals in a 200-character snippet is not enough: the body may still say no
+    assert not screen.should_skip_metadata(email("Update on your candidacy", "Hi Jane,"))[0]
+    assert screen.should_skip_metadata(NEWSLETTER)[0]
+    # Bulk mail that mentions an application is fetched in full
+    assert not screen.should_skip_metadata(dict(NEWSLETTER, body="New positions this week"))[0]
+    assert (screen.evaluated, screen.skipped, screen.metadata_skipped) == (1, 1, 1)
@@ -0,0 +1,50 @@
+# backend/tests/test_rate_limiter.py
+import rate_limiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_bucket(monkeypatch, rate, capacity):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock)
+    return rate_limiter.TokenBucket('test', rate, capacity), clock
+
+
+def test_burst_up_to_capacity_then_waits_in_arrival_order(monkeypatch):
+    bucket, _ = make_bucket(monkeypatch, rate=2, capacity=4)
+    assert [bucket._reserve(1) for _ in range(4)] == [0.0] * 4
+    assert bucket._reserve(1) == 0.5
+    assert bucket._reserve(1) == 1.0 # Queued behind the previous reservation
+
+
+def test_refill_is_capped_at_capacity(monkeypatch):
+    bucket, clock = make_bucket(monkeypatch, rate=2, capacity=4)
+    bucket._reserve(4)
+    clock.now += 60
+    assert bucket._reserve(4) == 0.0
+    assert bucket._reserve(2) == 1.0
+
+
+def test_zero_rate_disables_limiting(monkeypatch):
+    bucket, _ = make_bucket(monkeypatch, rate=0, capacity=1)
+    assert bucket._reserve(1000) == 0.0
+    assert bucket.total_acquired == 0
+
+
+def test_gmail_quota_is_charged_per_method(monkeypatch):
+    charged = []
+    monkeypatch.setattr(rate_limiter.gmail_quota, 'acquire_blocking', charged.append)
+    rate_limiter.acquire_gmail_blocking('messages.get', count=3)
+    rate_limiter.acquire_gmail_blocking('messages.batchModify')
+    assert charged == [15, 50]
+
+
+def test_estimate_tokens():
+    assert rate_limiter.estimate_tokens('') == 1
+    assert rate_limiter.estimate_tokens('x' * 400) == 101
@@ -0,0 +1,84 @@
+# backend/tests/test_retry_policy.py
+import asyncio
+
+import pytest
+
+import config
+import retry_policy
+
+
+class Resp(dict):
+    def __init__(self, status, **headers):
+        super().__init__(**headers)
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient's HttpError: the status is on .resp."""
+
+    def __init__(self, status, **headers):
+        super().__init__(f"HTTP {status}")
+        self.resp = Resp(status, **headers)
+
+
+def flaky(*errors, result='ok'):
+    remaining = list(errors)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    return fn, calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+    monkeypatch.setattr(retry_policy.time, 'sleep', waited.append)
+    monkeypatch.setattr(config, 'RETRY_MAX_ATTEMPTS', 3)
+    return waited
+
+
+def test_transient_errors_are_retried(sleeps):
+    fn, calls = flaky(FakeHttpError(429), ConnectionError("reset"))
+    assert retry_policy.call_blocking(fn, log_callback=lambda line: None) == 'ok'
+    assert len(calls) == 3 and len(sleeps) == 2
+
+
+def test_other_errors_are_raised_at_once(sleeps):
+    fn, calls = flaky(FakeHttpError(404))
+    with pytest.raises(FakeHttpError):
+        retry_policy.call_blocking(fn, log_callback=lambda line: None)
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    fn, calls = flaky(*[FakeHttpError(503)] * 5)
+    with pytest.raises(FakeHttpError):
+        retry_policy.call_blocking(fn, log_callback=lambda line: None)
+    assert len(calls) == 3
+
+
+def test_quota_errors_are_retryable_by_message():
+    assert retry_policy.is_retryable(Exception("429 RESOURCE_EXHAUSTED"))
+    assert not retry_policy.is_retryable(ValueError("bad request"))
+
+
+def test_server_hints_are_honoured_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(config, 'RETRY_BASE_DELAY_SECONDS', 0.001)
+    monkeypatch.setattr(config, 'RETRY_MAX_DELAY_SECONDS', 60)
+    assert retry_policy.backoff_delay(1, FakeHttpError(429, **{'retry-after': '7'})) == 7.0
+    assert retry_policy.backoff_delay(1, Exception("'retryDelay': '30s'")) == 30.0
+    assert retry_policy.backoff_delay(1, FakeHttpError(429, **{'retry-after': '3600'})) == 60
+
+
+def test_async_retries_sleep_on_the_loop(monkeypatch):
+    monkeypatch.setattr(config, 'RETRY_BASE_DELAY_SECONDS', 0)
+    fn, calls = flaky(FakeHttpError(500))
+
+    async def call():
+        return fn()
+    assert asyncio.run(retry_policy.call_async(call, log_callback=lambda line: None)) == 'ok'
+    assert len(calls) == 2
@@ -0,0 +1,16 @@
+# backend/tests/test_structured_classifier.py
+import pytest
+
+import structured_classifier
+
+
+def test_structured_verdict_is_parsed_and_confidence_clamped():
+    verdict = structured_classifier.parse_verdict_response(
+        'Sure! ```json\n{"is_rejection": true, "confidence": 1.7, "reason": "Says not selected."}\n```')
+    assert verdict.is_rejection is True
+    assert verdict.confidence == 1.0
+
+
+@pytest.mark.parametrize('reply', [None, 'Decision: Rejection', '{"is_rejection": true}', '{"is_rejection": true, '])
+def test_malformed_structured_replies_fall_back(reply):
+    assert structured_classifier.parse_verdict_response(reply) is None
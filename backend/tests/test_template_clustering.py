@@ -0,0 +1,77 @@
+# backend/tests/test_template_clustering.py
+import random
+import asyncio
+
+import template_clustering
+import verdict_cache
+
+REJECTION = {'subject': "Your application to Acme (Req #1042)", 'sender': "Acme Careers <jobs@acme.com>",
+             'body': "Dear Jane, thank you for your interest. We have decided to move forward with other candidates."}
+
+
+def test_simhash_ignores_numbers_case_and_punctuation():
+    assert template_clustering.simhash("Mock #12: Hello, WORLD") == template_clustering.simhash("mock 13 hello world")
+    assert template_clustering.simhash("the quick brown fox") != template_clustering.simhash("a slow green turtle")
+
+
+def test_banding_finds_every_signature_within_max_distance():
+    clusterer = template_clustering.TemplateClusterer(max_distance=3)
+    rng = random.Random(7)
+    for _ in range(200):
+        signature = rng.getrandbits(template_clustering.SIMHASH_BITS)
+        entry = clusterer._add(template_clustering.ClusterEntry(signature, 'acme.com', verdict='Not Rejection'))
+        near = signature
+        for bit in rng.sample(range(template_clustering.SIMHASH_BITS), 3):
+            near ^= 1 << bit
+        assert clusterer.find(near, 'acme.com') is entry
+        assert clusterer.find(near, 'other.com') is None
+
+
+def test_failed_representative_is_not_a_cluster():
+    clusterer = template_clustering.TemplateClusterer()
+    clusterer._add(template_clustering.ClusterEntry(42, 'acme.com'))
+    assert clusterer.find(42, 'acme.com') is None
+
+
+def test_rejection_needs_matching_phrases_and_subject():
+    async def run():
+        clusterer = template_clustering.TemplateClusterer()
+        signature, domain = clusterer.signature_for(REJECTION)
+        entry = clusterer.add_representative(signature, domain, REJECTION)
+        clusterer.resolve(entry, verdict_cache.VERDICT_REJECTION)
+        same_template = dict(REJECTION, subject="Your application to Acme (Req #2077)",
+                             body="Dear Sam, thank you for your interest. We have decided to move forward with other candidates.")
+        # ATS use one subject for both outcomes: an interview invite must not inherit the Rejection
+        subject_only = dict(REJECTION, subject="Your application to Acme (Req #2077)",
+                            body="Dear Jane, thank you for your interest. We would like to schedule an interview.")
+        phrases_only = dict(REJECTION, subject="Update", body="We decided to move forward with other applicants.")
+        extra_phrase = dict(same_template, body=same_template['body'] + " You were not selected.")
+        members = (same_template, subject_only, phrases_only, extra_phrase)
+        verdicts = [await clusterer.verdict_for(entry, member) for member in members]
+        return verdicts, clusterer.unconfirmed
+
+    verdicts, unconfirmed = asyncio.run(run())
+    assert verdicts == [verdict_cache.VERDICT_REJECTION, None, None, None]
+    assert unconfirmed == 3
+
+
+def test_persisted_signatures_keep_their_evidence(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+
+    async def classify():
+        cache = verdict_cache.VerdictCache('model', 'v1', path=path)
+        clusterer = template_clustering.TemplateClusterer(cache)
+        signature, domain = clusterer.signature_for(REJECTION)
+        clusterer.resolve(clusterer.add_representative(signature, domain, REJECTION), verdict_cache.VERDICT_REJECTION)
+        cache.close()
+        return signature, domain
+
+    signature, domain = asyncio.run(classify())
+    cache = verdict_cache.VerdictCache('model', 'v1', path=path)
+    try:
+        entry = template_clustering.TemplateClusterer(cache).find(signature, domain)
+        assert entry.persisted
+        assert entry.strong_hits == {"move forward with other"}
+        assert entry.subject == template_clustering.subject_key(REJECTION['subject'])
+    finally:
+        cache.close()
@@ -0,0 +1,133 @@
+# backend/verdict_cache.py
+import time
+import sqlite3
+import hashlib
+import threading
+
+import config
+
+# Verdict labels shared by the analysis path and the cache
+VERDICT_REJECTION = "Rejection"
+VERDICT_NOT_REJECTION = "Not Rejection"
+
+
+def content_hash(subject, body):
+    """Stable hash of the text the agent actually sees (subject + body)."""
+    return hashlib.sha256(f"{subject}\n{body}".encode('utf-8', errors='replace')).hexdigest()
+
+
+def compute_prompt_version(instruction):
+    """Short fingerprint of the agent instruction; any edit to the prompt changes it."""
+    return hashlib.sha256(instruction.encode('utf-8')).hexdigest()[:12]
+
+
+class VerdictCache:
+    """
+    SQLite-backed store of earlier agent decisions, keyed by Gmail message ID.
+
+    A cached verdict is only reused when the content hash, model name and prompt version
+    all match. Rows written under a different model or prompt version are purged when the
+    cache is opened, and rows older than config.VERDICT_CACHE_TTL_DAYS are ignored.
+    The same database also holds template signatures for template_clustering.py.
+    """
+
+    def __init__(self, model, prompt_version, path=None):
+        self.path = path or config.VERDICT_CACHE_PATH
+        self.model = model
+        self.prompt_version = prompt_version
+        self.hits = 0
+        self.misses = 0
+        # The Flet app runs the backend in a worker thread, so allow cross-thread use
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS verdicts (
+                   message_id TEXT PRIMARY KEY,
+                   content_hash TEXT NOT NULL,
+                   verdict TEXT NOT NULL,
+                   model TEXT NOT NULL,
+                   prompt_version TEXT NOT NULL,
+                   created_at REAL NOT NULL
+               )"""
+        )
+        # Template signatures (template_clustering.py): one verdict per recurring email template,
+        # with the representative's strong phrases ('\n'-joined) and subject key
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(cluster_signatures)")]
+        if columns and 'strong_phrases' not in columns:
+            # Written before members had to confirm a Rejection; the signatures are only a cache
+            self._conn.execute("DROP TABLE cluster_signatures")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cluster_signatures (
+                   signature INTEGER NOT NULL,
+                   sender_domain TEXT NOT NULL,
+                   verdict TEXT NOT NULL,
+                   strong_phrases TEXT NOT NULL,
+                   subject_key TEXT NOT NULL,
+                   model TEXT NOT NULL,
+                   prompt_version TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   PRIMARY KEY (signature, sender_domain)
+               )"""
+        )
+        # Invalidation rule: a new model or a new AGENT_INSTRUCTION makes every old verdict stale
+        self.invalidated = 0
+        for table in ('verdicts', 'cluster_signatures'):
+            cursor = self._conn.execute(
+                f"DELETE FROM {table} WHERE model != ? OR prompt_version != ?", (self.model, self.prompt_version)
+            )
+            self.invalidated += cursor.rowcount
+        self._conn.commit()
+
+    def get(self, message_id, digest):
+        """Returns the cached verdict for this message/content, or None on a miss."""
+        min_created_at = time.time() - config.VERDICT_CACHE_TTL_DAYS * 86400
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict FROM verdicts WHERE message_id = ? AND content_hash = ? AND model = ? "
+                "AND prompt_version = ? AND created_at >= ?",
+                (message_id, digest, self.model, self.prompt_version, min_created_at),
+            ).fetchone()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, message_id, digest, verdict):
+        """Stores (or replaces) the verdict for a message."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (message_id, content_hash, verdict, model, prompt_version, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (message_id, digest, verdict, self.model, self.prompt_version, time.time()),
+            )
+            self._conn.commit()
+
+    def load_signatures(self):
+        """Returns [(signature, sender_domain, verdict, strong_phrases, subject_key)] for every valid persisted template."""
+        min_created_at = time.time() - config.VERDICT_CACHE_TTL_DAYS * 86400
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT signature, sender_domain, verdict, strong_phrases, subject_key FROM cluster_signatures WHERE created_at >= ?",
+                (min_created_at,),
+            ).fetchall()
+        # SQLite integers are signed 64-bit; signatures are stored in two's complement
+        return [(signature & 0xFFFFFFFFFFFFFFFF, domain, verdict, frozenset(filter(None, phrases.split('\n'))), subject)
+                for signature, domain, verdict, phrases, subject in rows]
+
+    def put_signature(self, signature, sender_domain, verdict, strong_phrases=(), subject_key=''):
+        """Stores a template signature with the verdict its representative received."""
+        signed = signature - (1 << 64) if signature >= (1 << 63) else signature
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cluster_signatures (signature, sender_domain, verdict, strong_phrases, subject_key, "
+                "model, prompt_version, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (signed, sender_domain, verdict, '\n'.join(sorted(strong_phrases)), subject_key,
+                 self.model, self.prompt_version, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,6 +3,8 @@ import flet as ft
 import asyncio
 import threading
 import traceback
+import collections
+import time
 import sys
 import os
 
@@ -12,17 +14,105 @@ if backend_path not in sys.path:
     print(f"Adding to sys.path: {backend_path}")
     sys.path.insert(0, backend_path)
 
-# Now import the backend processing function
-try:
-    from backend.backend_processor import process_rejection_emails
-except ImportError as e:
-    print(f"ERROR: Could not import backend_processor. Ensure it exists in '{backend_path}' and dependencies are installed.")
-    print(f"ImportError: {e}")
-    async def process_rejection_emails(log_callback):
-        log_callback("FATAL ERROR: Backend processor could not be loaded.")
-        log_callback("Check terminal for import errors.")
-        await asyncio.sleep(0)
-        return "Backend Error"
+# The backend (and the google-adk stack behind it) is imported on first use, not at startup,
+# so the window opens right away. main() warms it up in a background thread.
+_backend_processor = None
+
+def load_backend():
+    """Imports backend_processor once and returns its process_rejection_emails function."""
+    global _backend_processor
+    if _backend_processor is None:
+        try:
+            from backend import backend_processor
+            backend_processor.preload_dependencies()
+            _backend_processor = backend_processor
+        except ImportError as e:
+            print(f"ERROR: Could not import backend_processor. Ensure it exists in '{backend_path}' and dependencies are installed.")
+            print(f"ImportError: {e}")
+            return _backend_unavailable
+    return _backend_processor.process_rejection_emails
+
+async def _backend_unavailable(log_callback):
+    log_callback("FATAL ERROR: Backend processor could not be loaded.")
+    log_callback("Check terminal for import errors.")
+    await asyncio.sleep(0)
+    return "Backend Error"
+
+# --- Log view settings ---
+LOG_MAX_LINES = 2000 # Lines kept in the on-screen log (older ones scroll out)
+LOG_FLUSH_INTERVAL = 0.1 # Seconds between UI repaints of the log
+LOG_SPILL_PATH = None # e.g. 'email_cleaner.log' to also keep the complete log on disk
+
+
+class LogSink:
+    """
+    Thread-safe log buffer for the UI. write() is O(1) and never touches the page; a daemon
+    thread moves buffered lines into a virtualized ListView and repaints at most once per
+    LOG_FLUSH_INTERVAL. At most LOG_MAX_LINES lines are kept; with LOG_SPILL_PATH set every
+    line is also appended to that file. Only flush() touches the ListView's controls, and it
+    holds _ui_lock until its page.update() is done, so clear() just asks the next flush to
+    empty the view.
+    """
+
+    def __init__(self, page, list_view, max_lines=LOG_MAX_LINES, flush_interval=LOG_FLUSH_INTERVAL, spill_path=LOG_SPILL_PATH):
+        self.page = page
+        self.list_view = list_view
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self._pending = collections.deque(maxlen=max_lines) # Lines not yet on screen (ring buffer)
+        self._clear_requested = False
+        self._lock = threading.Lock() # Guards _pending and _clear_requested
+        self._ui_lock = threading.Lock() # Held while flush() changes the controls and repaints
+        self._spill_file = None
+        if spill_path:
+            try:
+                self._spill_file = open(spill_path, 'a', encoding='utf-8')
+            except OSError as e:
+                print(f"Could not open log file {spill_path}: {e}")
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def write(self, message):
+        lines = [line for line in str(message).strip().splitlines() if line.strip()]
+        if not lines:
+            return
+        with self._lock:
+            self._pending.extend(lines)
+            if self._spill_file:
+                self._spill_file.write('\n'.join(lines) + '\n')
+
+    def clear(self):
+        """Empties the view on the next flush (lines written after this call are kept)."""
+        with self._lock:
+            self._pending.clear()
+            self._clear_requested = True
+
+    def flush(self):
+        """Moves buffered lines onto the screen and repaints once."""
+        with self._ui_lock:
+            with self._lock:
+                if not self._pending and not self._clear_requested:
+                    return
+                lines = list(self._pending)
+                self._pending.clear()
+                clear_requested, self._clear_requested = self._clear_requested, False
+                if self._spill_file:
+                    self._spill_file.flush()
+            controls = self.list_view.controls
+            if clear_requested:
+                controls.clear()
+            controls.extend(ft.Text(line, size=12, selectable=True) for line in lines)
+            if len(controls) > self.max_lines:
+                del controls[:len(controls) - self.max_lines]
+            try:
+                self.page.update() # Request UI update
+            except Exception as e:
+                print(f"Error updating page (likely closing): {e}")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
 
 # --- Flet UI Main Function ---
 def main(page: ft.Page):
@@ -33,16 +123,8 @@ def main(page: ft.Page):
     page.padding = 20
 
     # --- UI Controls ---
-    log_output = ft.TextField(
-        value="Welcome! Activate venv and click button to start.\nMake sure GOOGLE_API_KEY environment variable is set.",
-        read_only=True,
-        multiline=True,
-        expand=True,
-        border_color=ft.colors.OUTLINE,
-        border_radius=ft.border_radius.all(5),
-        min_lines=15,
-        text_size=12,
-    )
+    # ListView only renders the lines in view, however long the run gets
+    log_output = ft.ListView(expand=True, spacing=0, auto_scroll=True, padding=ft.padding.all(8))
 
     clean_button = ft.ElevatedButton(
         "Clean Rejection Emails",
@@ -59,20 +141,12 @@ def main(page: ft.Page):
     is_running = False
 
     # --- Functions ---
-    def update_log(message: str):
-        """Appends a message to the log view safely from any thread."""
-        msg_str = str(message).strip()
-        if not msg_str:
-            return
-
-        # Flet automatically handles thread safety for control updates
-        current_value = log_output.value if log_output.value else ""
-        log_output.value = current_value + "\n" + msg_str
+    log_sink = LogSink(page, log_output)
+    log_sink.write("Welcome! Activate venv and click button to start.\nMake sure GOOGLE_API_KEY environment variable is set.")
 
-        try:
-            page.update() # Request UI update
-        except Exception as e:
-            print(f"Error updating page (likely closing): {e}")
+    def update_log(message: str):
+        """Appends a message to the log view safely from any thread (repainted by log_sink)."""
+        log_sink.write(message)
 
 
     async def run_backend_task_async():
@@ -80,6 +154,7 @@ def main(page: ft.Page):
         nonlocal is_running
         try:
             update_log("Backend task started...")
+            process_rejection_emails = load_backend()
             summary = await process_rejection_emails(update_log)
             # Summary is already logged by the processor
             # update_log(f"Backend task finished: {summary}") # Optional redundant log
@@ -93,6 +168,7 @@ def main(page: ft.Page):
             clean_button.disabled = False
             progress_ring.visible = False
             status_text.value = "Finished."
+            log_sink.flush() # Show the last lines now rather than on the next tick
             # *** REMOVED page.run_thread_safe ***
             page.update() # Request final UI update
 
@@ -111,7 +187,8 @@ def main(page: ft.Page):
             return
 
         is_running = True
-        log_output.value = ">>> Starting process..."
+        log_sink.clear()
+        log_sink.write(">>> Starting process...")
         clean_button.disabled = True
         progress_ring.visible = True
         status_text.value = "Running..."
@@ -135,11 +212,15 @@ def main(page: ft.Page):
         ft.Container(
             content=log_output,
             expand=True,
-            padding=ft.padding.only(top=5)
+            border=ft.border.all(1, ft.colors.OUTLINE),
+            border_radius=ft.border_radius.all(5),
         )
     )
     page.update()
 
+    # Import the backend while the user is looking at the window
+    threading.Thread(target=load_backend, daemon=True).start()
+
 
 # --- Run the Flet App ---
 if __name__ == "__main__":